@@ -0,0 +1,149 @@
+'''
+Booking throughput and correctness under contention (src/bookings.py).
+
+Creates S spaces and U users in a throwaway SQLite database, then lets T
+threads hammer random spaces with whole-space and windowed bookings at the
+same time. Runs two cases, each on a fresh database:
+- windowed: mostly windowed bookings spread over all S spaces;
+- mixed: half whole-space, half windowed, all on a few hot spaces.
+
+Checks afterwards that every space holds either a single whole-space
+booking or only windowed ones, that no slot was booked twice and that no
+user exceeded the active booking limit, and reports bookings per second.
+
+    python benchmarks/bench_booking_contention.py --threads 16 --attempts 2000
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError
+
+from src import bookings, database
+from src.main import create_app, init_db
+from src.models import db
+from src.models.booking import Booking, BookingSlot
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+
+def run_case(args, whole_share, spaces):
+    '''
+    Lets args.threads threads book random spaces out of ``spaces`` fresh ones,
+    taking the whole space with probability ``whole_share`` and a window
+    otherwise. Returns (attempts, outcomes, seconds, problems).
+    '''
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'GEOCODE_WORKERS': 0})
+    try:
+        init_db(app)
+        with app.app_context():
+            owner = User(username='owner', email='owner@example.com')
+            users = [User(username=f'user{n}', email=f'user{n}@example.com') for n in range(args.users)]
+            db.session.add_all([owner] + users)
+            db.session.flush()
+            db.session.add_all(ParkingSpace(address=f'{n} Bench St', latitude=37.0, longitude=-122.0,
+                                            price_amount=5.0, price_unit='hour', owner_id=owner.id)
+                               for n in range(spaces))
+            db.session.commit()
+            user_ids = [user.id for user in users]
+            space_ids = db.session.scalars(db.select(ParkingSpace.id)).all()
+
+        base = (datetime.utcnow() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        outcomes = Counter()
+        outcomes_lock = threading.Lock()
+        per_thread = args.attempts // args.threads
+        ready = threading.Barrier(args.threads + 1)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            ready.wait()
+            for _ in range(per_thread):
+                window = None
+                if rng.random() >= whole_share:
+                    start = base + timedelta(minutes=15 * rng.randrange(96))
+                    window = (start, start + timedelta(minutes=15 * rng.randint(1, 8)))
+                with app.app_context():
+                    try:
+                        bookings.book_space(rng.choice(space_ids), rng.choice(user_ids), window)
+                        outcome = 'booked'
+                    except bookings.BookingError as e:
+                        outcome = e.status
+                    except OperationalError:
+                        db.session.rollback()
+                        outcome = 'locked'
+                with outcomes_lock:
+                    outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            # A space holds one whole-space booking and nothing else, or windowed bookings only
+            whole = db.func.sum(db.case((Booking.start_time.is_(None), 1), else_=0))
+            conflicting = db.session.execute(
+                db.select(Booking.space_id).group_by(Booking.space_id)
+                .having(db.or_(whole > 1, db.and_(whole == 1, db.func.count() > 1)))
+            ).all()
+            slots = db.session.execute(
+                db.select(BookingSlot.space_id, BookingSlot.slot, db.func.count())
+                .group_by(BookingSlot.space_id, BookingSlot.slot).having(db.func.count() > 1)
+            ).all()
+            over_limit = db.session.execute(
+                db.select(Booking.user_id, db.func.count()).group_by(Booking.user_id)
+                .having(db.func.count() > bookings.MAX_CONCURRENT_BOOKINGS)
+            ).all()
+    finally:
+        os.close(db_fd)
+        database.dispose(app, db)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+    problems = {'conflicting spaces': len(conflicting), 'double-booked slots': len(slots),
+                'users over limit': len(over_limit)}
+    return per_thread * args.threads, outcomes, elapsed, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--attempts', type=int, default=2000, help='booking attempts in total, per case')
+    parser.add_argument('--spaces', type=int, default=200)
+    parser.add_argument('--hot-spaces', type=int, default=8, help='spaces the mixed case fights over')
+    parser.add_argument('--users', type=int, default=400)
+    args = parser.parse_args()
+
+    cases = [
+        ('windowed', 0.05, args.spaces), # Mostly windowed; a few take the whole space
+        ('mixed', 0.5, args.hot_spaces), # Whole-space and windowed bookings racing for the same spaces
+    ]
+    failed = False
+    print(f"threads: {args.threads}  users: {args.users}")
+    for name, whole_share, spaces in cases:
+        attempts, outcomes, elapsed, problems = run_case(args, whole_share, spaces)
+        print(f"[{name}] attempts: {attempts}  spaces: {spaces}  whole-space share: {whole_share:.0%}")
+        print("  outcomes: " + ", ".join(f"{key}={value}" for key, value in sorted(outcomes.items(), key=str)))
+        print(f"  elapsed: {elapsed:.2f} s  ({attempts / elapsed:,.0f} attempts/s, {outcomes['booked'] / elapsed:,.0f} bookings/s)")
+        print("  " + "  ".join(f"{key}: {value}" for key, value in problems.items()))
+        failed = failed or any(problems.values())
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
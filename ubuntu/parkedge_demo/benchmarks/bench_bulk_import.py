@@ -0,0 +1,75 @@
+'''
+Throughput of the bulk space import (src/bulk_import.py).
+
+Builds a CSV of N listings against a throwaway SQLite database: a third
+bring their own coordinates, a third have addresses already in the geocoding
+cache and the rest are cache misses queued for background geocoding. Reports
+rows per second for the whole import.
+
+    python benchmarks/bench_bulk_import.py --rows 10000
+'''
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import bulk_import, database, geocoding
+from src.main import create_app, init_db
+from src.models import db
+from src.models.user import User
+
+
+def build_csv(rows):
+    lines = ["address,price_amount,price_unit,latitude,longitude"]
+    for n in range(rows):
+        if n % 3 == 0:
+            lines.append(f"{n} Coordinate St,5,hour,{37 + n / 1e6},{-122 - n / 1e6}")
+        elif n % 3 == 1:
+            lines.append(f"{n} Cached Ave,12,day,,")
+        else:
+            lines.append(f"{n} Unknown Rd,3,hour,,")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=bulk_import.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'GEOCODE_WORKERS': 0})
+    try:
+        init_db(app)
+        with app.app_context():
+            owner = User(username='operator', email='operator@example.com')
+            db.session.add(owner)
+            db.session.commit()
+
+            cache = geocoding.get_cache()
+            for n in range(1, args.rows, 3):
+                cache.put(geocoding.normalize_address(f"{n} Cached Ave"), (40 + n / 1e6, -74), 3600)
+            cache.clear_memory() # Cold per-process cache: hits come from the geocode_cache table
+
+            data = build_csv(args.rows)
+            start = time.perf_counter()
+            report = bulk_import.import_spaces(io.StringIO(data), 'csv', owner.id, chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - start
+    finally:
+        os.close(db_fd)
+        database.dispose(app, db)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+    print(f"rows: {args.rows}  chunk size: {args.chunk_size}")
+    print(f"imported: {report['imported']}  pending geocode: {report['pending_geocode']}  failed: {report['failed']}")
+    print(f"elapsed: {elapsed:.2f} s  ({args.rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+Per-request cost of the metrics instrumentation (src/metrics.py).
+
+Builds two apps with create_app() on one throwaway database of S spaces:
+one with METRICS_ENABLED and one without. The response cache is off, so
+every request runs its SQL. Both apps serve the same mix of requests:
+nearest-spaces and viewport searches, a space's reviews and
+/auth/status. Each request goes to both apps back to back, first one app
+first and then the other, so drift and cache effects hit both equally.
+Reports the median over R rounds of the mean time per request for each
+app, and the difference.
+
+    python benchmarks/bench_metrics.py --spaces 2000 --requests 2000 --rounds 7
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import database
+from src.main import create_app, init_db
+from src.models import db
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+# A ~22 km x 18 km area
+MIN_LAT, MIN_LON, SPAN = 37.65, -122.55, 0.2
+
+
+def build(path, enabled):
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'METRICS_ENABLED': enabled,
+                       'RESPONSE_CACHE_SIZE': 0, 'GEOCODE_WORKERS': 0})
+
+
+def seed(app, spaces, rng):
+    init_db(app)
+    with app.app_context():
+        owner = User(username='owner', email='owner@example.com')
+        db.session.add(owner)
+        db.session.flush()
+        db.session.add_all(ParkingSpace(address=f'{n} Bench St', latitude=MIN_LAT + rng.random() * SPAN,
+                                        longitude=MIN_LON + rng.random() * SPAN, price_amount=5.0,
+                                        price_unit='hour', owner_id=owner.id)
+                           for n in range(spaces))
+        db.session.commit()
+        db.session.remove()
+
+
+def workload(count, spaces, rng):
+    urls = []
+    for _ in range(count):
+        lat, lon = MIN_LAT + rng.random() * SPAN, MIN_LON + rng.random() * SPAN
+        urls.append(rng.choice([
+            f'/api/spaces/nearest?lat={lat}&lon={lon}',
+            f'/api/spaces?bbox={lat},{lon},{lat + 0.01},{lon + 0.01}',
+            f'/api/spaces/{rng.randint(1, spaces)}/reviews',
+            '/auth/status',
+        ]))
+    return urls
+
+
+def timed_round(clients, urls):
+    '''Mean seconds per request for each of ``clients``, requesting each URL from all of them.'''
+    totals = [0.0] * len(clients)
+    for n, url in enumerate(urls):
+        order = range(len(clients)) if n % 2 else reversed(range(len(clients)))
+        for index in order:
+            start = time.perf_counter()
+            response = clients[index].get(url)
+            totals[index] += time.perf_counter() - start
+            assert response.status_code == 200, (url, response.status_code)
+    return [total / len(urls) for total in totals]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spaces', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    plain, instrumented = build(path, False), build(path, True)
+    try:
+        seed(plain, args.spaces, rng)
+        urls = workload(args.requests, args.spaces, rng)
+        clients = [plain.test_client(), instrumented.test_client()]
+        timed_round(clients, urls[:200]) # Warm up both apps
+        rounds = [timed_round(clients, urls) for _ in range(args.rounds)]
+        off = statistics.median(off for off, _ in rounds)
+        on = statistics.median(on for _, on in rounds)
+        print(f"{'metrics':>8}{'us/request':>12}")
+        print(f"{'off':>8}{off * 1e6:>12.1f}")
+        print(f"{'on':>8}{on * 1e6:>12.1f}")
+        print(f"overhead: {(on - off) * 1e6:.1f} us/request ({(on / off - 1) * 100:+.1f}%)")
+    finally:
+        for app in (plain, instrumented):
+            database.dispose(app, db)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
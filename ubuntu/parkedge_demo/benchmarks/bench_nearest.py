@@ -0,0 +1,89 @@
+'''
+Latency of the nearest-spaces search (src/nearest.py) as the listing count grows.
+
+For each size N, seeds a throwaway SQLite database with N spaces spread over
+one metro area (so density grows with N, the hard case), then times Q
+nearest_spaces() calls from random points in that area and reports p50, p99
+and the mean number of spaces found. A flat p99 across sizes means
+the geohash ring search does not degrade with table size.
+
+    python benchmarks/bench_nearest.py --sizes 1000,10000,100000,1000000
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import database, geo, nearest
+from src.main import create_app, init_db
+from src.models import db
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+# A ~22 km x 18 km area
+MIN_LAT, MIN_LON, SPAN = 37.65, -122.55, 0.2
+
+
+def seed(spaces, rng):
+    owner = User(username='owner', email='owner@example.com')
+    db.session.add(owner)
+    db.session.flush()
+    for start in range(0, spaces, 50000):
+        rows = []
+        for n in range(start, min(start + 50000, spaces)):
+            lat, lon = MIN_LAT + rng.random() * SPAN, MIN_LON + rng.random() * SPAN
+            # Core inserts skip the ORM hook that fills geohash
+            rows.append({'address': f'{n} Bench St', 'latitude': lat, 'longitude': lon,
+                         'geohash': geo.encode(lat, lon), 'price_amount': rng.choice([2.5, 4.0, 6.0, 12.0]),
+                         'price_unit': 'hour', 'owner_id': owner.id, 'is_booked': rng.random() < 0.3})
+        db.session.execute(db.insert(ParkingSpace), rows)
+    db.session.commit()
+
+
+def measure(size, queries, k):
+    rng = random.Random(size)
+    db_fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'GEOCODE_WORKERS': 0})
+    try:
+        init_db(app)
+        with app.app_context():
+            seed(size, rng)
+            timings, found = [], []
+            for _ in range(queries):
+                lat, lon = MIN_LAT + rng.random() * SPAN, MIN_LON + rng.random() * SPAN
+                start = time.perf_counter()
+                result = nearest.nearest_spaces(lat, lon, k)
+                timings.append(time.perf_counter() - start)
+                found.append(len(result))
+                db.session.remove()
+            timings.sort()
+            return (statistics.median(timings), timings[int(len(timings) * 0.99) - 1],
+                    statistics.mean(found))
+    finally:
+        database.dispose(app, db)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=nearest.DEFAULT_K)
+    args = parser.parse_args()
+
+    print(f"{'spaces':>10}{'p50 ms':>10}{'p99 ms':>10}{'found':>8}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        p50, p99, found = measure(size, args.queries, args.k)
+        print(f"{size:>10,}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}{found:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+'''
+CPU time and peak memory of list serialization (src/serializers.py).
+
+Seeds a throwaway SQLite database with N spaces, N reviews and N bookings,
+then serializes each list twice: through ORM instances with eager loads and
+Schema.dump_many() (the to_dict path), and through Schema.select() rows and
+Schema.dump_rows(). CPU time is the best of R runs; peak memory is measured
+with tracemalloc on a separate run.
+
+    python benchmarks/bench_serialization.py --rows 50000
+'''
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import database
+from src.main import create_app, init_db
+from src.models import db
+from src.models.booking import Booking
+from src.models.review import Review
+from src.models.space import ParkingSpace
+from src.models.user import User
+from src.serializers import BOOKING, REVIEW, SPACE
+
+
+def seed(rows):
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    users = max(rows // 50, 1)
+    db.session.execute(db.insert(User), [
+        {'username': f'user{n}', 'email': f'user{n}@example.com'} for n in range(users)
+    ])
+    db.session.execute(db.insert(ParkingSpace), [
+        {'address': f'{n} Bench St', 'latitude': 37.7 + rng.random() / 10, 'longitude': -122.5 + rng.random() / 10,
+         'price_amount': 5.0, 'price_unit': 'hour', 'owner_id': n % users + 1,
+         'rating_sum': 4, 'rating_count': 1, 'geocode_status': 'ok'}
+        for n in range(rows)
+    ])
+    # One review per (user, space) pair, as the unique index requires
+    db.session.execute(db.insert(Review), [
+        {'user_id': n % users + 1, 'space_id': n + 1, 'rating': rng.randint(1, 5),
+         'comment': 'Easy to find', 'timestamp': now - timedelta(minutes=n)}
+        for n in range(rows)
+    ])
+    db.session.execute(db.insert(Booking), [
+        {'user_id': n % users + 1, 'space_id': n + 1, 'booking_time': now - timedelta(minutes=n),
+         'status': 'completed'}
+        for n in range(rows)
+    ])
+    db.session.commit()
+
+
+def serialize_instances(schema, model):
+    data = schema.dump_many(db.session.scalars(schema.apply(db.select(model))).all())
+    db.session.remove() # Drop the identity map, as the end of a request does
+    return data
+
+
+def serialize_rows(schema, model):
+    data = schema.dump_rows(db.session.execute(schema.select()).all())
+    db.session.remove()
+    return data
+
+
+def measure(function, schema, model, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.process_time()
+        rows = len(function(schema, model))
+        times.append(time.process_time() - start)
+    gc.collect()
+    tracemalloc.start()
+    function(schema, model)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db_fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'GEOCODE_WORKERS': 0})
+    try:
+        init_db(app)
+        with app.app_context():
+            seed(args.rows)
+            print(f"{'list':<10}{'path':<12}{'rows':>8}{'cpu s':>9}{'peak MB':>10}")
+            for name, schema, model in (('spaces', SPACE, ParkingSpace), ('reviews', REVIEW, Review),
+                                        ('bookings', BOOKING, Booking)):
+                results = {}
+                for label, function in (('to_dict', serialize_instances), ('projected', serialize_rows)):
+                    rows, cpu, peak = measure(function, schema, model, args.repeat)
+                    results[label] = (cpu, peak)
+                    print(f"{name:<10}{label:<12}{rows:>8,}{cpu:>9.3f}{peak / 1024 ** 2:>10.1f}")
+                (cpu_before, peak_before), (cpu_after, peak_after) = results['to_dict'], results['projected']
+                print(f"{'':<10}{'saving':<12}{'':>8}{1 - cpu_after / cpu_before:>9.0%}{1 - peak_after / peak_before:>10.0%}")
+    finally:
+        database.dispose(app, db)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+'''
+Mixed read/write throughput of the SQLite profiles (src/database.py).
+
+Runs P worker processes, like gunicorn workers, against one throwaway
+database for D seconds. Each process runs T threads. Every operation is
+either a viewport read of parking spaces or, with probability W, a write:
+a review and its rating aggregate update in one transaction. This is run
+once with SQLite's default settings on a single engine, and once with the
+production profile (WAL, pragmas, read/write engine split). Reports
+operations per second and lock errors for both.
+
+    python benchmarks/bench_sqlite_profile.py --processes 4 --threads 4 --seconds 5
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from src import database
+from src.models import db
+from src.models.review import Review
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+
+def build_app(path, profile, split):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLITE_PROFILE'] = profile
+    if split:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config)
+    db.init_app(app)
+    if split:
+        database.init_app(app, db)
+    return app
+
+
+def seed(path, spaces, users):
+    app = build_app(path, 'default', split=False)
+    with app.app_context():
+        db.create_all()
+        owner = User(username='owner', email='owner@example.com')
+        db.session.add(owner)
+        db.session.add_all(User(username=f'user{n}', email=f'user{n}@example.com') for n in range(users))
+        db.session.flush()
+        rng = random.Random(0)
+        db.session.add_all(ParkingSpace(address=f'{n} Bench St', latitude=37.7 + rng.random() / 10,
+                                        longitude=-122.5 + rng.random() / 10, price_amount=5.0,
+                                        price_unit='hour', owner_id=owner.id)
+                           for n in range(spaces))
+        db.session.commit()
+
+
+def run_worker(path, profile, split, threads, seconds, write_ratio, results):
+    app = build_app(path, profile, split)
+    with app.app_context():
+        space_ids = db.session.scalars(db.select(ParkingSpace.id)).all()
+        user_ids = db.session.scalars(db.select(User.id)).all()
+        db.session.remove()
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def loop(seed_value):
+        rng = random.Random(seed_value)
+        local = {'reads': 0, 'writes': 0, 'locked': 0}
+        while time.monotonic() < deadline:
+            with app.app_context():
+                try:
+                    if rng.random() < write_ratio:
+                        space_id = rng.choice(space_ids)
+                        rating = rng.randint(1, 5)
+                        db.session.add(Review(user_id=rng.choice(user_ids), space_id=space_id, rating=rating))
+                        ParkingSpace.adjust_rating(space_id, rating, 1)
+                        db.session.commit()
+                        local['writes'] += 1
+                    else:
+                        lat, lon = 37.7 + rng.random() / 20, -122.5 + rng.random() / 20
+                        db.session.scalars(
+                            db.select(ParkingSpace)
+                            .where(ParkingSpace.within_bbox(lat, lon, lat + 0.02, lon + 0.02))
+                            .limit(500)
+                        ).all()
+                        local['reads'] += 1
+                except OperationalError:
+                    db.session.rollback()
+                    local['locked'] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    workers = [threading.Thread(target=loop, args=(os.getpid() * 100 + n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    results.put(counts)
+
+
+def measure(label, profile, split, args):
+    db_fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    try:
+        seed(path, args.spaces, args.users)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=run_worker,
+                                    args=(path, profile, split, args.threads, args.seconds, args.write_ratio, results))
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        totals = {'reads': 0, 'writes': 0, 'locked': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+    operations = totals['reads'] + totals['writes']
+    print(f"{label:<12} {operations / args.seconds:>9,.0f} ops/s  "
+          f"(reads {totals['reads'] / args.seconds:,.0f}/s, writes {totals['writes'] / args.seconds:,.0f}/s, "
+          f"lock errors {totals['locked']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--spaces', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} threads, {args.write_ratio:.0%} writes, {args.seconds:g} s each")
+    measure('before', 'default', False, args)
+    measure('production', 'production', True, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Fan-out latency of the live update broadcaster (src/events.py).
+
+Starts N subscriber threads, each blocked on its queue the way a
+/api/spaces/stream response generator is, publishes a series of encoded
+events and reports how long each event takes to reach every subscriber.
+
+    python benchmarks/bench_sse_fanout.py --subscribers 1000 --events 50
+'''
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import events
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.02, help='seconds between published events')
+    args = parser.parse_args()
+
+    broadcaster = events.Broadcaster()
+    published_at = {}
+    latencies = []
+    latencies_lock = threading.Lock()
+    ready = threading.Barrier(args.subscribers + 1)
+
+    def consume(subscriber):
+        received = []
+        ready.wait()
+        for _ in range(args.events):
+            message = subscriber.get(timeout=30)
+            if message is None:
+                break
+            received.append((message, time.perf_counter()))
+        with latencies_lock:
+            latencies.extend(now - published_at[message] for message, now in received)
+
+    threads = []
+    for _ in range(args.subscribers):
+        subscriber = broadcaster.subscribe(limit=args.subscribers)
+        thread = threading.Thread(target=consume, args=(subscriber,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    ready.wait()
+
+    publish_costs = []
+    for n in range(args.events):
+        message = events.format_event({"kind": "booked", "space": {"id": n}}, event='space', event_id=n)
+        published_at[message] = start = time.perf_counter()
+        broadcaster.publish(message)
+        publish_costs.append(time.perf_counter() - start)
+        time.sleep(args.interval)
+
+    for thread in threads:
+        thread.join()
+
+    expected = args.subscribers * args.events
+    print(f"subscribers={args.subscribers} events={args.events} delivered={len(latencies)}/{expected}")
+    print(f"publish() call: mean {1e3 * sum(publish_costs) / len(publish_costs):.2f} ms")
+    print("delivery latency: "
+          f"p50 {1e3 * percentile(latencies, 0.50):.2f} ms, "
+          f"p99 {1e3 * percentile(latencies, 0.99):.2f} ms, "
+          f"max {1e3 * max(latencies):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Worker startup time: importing the app, create_app() and the first requests.
+
+Each run is a fresh interpreter, like a newly booted gunicorn worker,
+against a throwaway database that init_db() set up beforehand. A run
+measures:
+- importing src.main;
+- create_app();
+- the first GET /api/spaces;
+- the first GET /auth/login/google, which is the first use of the OAuth
+  libraries.
+
+It also reports whether requests and the Google libraries were loaded
+before the first sign-in. With --eager they are imported before the app,
+as they were before they became lazy, which gives the comparison. Reports
+the median of R runs.
+
+    python benchmarks/bench_startup.py --runs 10
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ('requests', 'google_auth_oauthlib', 'google.auth')
+
+# Runs in the child interpreter; argv[1] is the database path, argv[2] "eager" or "lazy"
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[2] == 'eager':
+    import requests, google_auth_oauthlib.flow, google.auth.jwt
+from src.main import create_app
+imported = time.perf_counter()
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + sys.argv[1], 'GEOCODE_WORKERS': 0,
+                  # Outside TESTING the Google credentials come from the environment
+                  'TESTING': True, 'GOOGLE_CLIENT_ID': 'bench', 'GOOGLE_CLIENT_SECRET': 'bench'})
+created = time.perf_counter()
+client = app.test_client()
+assert client.get('/api/spaces').status_code == 200
+first_request = time.perf_counter()
+loaded = [name for name in %r if name in sys.modules]
+assert client.get('/auth/login/google').location.startswith('https://accounts.google.com/')
+first_login = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': first_request - created, 'first_login': first_login - first_request,
+                  'loaded': loaded}))
+''' % (HEAVY_MODULES,)
+
+
+def prepare(path):
+    from src.main import create_app, init_db
+    init_db(create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'}))
+
+
+def run(path, mode):
+    output = subprocess.run([sys.executable, '-c', CHILD, path, mode], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--eager', action='store_true',
+                        help='Also time runs that import requests and the Google libraries up front.')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        prepare(path)
+        stages = ('import', 'create_app', 'first_request', 'first_login')
+        print(f"{'mode':>6}" + ''.join(f'{stage + " ms":>18}' for stage in stages) + f"{'total ms':>12}  loaded before sign-in")
+        for mode in ('lazy', 'eager') if args.eager else ('lazy',):
+            results = [run(path, mode) for _ in range(args.runs)]
+            medians = {stage: statistics.median(result[stage] for result in results) for stage in stages}
+            print(f"{mode:>6}" + ''.join(f'{medians[stage] * 1000:>18.1f}' for stage in stages)
+                  + f"{sum(medians.values()) * 1000:>12.1f}  {', '.join(results[0]['loaded']) or '-'}")
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Size and encode time of the /api/spaces wire formats (?format=).
+
+Seeds a throwaway SQLite database with N spaces in one city, then encodes
+the full list in each format the way get_spaces() does: the default list of
+SPACE objects, MARKER parallel arrays as JSON (columnar) and as msgpack.
+Reports body bytes, gzipped bytes and the best-of-R time to serialize and
+encode the rows (the query is excluded).
+
+    python benchmarks/bench_wire_formats.py --spaces 20000
+'''
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import database
+from src.main import create_app, init_db
+from src.models import db
+from src.models.space import ParkingSpace
+from src.models.user import User
+from src.routes.spaces import SPACE_FORMATS, encode_spaces
+from src.serializers import MARKER, SPACE
+
+
+def seed(spaces):
+    rng = random.Random(0)
+    owner = User(username='owner', email='owner@example.com')
+    db.session.add(owner)
+    db.session.flush()
+    db.session.execute(db.insert(ParkingSpace), [
+        {'address': f'{n} Bench St, San Francisco, CA', 'latitude': 37.7 + rng.random() / 10,
+         'longitude': -122.5 + rng.random() / 10, 'price_amount': rng.choice([2.5, 4.0, 6.0, 12.0, 25.0]),
+         'price_unit': rng.choice(['hour', 'day']), 'owner_id': owner.id, 'geocode_status': 'ok',
+         'rating_sum': rng.randint(0, 50), 'rating_count': rng.randint(0, 10)}
+        for n in range(spaces)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spaces', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'GEOCODE_WORKERS': 0})
+    try:
+        init_db(app)
+        with app.app_context():
+            seed(args.spaces)
+            print(f"{args.spaces:,} spaces")
+            print(f"{'format':<10}{'bytes':>12}{'gzipped':>12}{'encode ms':>12}")
+            baseline = None
+            for fmt in SPACE_FORMATS:
+                rows = db.session.execute(SPACE.select() if fmt == 'json' else MARKER.select()).all()
+                times = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    body = encode_spaces(rows, fmt).get_data()
+                    times.append(time.perf_counter() - start)
+                baseline = baseline or len(body)
+                print(f"{fmt:<10}{len(body):>12,}{len(gzip.compress(body)):>12,}{min(times) * 1000:>12.1f}"
+                      f"   ({len(body) / baseline:.0%} of json)")
+    finally:
+        database.dispose(app, db)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
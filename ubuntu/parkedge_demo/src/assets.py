@@ -0,0 +1,189 @@
+'''
+Static files served from an in-memory manifest built at startup.
+
+init_app() reads every file under the static folder once. For each file
+the manifest keeps:
+
+* its content hash, used as a strong ETag;
+* for everything but the HTML pages, a fingerprinted URL with the hash in
+  the name (/static/style.3f2a9c1b7d4e.css);
+* gzip and zstd encodings, where they come out smaller than the original.
+
+The pages' references to other assets ("/static/style.css") are rewritten
+to the fingerprinted URLs. The bytes behind a fingerprinted URL can
+therefore never change, so it is served with Cache-Control: immutable for
+ASSET_MAX_AGE. Pages, and assets requested by their plain name, keep
+stable URLs and are served with no-cache, so a browser revalidates them
+with If-None-Match and gets a 304 while they are unchanged. Every response
+picks its encoding from Accept-Encoding (zstd, then gzip, then none) and
+carries Vary: Accept-Encoding.
+
+Requests never touch the filesystem, not even the single-page fallback.
+Edited files are picked up on restart.
+
+Configuration (app.config):
+    ASSET_MAX_AGE  seconds a fingerprinted URL may be cached (default one year)
+'''
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+import zstandard
+from flask import abort, current_app, request
+
+DEFAULT_MAX_AGE = 365 * 24 * 3600
+
+# Tried in this order against the request's Accept-Encoding
+ENCODINGS = ('zstd', 'gzip')
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 12
+
+HASH_LENGTH = 12
+
+# Pages answering unknown paths, in order of preference
+FALLBACK_PAGES = ('map_view.html', 'index.html')
+
+_COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class Asset:
+    '''One static file: its encoded bodies, content type and content hash.'''
+    __slots__ = ('path', 'url_path', 'mimetype', 'digest', 'bodies')
+
+    def __init__(self, path, url_path, mimetype, digest, bodies):
+        self.path = path
+        self.url_path = url_path
+        self.mimetype = mimetype
+        self.digest = digest
+        self.bodies = bodies # encoding ('identity', 'gzip' or 'zstd') -> bytes
+
+    def __repr__(self):
+        return f'<Asset {self.url_path}>'
+
+
+def fingerprint(path, digest):
+    '''"css/style.css" -> "css/style.<hash>.css"'''
+    root, extension = posixpath.splitext(path)
+    return f'{root}.{digest[:HASH_LENGTH]}{extension}'
+
+
+def encode(body, mimetype):
+    '''The bodies to keep for a file: always identity, plus each compressed encoding that is smaller.'''
+    bodies = {'identity': body}
+    if mimetype.startswith(_COMPRESSIBLE):
+        candidates = {
+            'zstd': zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body),
+            'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+        }
+        bodies.update((encoding, data) for encoding, data in candidates.items() if len(data) < len(body))
+    return bodies
+
+
+def _make_asset(path, body, fingerprinted):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    digest = hashlib.sha256(body).hexdigest()
+    url_path = fingerprint(path, digest) if fingerprinted else path
+    return Asset(path, url_path, mimetype, digest, encode(body, mimetype))
+
+
+def rewrite_references(text, urls):
+    '''Replaces each quoted or url()-wrapped URL in ``text`` that is a key of ``urls`` with its value.'''
+    if not urls:
+        return text
+    reference = re.compile(r'''(?<=["'(])(%s)(?=[?#"')])''' % '|'.join(map(re.escape, urls)))
+    return reference.sub(lambda match: urls[match.group(1)], text)
+
+
+class Manifest:
+    '''Every file under a static folder, looked up by plain or fingerprinted path.'''
+
+    def __init__(self, folder, url_prefix='/static'):
+        self.url_prefix = url_prefix.rstrip('/')
+        self._assets = {} # path -> (Asset, immutable)
+        files = {}
+        for directory, _, names in os.walk(folder):
+            for name in names:
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, folder).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    files[path] = f.read()
+
+        pages = {path for path in files if path.endswith('.html')}
+        self.urls = {} # plain URL -> fingerprinted URL
+        for path in sorted(set(files) - pages):
+            asset = _make_asset(path, files[path], fingerprinted=True)
+            self._assets[path] = (asset, False)
+            self._assets[asset.url_path] = (asset, True)
+            self.urls[f'{self.url_prefix}/{path}'] = f'{self.url_prefix}/{asset.url_path}'
+        for path in sorted(pages):
+            body = rewrite_references(files[path].decode('utf-8'), self.urls).encode('utf-8')
+            self._assets[path] = (_make_asset(path, body, fingerprinted=False), False)
+
+    def lookup(self, path):
+        '''(Asset, immutable) for a plain or fingerprinted path, or (None, False).'''
+        return self._assets.get(path, (None, False))
+
+
+def init_app(app):
+    '''Builds the manifest for ``app``'s static folder and serves /static/ from it.'''
+    app.extensions['assets'] = Manifest(app.static_folder, app.static_url_path)
+    app.view_functions['static'] = _serve_static
+
+
+def get_manifest():
+    return current_app.extensions['assets']
+
+
+def _negotiate(asset):
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if encoding in asset.bodies and accepted[encoding] > 0:
+            return encoding
+    return 'identity'
+
+
+def send_asset(asset, immutable=False):
+    '''The response for ``asset``, in the best encoding the client accepts, or a 304.'''
+    encoding = _negotiate(asset)
+    response = current_app.response_class(asset.bodies[encoding], mimetype=asset.mimetype)
+    if encoding == 'identity':
+        response.set_etag(asset.digest)
+    else:
+        # Each encoding is a different representation, so it needs its own strong ETag
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f'{asset.digest}-{encoding}')
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = current_app.config.get('ASSET_MAX_AGE', DEFAULT_MAX_AGE)
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _serve_static(filename):
+    asset, immutable = get_manifest().lookup(filename)
+    if asset is None:
+        abort(404)
+    return send_asset(asset, immutable)
+
+
+def serve(path):
+    '''
+    A static file by path, or for any other path the single-page app's
+    entry page (FALLBACK_PAGES).
+    '''
+    manifest = get_manifest()
+    asset, immutable = manifest.lookup(path)
+    if asset is None:
+        for page in FALLBACK_PAGES:
+            asset, immutable = manifest.lookup(page)
+            if asset is not None:
+                break
+        else:
+            return "map_view.html or index.html not found in static folder", 404
+    return send_asset(asset, immutable)
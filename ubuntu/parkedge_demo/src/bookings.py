@@ -0,0 +1,131 @@
+'''
+Race-free booking.
+
+A booking is decided by a single conditional write instead of read-check-write
+in Python, so two requests racing for the same space (or one user racing
+past the active booking limit) cannot both succeed:
+
+- whole-space bookings flip parking_space.is_booked with a compare-and-set
+  UPDATE guarded by the owner, the per-user active booking count and the
+  absence of windowed bookings that have not ended yet;
+- windowed bookings insert the booking with an INSERT ... SELECT carrying the
+  same guards, then claim their slots, where the unique (space_id, slot) index
+  rejects any overlap.
+
+Each booking is one short transaction. Only a refused booking pays for the
+extra query that works out why it was refused.
+'''
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from src.models import db
+from src.models.booking import Booking, BookingSlot, slot_number, slot_range
+from src.models.change import record_space_change
+from src.models.space import ParkingSpace
+
+MAX_CONCURRENT_BOOKINGS = 3
+
+
+class BookingError(Exception):
+    '''A refused booking; ``status`` is the HTTP status to answer with.'''
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def active_booking_count(user_id, now):
+    '''Scalar subquery counting a user's confirmed bookings that have not ended.'''
+    return (
+        db.select(db.func.count(Booking.id))
+        .where(Booking.user_id == user_id, Booking.status == 'confirmed',
+               db.or_(Booking.end_time.is_(None), Booking.end_time > now))
+        .scalar_subquery()
+    )
+
+
+def upcoming_slots(space_id, now):
+    '''EXISTS over the space's booked slots from the current one on, i.e. windowed bookings not yet over.'''
+    return (
+        db.select(BookingSlot.id)
+        .where(BookingSlot.space_id == space_id, BookingSlot.slot >= slot_number(now))
+        .exists()
+    )
+
+
+def _bookable(space_id, user_id, now):
+    return db.and_(
+        ParkingSpace.id == space_id,
+        ParkingSpace.is_booked == db.false(),
+        ParkingSpace.owner_id != user_id,
+        active_booking_count(user_id, now) < MAX_CONCURRENT_BOOKINGS,
+    )
+
+
+def _refusal(space_id, user_id, now):
+    '''Works out why a guarded write matched nothing, checking in the order clients expect.'''
+    space = db.session.execute(
+        db.select(ParkingSpace.owner_id, ParkingSpace.is_booked, active_booking_count(user_id, now),
+                  upcoming_slots(space_id, now))
+        .where(ParkingSpace.id == space_id)
+    ).first()
+    if space is None:
+        return BookingError("Parking space not found", 404)
+    owner_id, is_booked, active_count, has_windows = space
+    if active_count >= MAX_CONCURRENT_BOOKINGS:
+        return BookingError(f"You have reached the maximum limit of {MAX_CONCURRENT_BOOKINGS} active bookings.", 403)
+    if owner_id == user_id:
+        return BookingError("You cannot book your own parking space", 403)
+    if not is_booked and has_windows:
+        return BookingError("Parking space is booked for part of the time; book a window instead", 409)
+    return BookingError("Parking space is already booked", 409)
+
+
+def book_space(space_id, user_id, window=None):
+    '''
+    Books ``space_id`` for ``user_id``, for the whole space or for the
+    ``(start_time, end_time)`` window, and commits. Returns the new booking's
+    id; raises BookingError if the booking was refused.
+    '''
+    now = datetime.utcnow()
+    if window is None:
+        claimed = db.session.execute(
+            db.update(ParkingSpace)
+            .where(_bookable(space_id, user_id, now), ~upcoming_slots(space_id, now))
+            .values(is_booked=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            error = _refusal(space_id, user_id, now)
+            db.session.rollback()
+            raise error
+        booking = Booking(user_id=user_id, space_id=space_id, status='confirmed', booking_time=now)
+        db.session.add(booking)
+    else:
+        start_time, end_time = window
+        guarded = db.select(
+            db.literal(user_id), ParkingSpace.id, db.literal('confirmed'), db.literal(now),
+            db.literal(start_time), db.literal(end_time),
+        ).where(_bookable(space_id, user_id, now))
+        booking_id = db.session.scalar(
+            db.insert(Booking)
+            .from_select(['user_id', 'space_id', 'status', 'booking_time', 'start_time', 'end_time'], guarded)
+            .returning(Booking.id)
+        )
+        if booking_id is None:
+            error = _refusal(space_id, user_id, now)
+            db.session.rollback()
+            raise error
+        try:
+            db.session.execute(db.insert(BookingSlot), [
+                {'booking_id': booking_id, 'space_id': space_id, 'slot': slot}
+                for slot in slot_range(start_time, end_time)
+            ])
+        except IntegrityError:
+            db.session.rollback()
+            raise BookingError("Parking space is already booked for part of that window", 409)
+
+    record_space_change(space_id, 'booked')
+    db.session.commit()
+    return booking_id if window is not None else booking.id
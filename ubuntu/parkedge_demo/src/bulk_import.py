@@ -0,0 +1,208 @@
+'''
+Bulk import of parking spaces from CSV or JSON Lines.
+
+The input is read as a stream and written in chunks of CHUNK_SIZE rows. Each
+chunk resolves its addresses against the geocoding cache in one lookup,
+inserts its spaces with one bulk INSERT and commits, so memory use stays flat
+and a bad row is reported without aborting the rest of the import.
+
+Columns: address, price_amount, price_unit, plus optional image_url,
+latitude and longitude. Rows that bring their own coordinates are not
+geocoded. Addresses missing from the cache are either geocoded inline
+(geocode='sync', bound by the geocoder rate limit) or stored as pending and
+queued for the background workers in src/geocode_worker.py
+(geocode='async', the default), which keeps large imports fast.
+'''
+import csv
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src import geo, geocode_worker, geocoding
+from src.models import db
+from src.models.change import record_space_changes_bulk
+from src.models.geocode import GeocodeJob
+from src.models.space import ParkingSpace
+
+FORMATS = ('csv', 'jsonl')
+GEOCODE_MODES = ('async', 'sync')
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_rows(stream, fmt):
+    '''
+    Yields (line_number, raw_row) from a text stream: dicts for CSV, the
+    undecoded line for JSONL (decoded by parse_row, so one bad line is one
+    row error). Blank JSONL lines are skipped.
+    '''
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield number, line
+
+
+def _coordinate(value, name, bound):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: must be a number")
+    if not -bound <= number <= bound:
+        raise ValueError(f"Invalid {name}: must be between -{bound} and {bound}")
+    return number
+
+
+def parse_row(raw):
+    '''Validates one input row. Returns the space fields or raises ValueError with a row-level message.'''
+    if isinstance(raw, str):
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            raise ValueError("Invalid JSON")
+        if not isinstance(data, dict):
+            raise ValueError("Each line must be a JSON object")
+    else:
+        data = raw
+
+    for field in ('address', 'price_amount', 'price_unit'):
+        if data.get(field) in (None, ''):
+            raise ValueError(f"Missing required field: {field}")
+
+    address = str(data['address']).strip()
+    if len(address) > 200:
+        raise ValueError("Invalid address: longer than 200 characters")
+    try:
+        price_amount = float(data['price_amount'])
+    except (TypeError, ValueError):
+        raise ValueError("Invalid price_amount: must be a number")
+    if price_amount <= 0:
+        raise ValueError("Invalid price_amount: Price amount must be positive.")
+    price_unit = data['price_unit']
+    if price_unit not in ParkingSpace.PRICE_UNITS:
+        raise ValueError(f"Invalid price_unit. Allowed units are: {', '.join(ParkingSpace.PRICE_UNITS)}")
+
+    latitude, longitude = data.get('latitude'), data.get('longitude')
+    if latitude in (None, '') and longitude in (None, ''):
+        latitude = longitude = None
+    elif latitude in (None, '') or longitude in (None, ''):
+        raise ValueError("latitude and longitude must be given together")
+    else:
+        latitude = _coordinate(latitude, 'latitude', 90)
+        longitude = _coordinate(longitude, 'longitude', 180)
+
+    return {
+        'address': address,
+        'price_amount': price_amount,
+        'price_unit': price_unit,
+        'image_url': data.get('image_url') or None,
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+
+
+def _report_error(report, line, message):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({"line": line, "error": message})
+
+
+def _locate(chunk, geocode, report):
+    '''Returns [(line, row, location)] for the rows that can be stored; location None means pending.'''
+    keys = {geocoding.normalize_address(row['address']) for _, row in chunk if row['latitude'] is None}
+    cached = geocoding.get_cache().get_many(list(keys))
+
+    located = []
+    for line, row in chunk:
+        if row['latitude'] is not None:
+            located.append((line, row, (row['latitude'], row['longitude'])))
+            continue
+        key = geocoding.normalize_address(row['address'])
+        if key not in cached and geocode == 'sync':
+            try:
+                cached[key] = geocoding.geocode(row['address'])
+            except geocoding.GeocoderError as e:
+                _report_error(report, line, f"Geocoding service request failed: {e}")
+                continue
+            except (ValueError, KeyError) as e:
+                _report_error(report, line, f"Error processing geocoding result: {e}")
+                continue
+        if key not in cached:
+            located.append((line, row, None))
+        elif cached[key] is None:
+            _report_error(report, line, "Could not geocode address. No results found.")
+        else:
+            located.append((line, row, cached[key]))
+    return located
+
+
+def _import_chunk(chunk, owner_id, geocode, report):
+    located = _locate(chunk, geocode, report)
+    if not located:
+        return
+
+    values = []
+    for _, row, location in located:
+        latitude, longitude = location if location is not None else (None, None)
+        values.append({
+            'owner_id': owner_id,
+            'address': row['address'],
+            'latitude': latitude,
+            'longitude': longitude,
+            'geohash': geo.encode(latitude, longitude) if location is not None else None,
+            'price_amount': row['price_amount'],
+            'price_unit': row['price_unit'],
+            'image_url': row['image_url'],
+            'is_booked': False,
+            'geocode_status': 'ok' if location is not None else 'pending',
+        })
+    try:
+        # Unordered RETURNING lets SQLAlchemy send multi-row INSERTs; the status says what each id needs
+        inserted = db.session.execute(
+            db.insert(ParkingSpace).returning(ParkingSpace.id, ParkingSpace.geocode_status), values
+        ).all()
+        ready = [space_id for space_id, status in inserted if status == 'ok']
+        pending = [space_id for space_id, status in inserted if status == 'pending']
+        record_space_changes_bulk(ready, 'created')
+        if pending:
+            now = datetime.utcnow()
+            db.session.execute(db.insert(GeocodeJob), [
+                {'space_id': space_id, 'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+                for space_id in pending
+            ])
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        for line, _, _ in located:
+            _report_error(report, line, f"Database error: {e.__class__.__name__}")
+        return
+    report['imported'] += len(ready)
+    report['pending_geocode'] += len(pending)
+
+
+def import_spaces(stream, fmt, owner_id, geocode='async', chunk_size=CHUNK_SIZE):
+    '''
+    Imports every row of ``stream`` (a text stream in ``fmt``) as a space
+    owned by ``owner_id``. Returns a report:
+    {"imported", "pending_geocode", "failed", "errors": [{"line", "error"}]},
+    where errors lists at most MAX_REPORTED_ERRORS rows.
+    '''
+    report = {'imported': 0, 'pending_geocode': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    for line, raw in read_rows(stream, fmt):
+        try:
+            chunk.append((line, parse_row(raw)))
+        except ValueError as e:
+            _report_error(report, line, str(e))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, owner_id, geocode, report)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, owner_id, geocode, report)
+    if report['pending_geocode']:
+        geocode_worker.notify()
+    return report
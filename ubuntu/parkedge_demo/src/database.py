@@ -0,0 +1,128 @@
+'''
+SQLite engine profile and read/write routing.
+
+Every connection gets the pragmas of the configured profile. The
+"production" profile (the default) puts the database in WAL mode so readers
+never block the writer or each other, relaxes fsyncs to synchronous=NORMAL
+(durable across application crashes, may lose the last transactions on
+power loss), waits on locks instead of failing at once and enlarges the page
+cache and memory map.
+
+Statements are split across two engines:
+- db.engine is the write engine. It has a single pooled connection, so
+  writers in one process queue for it instead of contending for SQLite's
+  write lock.
+- The read engine (read_engine()) is a larger pool of query_only
+  connections.
+
+db.session sends SELECTs to the read engine until the first
+INSERT/UPDATE/DELETE or flush. From then until the transaction ends it stays
+on the write engine, so a request reads its own writes.
+
+Configuration (app.config):
+    SQLITE_PROFILE          'production' (default) or 'default' (SQLite's own settings)
+    SQLITE_PRAGMAS          dict of pragma overrides applied on top of the profile
+    SQLITE_READ_POOL_SIZE   read connections per process (default 10)
+    SQLITE_WRITE_POOL_SIZE  write connections per process (default 1)
+'''
+import flask_sqlalchemy.session
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+
+PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,          # milliseconds
+        'mmap_size': 256 * 1024 ** 2,  # bytes
+        'cache_size': -64000,          # negative means KiB, i.e. ~64 MB
+        'temp_store': 'MEMORY',
+    },
+    'default': {},
+}
+DEFAULT_PROFILE = 'production'
+DEFAULT_READ_POOL_SIZE = 10
+DEFAULT_WRITE_POOL_SIZE = 1
+
+
+def pragmas_for(config):
+    pragmas = dict(PROFILES[config.get('SQLITE_PROFILE', DEFAULT_PROFILE)])
+    pragmas.update(config.get('SQLITE_PRAGMAS', {}))
+    return pragmas
+
+
+def apply_pragmas(engine, pragmas):
+    '''Runs ``pragmas`` on every new DBAPI connection of ``engine``.'''
+    @sa.event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def engine_options(config):
+    '''SQLALCHEMY_ENGINE_OPTIONS for the write engine: a single queued connection by default.'''
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return {}
+    return {
+        'poolclass': sa.pool.QueuePool,
+        'pool_size': config.get('SQLITE_WRITE_POOL_SIZE', DEFAULT_WRITE_POOL_SIZE),
+        'max_overflow': 0,
+        'pool_timeout': 30,
+    }
+
+
+def init_app(app, db):
+    '''Applies the profile to db's engine and creates the read engine. Call after db.init_app(app).'''
+    with app.app_context():
+        write_engine = db.engine
+    if write_engine.dialect.name != 'sqlite':
+        return
+    pragmas = pragmas_for(app.config)
+    apply_pragmas(write_engine, pragmas)
+
+    read_engine = sa.create_engine(
+        write_engine.url,
+        poolclass=sa.pool.QueuePool,
+        pool_size=app.config.get('SQLITE_READ_POOL_SIZE', DEFAULT_READ_POOL_SIZE),
+        max_overflow=0,
+        pool_timeout=30,
+    )
+    apply_pragmas(read_engine, dict(pragmas, query_only='ON'))
+    app.extensions['parkedge_read_engine'] = read_engine
+
+
+def read_engine(app=None):
+    '''The read engine of ``app`` (default: the current app), or None if reads are not split.'''
+    app = app or current_app
+    return app.extensions.get('parkedge_read_engine')
+
+
+def dispose(app, db):
+    '''Closes the pooled connections of both engines, e.g. before forking workers or deleting the file.'''
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    engine = read_engine(app)
+    if engine is not None:
+        engine.dispose()
+
+
+class RoutingSession(flask_sqlalchemy.session.Session):
+    '''db.session class that sends reads to the read engine until the transaction writes.'''
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and not self.info.get('wrote'):
+            engine = read_engine()
+            is_write = self._flushing or (clause is not None and getattr(clause, 'is_dml', False))
+            if engine is not None and not is_write:
+                return engine
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@sa.event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
@@ -0,0 +1,124 @@
+'''
+In-process broadcaster for live space updates, served as Server-Sent Events
+by GET /api/spaces/stream.
+
+Committed space changes (see src.models.change.on_space_changes) are loaded
+once, encoded once as an SSE message and handed to every subscriber's queue,
+so publishing costs one query per commit regardless of the subscriber count.
+
+Limits: each worker process accepts at most SSE_MAX_SUBSCRIBERS concurrent
+streams (default 1000); further subscribers get a 503 and should fall back to
+polling /api/spaces?since=. Every open stream occupies a worker thread, so run
+gunicorn with a threaded worker class sized to match, e.g.
+``gunicorn -k gthread --threads 1000``. A subscriber whose queue fills up
+(SUBSCRIBER_QUEUE_SIZE undelivered messages) is disconnected; EventSource
+reconnects and the client resyncs from its last cursor.
+'''
+import json
+import queue
+import threading
+
+from sqlalchemy.orm import Session
+
+from src import database
+from src.models import db
+from src.models.change import on_space_changes
+from src.models.space import ParkingSpace
+from src.serializers import SPACE
+
+DEFAULT_MAX_SUBSCRIBERS = 1000
+SUBSCRIBER_QUEUE_SIZE = 256
+HEARTBEAT_SECONDS = 15
+
+
+def format_event(data, event=None, event_id=None):
+    '''Encodes one SSE message.'''
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+class Subscriber:
+    def __init__(self, bbox=None):
+        self.bbox = bbox
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, latitude, longitude):
+        if self.bbox is None or latitude is None or longitude is None:
+            return True
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not min_lat <= latitude <= max_lat:
+            return False
+        if min_lon <= max_lon:
+            return min_lon <= longitude <= max_lon
+        return longitude >= min_lon or longitude <= max_lon  # Crosses the antimeridian
+
+    def get(self, timeout):
+        '''Returns the next message, or None if nothing arrived within ``timeout``.'''
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Broadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Replaced rather than mutated, so publish() can iterate without the lock
+        self._subscribers = ()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, bbox=None, limit=DEFAULT_MAX_SUBSCRIBERS):
+        '''Returns a new Subscriber, or None if ``limit`` streams are already open.'''
+        with self._lock:
+            if len(self._subscribers) >= limit:
+                return None
+            subscriber = Subscriber(bbox)
+            self._subscribers = self._subscribers + (subscriber,)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+
+    def publish(self, message, latitude=None, longitude=None):
+        '''Queues an encoded message for every subscriber interested in the location.'''
+        for subscriber in self._subscribers:
+            if subscriber.overflowed or not subscriber.wants(latitude, longitude):
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                subscriber.overflowed = True
+
+
+broadcaster = Broadcaster()
+
+
+def publish_space_changes(changes):
+    '''Publishes the committed state of changed spaces to live subscribers.'''
+    if not broadcaster.subscriber_count:
+        return
+
+    latest = {}
+    for cursor, space_id, kind in changes:
+        latest[space_id] = (cursor, kind)
+    # The request session cannot run SQL inside after_commit, so read with a short-lived one
+    # (on the read engine: the committing session may still hold the only write connection)
+    with Session(database.read_engine() or db.engine) as session:
+        spaces = session.scalars(db.select(ParkingSpace).where(ParkingSpace.id.in_(latest))).all()
+        for space in spaces:
+            cursor, kind = latest[space.id]
+            message = format_event({"kind": kind, "space": SPACE.dump(space)}, event='space', event_id=cursor)
+            broadcaster.publish(message, space.latitude, space.longitude)
+
+
+on_space_changes(publish_space_changes)
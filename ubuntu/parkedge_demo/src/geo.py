@@ -0,0 +1,197 @@
+"""Geohash helpers used to index parking spaces by location.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+every prefix names a rectangular cell and all points inside that cell sort
+next to each other. That lets an ordinary B-tree index on the geohash column
+answer bounding-box queries as a handful of range scans.
+"""
+
+import math
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+# Precision stored on every ParkingSpace (~4.8m x 4.8m cells).
+GEOHASH_PRECISION = 9
+
+# Upper bound on the number of cells used to cover one bounding box.
+MAX_COVER_CELLS = 32
+
+# Mean Earth radius, for haversine distances.
+EARTH_RADIUS_M = 6371008.8
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    '''Returns the geohash of a point at the given precision.'''
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Even bits encode longitude, odd bits latitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def decode_bbox(geohash):
+    '''Returns the (min_lat, min_lon, max_lat, max_lon) cell of a geohash.'''
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def cell_size(precision):
+    '''Returns the (height, width) in degrees of a cell at this precision.'''
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def prefix_upper_bound(prefix):
+    '''
+    Returns the smallest string sorting after every geohash with this prefix,
+    i.e. the next prefix of the same length in base32 order.
+    '''
+    chars = list(prefix)
+    while chars:
+        index = _DECODE[chars[-1]]
+        if index < len(_BASE32) - 1:
+            chars[-1] = _BASE32[index + 1]
+            return ''.join(chars)
+        chars.pop()
+    return '~'  # Sorts after every base32 character
+
+
+def _grid_span(min_value, max_value, origin, step):
+    first = int((min_value - origin) // step)
+    last = int((max_value - origin) // step)
+    return first, last
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS):
+    '''
+    Returns the sorted geohash prefixes whose cells cover a bounding box.
+
+    Picks the finest precision that still covers the box with at most
+    ``max_cells`` cells, so small viewports scan tight ranges and large ones
+    fall back to a few coarse prefixes. Boxes crossing the antimeridian
+    (``min_lon > max_lon``) are split in two.
+    '''
+    if min_lon > max_lon:
+        return sorted(set(cover(min_lat, min_lon, max_lat, 180.0, max_cells)) |
+                      set(cover(min_lat, -180.0, max_lat, max_lon, max_cells)))
+
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        first_row, last_row = _grid_span(min_lat, max_lat, -90.0, height)
+        first_col, last_col = _grid_span(min_lon, max_lon, -180.0, width)
+        if (last_row - first_row + 1) * (last_col - first_col + 1) <= max_cells:
+            break
+
+    cells = set()
+    for row in range(first_row, last_row + 1):
+        lat = min(-90.0 + (row + 0.5) * height, 90.0)
+        for col in range(first_col, last_col + 1):
+            lon = min(-180.0 + (col + 0.5) * width, 180.0)
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def cover_ranges(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS):
+    '''
+    Returns ``[(low, high), ...]`` half-open string ranges on the geohash
+    column that together contain every point of the bounding box.
+
+    Adjacent prefixes are merged so the database sees as few range scans as
+    possible.
+    '''
+    ranges = []
+    for prefix in cover(min_lat, min_lon, max_lat, max_lon, max_cells):
+        low, high = prefix, prefix_upper_bound(prefix)
+        if ranges and ranges[-1][1] == low:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
+
+
+def bbox_around(latitude, longitude, radius_m):
+    '''
+    Returns the (min_lat, min_lon, max_lat, max_lon) box containing every
+    point within ``radius_m`` metres of a point. Near the poles, or once the
+    radius spans the globe, the box widens to every longitude; across the
+    antimeridian ``min_lon > max_lon``, as cover() expects.
+    '''
+    lat_delta = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    # The widest point of the circle is at the latitude nearest the pole
+    lon_delta = lat_delta / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if lon_delta >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+    wrap = lambda lon: (lon + 180.0) % 360.0 - 180.0
+    return min_lat, wrap(min_lon), max_lat, wrap(max_lon)
+
+
+def distances_m(latitude, longitude, points):
+    '''
+    Returns the haversine distance in metres from a point to each
+    ``(latitude, longitude)`` in ``points``. The origin's trigonometry is
+    computed once, leaving a few float operations per point.
+    '''
+    lat0 = math.radians(latitude)
+    lon0 = math.radians(longitude)
+    cos_lat0 = math.cos(lat0)
+    sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+    diameter = 2 * EARTH_RADIUS_M
+    return [
+        diameter * asin(min(1.0, sqrt(sin((radians(lat) - lat0) / 2) ** 2 +
+                                      cos_lat0 * cos(radians(lat)) * sin((radians(lon) - lon0) / 2) ** 2)))
+        for lat, lon in points
+    ]
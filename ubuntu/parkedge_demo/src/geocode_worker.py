@@ -0,0 +1,182 @@
+'''
+Background geocoding for spaces created with ?async=true.
+
+create_space stores the space with geocode_status 'pending' and a GeocodeJob
+row, and returns 202 straight away. Worker threads claim due jobs from the
+geocode_job table, geocode through the shared cache and rate limiter in
+src/geocoding.py, and fill in the coordinates. A space only appears on the
+map (and in the change log) once it has been located.
+
+Jobs that hit a geocoder failure are retried with exponential backoff; an
+address the geocoder cannot find fails immediately. A job left 'running' by
+a crashed worker is claimed again after STALE_CLAIM_SECONDS.
+
+Configuration (app.config):
+    GEOCODE_WORKERS        worker threads per process (default 1, 0 disables;
+                           jobs can then be drained with `flask spaces geocode-pending`)
+    GEOCODE_MAX_ATTEMPTS   attempts before a job is marked failed (default 5)
+    GEOCODE_RETRY_BACKOFF  seconds before the first retry, doubled each time (default 30)
+'''
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from src import geocoding
+from src.models import db
+from src.models.change import record_space_change
+from src.models.geocode import GeocodeJob
+
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BACKOFF = 30
+STALE_CLAIM_SECONDS = 300
+# How long a worker waits for a rate limiter slot; workers are off the request path, so be patient
+LIMITER_WAIT_SECONDS = 120
+IDLE_POLL_SECONDS = 5
+
+
+def enqueue(space):
+    '''Marks ``space`` as pending and queues a job for it in the current transaction.'''
+    space.geocode_status = 'pending'
+    job = GeocodeJob(space=space)
+    db.session.add(job)
+    return job
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=STALE_CLAIM_SECONDS)
+    return db.or_(
+        db.and_(GeocodeJob.status == 'pending', GeocodeJob.next_attempt_at <= now),
+        db.and_(GeocodeJob.status == 'running', GeocodeJob.claimed_at < stale),
+    )
+
+
+def claim_next_job():
+    '''
+    Atomically marks the next due job as running and returns its id, or None.
+    The claim is a single conditional UPDATE, so two workers (or processes)
+    can never take the same job.
+    '''
+    now = datetime.utcnow()
+    candidate = (
+        db.select(GeocodeJob.id).where(_claimable(now))
+        .order_by(GeocodeJob.next_attempt_at).limit(1).scalar_subquery()
+    )
+    job_id = db.session.scalar(
+        db.update(GeocodeJob)
+        .where(GeocodeJob.id == candidate, _claimable(now))
+        .values(status='running', claimed_at=now, attempts=GeocodeJob.attempts + 1)
+        .returning(GeocodeJob.id)
+    )
+    db.session.commit()
+    return job_id
+
+
+def process_job(job_id):
+    '''Geocodes the space behind a claimed job and records the outcome.'''
+    config = current_app.config
+    job = db.session.get(GeocodeJob, job_id)
+    space = job.space
+    try:
+        location = geocoding.geocode(space.address, wait=LIMITER_WAIT_SECONDS)
+    except geocoding.GeocoderError as e:
+        if job.attempts >= config.get('GEOCODE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+            _fail(job, space, f"Geocoding service request failed: {e}")
+        else:
+            backoff = config.get('GEOCODE_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF) * 2 ** (job.attempts - 1)
+            job.status = 'pending'
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+            job.last_error = str(e)
+    except (ValueError, KeyError) as e:
+        _fail(job, space, f"Error processing geocoding result: {e}")
+    else:
+        if location is None:
+            _fail(job, space, "Could not geocode address. No results found.")
+        else:
+            space.latitude, space.longitude = location
+            space.geocode_status = 'ok'
+            job.status = 'done'
+            job.last_error = None
+            record_space_change(space, 'created')
+    db.session.commit()
+
+
+def _fail(job, space, message):
+    job.status = 'failed'
+    job.last_error = message
+    space.geocode_status = 'failed'
+
+
+def run_pending(max_jobs=None):
+    '''Processes due jobs until none are left (or ``max_jobs`` ran). Returns the number processed.'''
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job_id = claim_next_job()
+        if job_id is None:
+            break
+        process_job(job_id)
+        processed += 1
+    return processed
+
+
+class GeocodeWorkerPool:
+    '''Daemon threads that drain the geocode queue for one app.'''
+
+    def __init__(self, app, size):
+        self.app = app
+        self.size = size
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._threads = []
+
+    def start(self):
+        for number in range(self.size):
+            thread = threading.Thread(target=self._run, name=f'geocode-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        '''Wakes idle workers, e.g. right after a job was committed.'''
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                with self.app.app_context():
+                    processed = run_pending(max_jobs=10)
+            except Exception:
+                self.app.logger.exception("Geocode worker failed")
+                processed = 0
+            if not processed:
+                self._wakeup.wait(IDLE_POLL_SECONDS)
+                self._wakeup.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def start_pool(app):
+    '''Starts this process's worker pool once; a no-op if GEOCODE_WORKERS is 0.'''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = app.config.get('GEOCODE_WORKERS', DEFAULT_WORKERS)
+                pool = GeocodeWorkerPool(app, size)
+                if size > 0:
+                    pool.start()
+                _pool = pool
+    return _pool
+
+
+def notify():
+    '''Tells the local pool (if running) that a new job is waiting.'''
+    if _pool is not None:
+        _pool.notify()
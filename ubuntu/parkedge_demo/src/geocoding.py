@@ -0,0 +1,273 @@
+'''
+Address geocoding with a two-tier cache in front of the external geocoder.
+
+Addresses are normalized (case, punctuation, whitespace and common street
+type abbreviations) into a cache key. A lookup checks a per-process LRU
+first, then the geocode_cache table, and only calls the geocoder on a miss.
+"No results" answers are cached too, for a shorter time, so a bad address
+is not retried on every submit.
+
+Configuration (app.config):
+    GEOCODER_URL          search endpoint (Nominatim by default)
+    GEOCODER_USER_AGENT   User-Agent sent with every request; Nominatim requires one
+    GEOCODER_TIMEOUT      request timeout in seconds (default 10)
+    GEOCODE_CACHE_TTL     seconds a found address stays cached (default 30 days)
+    GEOCODE_NEGATIVE_TTL  seconds a not-found address stays cached (default 1 day)
+    GEOCODE_CACHE_SIZE    entries kept in memory per process (default 10000)
+    GEOCODER_RATE_LIMIT   outbound requests per second per process (default 1,
+                          Nominatim's usage policy); divide by the number of
+                          worker processes when running several
+'''
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+
+import cachetools
+from flask import current_app
+
+from src import database, metrics
+from src.models import db
+from src.models.geocode import GeocodeCacheEntry
+
+DEFAULT_GEOCODER_URL = 'https://nominatim.openstreetmap.org/search'
+DEFAULT_USER_AGENT = 'ParkEdge Demo Application/1.0'
+DEFAULT_TIMEOUT = 10
+DEFAULT_CACHE_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_RATE_LIMIT = 1.0
+
+_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd',
+    'drive': 'dr', 'lane': 'ln', 'court': 'ct', 'place': 'pl',
+    'square': 'sq', 'highway': 'hwy', 'parkway': 'pkwy', 'terrace': 'ter',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'suite': 'ste', 'apartment': 'apt',
+}
+
+# Returned by GeocodeCache.get when the address is not cached at all, as
+# opposed to None, which is a cached "no results".
+MISSING = object()
+
+# Keep-alive connection pool shared by all geocoder requests, created on
+# first use so that importing this module does not load requests
+_http = None
+_http_lock = threading.Lock()
+
+def _session():
+    global _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                import requests
+                _http = requests.Session()
+    return _http
+
+
+def normalize_address(address):
+    '''Returns the cache key for an address.'''
+    text = unicodedata.normalize('NFKC', address).casefold()
+    text = re.sub(r'[^\w\s#/-]', ' ', text)
+    return ' '.join(_ABBREVIATIONS.get(word, word) for word in text.split())[:255]
+
+
+class GeocodeCache:
+    '''In-memory LRU backed by the geocode_cache table, with hit/miss counters.'''
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self._memory = cachetools.LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0}
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.stats[counter] += amount
+
+    def get(self, key):
+        '''Returns the cached location (a (lat, lon) tuple or None), or MISSING.'''
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and entry[1] > now:
+            self._count('memory_hits')
+            return entry[0]
+
+        # Own connection, so cache reads and writes never join the request's transaction
+        with (database.read_engine() or db.engine).connect() as connection:
+            row = connection.execute(
+                db.select(GeocodeCacheEntry.latitude, GeocodeCacheEntry.longitude, GeocodeCacheEntry.expires_at)
+                .where(GeocodeCacheEntry.key == key)
+            ).first()
+        if row is not None and row.expires_at > now:
+            location = (row.latitude, row.longitude) if row.latitude is not None else None
+            with self._lock:
+                self._memory[key] = (location, row.expires_at)
+            self._count('persistent_hits')
+            return location
+
+        self._count('misses')
+        return MISSING
+
+    def get_many(self, keys):
+        '''Returns {key: location} for the cached keys among ``keys``, with one query for the memory misses.'''
+        now = datetime.utcnow()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and entry[1] > now:
+                    found[key] = entry[0]
+        self._count('memory_hits', len(found))
+
+        remaining = [key for key in keys if key not in found]
+        persistent = 0
+        # Chunked to stay under SQLite's bound parameter limit
+        for start in range(0, len(remaining), 500):
+            with (database.read_engine() or db.engine).connect() as connection:
+                rows = connection.execute(
+                    db.select(GeocodeCacheEntry.key, GeocodeCacheEntry.latitude, GeocodeCacheEntry.longitude,
+                              GeocodeCacheEntry.expires_at)
+                    .where(GeocodeCacheEntry.key.in_(remaining[start:start + 500]))
+                ).all()
+            for row in rows:
+                if row.expires_at <= now:
+                    continue
+                location = (row.latitude, row.longitude) if row.latitude is not None else None
+                with self._lock:
+                    self._memory[row.key] = (location, row.expires_at)
+                found[row.key] = location
+                persistent += 1
+        self._count('persistent_hits', persistent)
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def put(self, key, location, ttl):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        with self._lock:
+            self._memory[key] = (location, expires_at)
+        latitude, longitude = location if location is not None else (None, None)
+        with db.engine.begin() as connection:
+            connection.execute(
+                db.insert(GeocodeCacheEntry).prefix_with('OR REPLACE')
+                .values(key=key, latitude=latitude, longitude=longitude, expires_at=expires_at)
+            )
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    '''Returns this process's GeocodeCache, created on first use.'''
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeocodeCache(current_app.config.get('GEOCODE_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+    return _cache
+
+
+class GeocoderError(Exception):
+    '''The geocoding service failed, timed out or answered with an HTTP error.'''
+
+
+class GeocoderBusy(GeocoderError):
+    '''No request slot became free under the rate limit in time.'''
+
+
+class TokenBucket:
+    '''Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``.'''
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        '''Takes a token, waiting up to ``timeout`` seconds (forever if None). Returns False on timeout.'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+# Shared by every geocoder request in this process, request threads and background workers alike
+rate_limiter = TokenBucket(DEFAULT_RATE_LIMIT)
+
+
+def lookup(address, wait=None):
+    '''
+    Queries the geocoder directly, after taking a slot from the rate limiter
+    (waiting up to ``wait`` seconds, default GEOCODER_TIMEOUT). Returns
+    (latitude, longitude) or None if nothing matched. Raises GeocoderError
+    if the service fails or is busy and ValueError if the response is
+    malformed.
+    '''
+    import requests
+
+    config = current_app.config
+    rate_limiter.rate = config.get('GEOCODER_RATE_LIMIT', DEFAULT_RATE_LIMIT)
+    if wait is None:
+        wait = config.get('GEOCODER_TIMEOUT', DEFAULT_TIMEOUT)
+    if not rate_limiter.acquire(timeout=wait):
+        raise GeocoderBusy("Geocoder rate limit reached.")
+    try:
+        with metrics.time_outbound('geocoder'):
+            response = _session().get(
+                config.get('GEOCODER_URL', DEFAULT_GEOCODER_URL),
+                params={'q': address, 'format': 'json', 'limit': 1, 'addressdetails': 1},
+                headers={'User-Agent': config.get('GEOCODER_USER_AGENT', DEFAULT_USER_AGENT)},
+                timeout=config.get('GEOCODER_TIMEOUT', DEFAULT_TIMEOUT)
+            )
+            response.raise_for_status() # Raise an exception for HTTP errors (4XX, 5XX)
+    except requests.exceptions.RequestException as e:
+        raise GeocoderError(str(e)) from e
+    results = response.json()
+    if not results or not isinstance(results, list):
+        return None
+
+    latitude = results[0].get('lat')
+    longitude = results[0].get('lon')
+    if not latitude or not longitude:
+        raise ValueError("Latitude or Longitude not found in geocoding response.")
+    return float(latitude), float(longitude) # Nominatim returns strings
+
+
+def geocode(address, wait=None):
+    '''
+    Returns (latitude, longitude) for an address, or None if it could not be
+    found, consulting the cache first. Raises like lookup() on a cache miss;
+    cache hits never wait for the rate limiter.
+    '''
+    cache = get_cache()
+    key = normalize_address(address)
+    location = cache.get(key)
+    if location is not MISSING:
+        return location
+
+    location = lookup(address, wait=wait)
+    if location is None:
+        ttl = current_app.config.get('GEOCODE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)
+    else:
+        ttl = current_app.config.get('GEOCODE_CACHE_TTL', DEFAULT_CACHE_TTL)
+    cache.put(key, location, ttl)
+    return location
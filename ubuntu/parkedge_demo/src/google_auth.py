@@ -0,0 +1,185 @@
+'''
+Google sign-in plumbing for routes/auth.py, kept warm between logins.
+
+A login callback makes one outbound request, the authorization code
+exchange. The rest is served from process state:
+
+* ID tokens are checked against Google's signing certificates, which are
+  cached for as long as the certificate endpoint's Cache-Control max-age
+  allows (less its Age). Only one request refreshes them when they expire;
+  concurrent logins wait for it instead of fetching their own copy.
+* The certificate fetch and every Flow's token exchange share one
+  keep-alive connection pool, so logins skip the TCP and TLS handshakes.
+* The Flow client config is built once per set of credentials rather than
+  on every request.
+
+requests and google-auth are imported on first use, so that only processes
+that actually sign someone in pay for loading them.
+
+Configuration (app.config):
+    GOOGLE_AUTH_URI      authorization endpoint (Google's by default)
+    GOOGLE_TOKEN_URI     token endpoint (Google's by default)
+    GOOGLE_CERTS_URL     ID token signing certificates (Google's by default)
+    GOOGLE_HTTP_TIMEOUT  request timeout in seconds (default 10)
+'''
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import current_app
+
+from src import metrics
+
+DEFAULT_AUTH_URI = 'https://accounts.google.com/o/oauth2/auth'
+DEFAULT_TOKEN_URI = 'https://oauth2.googleapis.com/token'
+DEFAULT_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+DEFAULT_TIMEOUT = 10
+
+ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Keep-alive connection pool shared by the certificate fetch and every
+# Flow's OAuth2Session (see share_connections), created on first use
+_adapter = None
+_http = None
+_http_lock = threading.Lock()
+
+_MAX_AGE = re.compile(r'(?:^|,)\s*max-age\s*=\s*"?(\d+)', re.IGNORECASE)
+_NO_CACHE = re.compile(r'(?:^|,)\s*(?:no-cache|no-store)\b', re.IGNORECASE)
+
+
+def get_timeout():
+    return current_app.config.get('GOOGLE_HTTP_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _session():
+    global _adapter, _http
+    if _http is None:
+        with _http_lock:
+            if _http is None:
+                import requests
+                _adapter = requests.adapters.HTTPAdapter(pool_maxsize=32)
+                session = requests.Session()
+                session.mount('https://', _adapter)
+                session.mount('http://', _adapter)
+                _http = session
+    return _http
+
+
+def share_connections(session):
+    '''Routes a requests.Session (e.g. a Flow's oauth2session) through the shared pool.'''
+    _session()
+    session.mount('https://', _adapter)
+    session.mount('http://', _adapter)
+    return session
+
+
+def cache_lifetime(headers):
+    '''Seconds a response may be reused according to its Cache-Control and Age headers.'''
+    cache_control = headers.get('Cache-Control', '')
+    match = _MAX_AGE.search(cache_control)
+    if match is None or _NO_CACHE.search(cache_control):
+        return 0
+    try:
+        age = int(headers.get('Age', 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+class CertificateCache:
+    '''Signing certificates by URL, each kept until its Cache-Control lifetime runs out.'''
+
+    def __init__(self):
+        self._entries = {} # url -> (expires_at, certificates)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'fetches': 0}
+
+    def _fresh(self, url):
+        entry = self._entries.get(url)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def get(self, url, timeout=DEFAULT_TIMEOUT):
+        '''The {key id: certificate} mapping published at ``url``.'''
+        certificates = self._fresh(url)
+        if certificates is not None:
+            self.stats['hits'] += 1
+            return certificates
+        with self._lock:
+            # Another login may have refreshed them while we waited
+            certificates = self._fresh(url)
+            if certificates is None:
+                certificates = self._fetch(url, timeout)
+            return certificates
+
+    def _fetch(self, url, timeout):
+        import requests
+        from google.auth import exceptions
+        try:
+            with metrics.time_outbound('google_certs'):
+                response = _session().get(url, timeout=timeout)
+        except requests.RequestException as e:
+            raise exceptions.TransportError(f'Could not fetch certificates at {url}: {e}') from e
+        if response.status_code != 200:
+            raise exceptions.TransportError(f'Could not fetch certificates at {url}: HTTP {response.status_code}')
+        certificates = response.json()
+        self.stats['fetches'] += 1
+        self._entries[url] = (time.monotonic() + cache_lifetime(response.headers), certificates)
+        return certificates
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    '''Returns this process's certificate cache, created on first use.'''
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CertificateCache()
+    return _cache
+
+
+@lru_cache(maxsize=8)
+def _client_config(client_id, client_secret, redirect_uri, auth_uri, token_uri):
+    return {
+        "web": {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "auth_uri": auth_uri,
+            "token_uri": token_uri,
+            "issuer": "https://accounts.google.com",
+            "redirect_uris": [redirect_uri],
+            "userinfo_uri": "https://openidconnect.googleapis.com/v1/userinfo",
+        }
+    }
+
+
+def client_config(client_id, client_secret, redirect_uri):
+    '''The Flow client config for these credentials and the configured endpoints. Treat as read-only.'''
+    config = current_app.config
+    return _client_config(client_id, client_secret, redirect_uri,
+                          config.get('GOOGLE_AUTH_URI', DEFAULT_AUTH_URI),
+                          config.get('GOOGLE_TOKEN_URI', DEFAULT_TOKEN_URI))
+
+
+def verify_id_token(token, audience):
+    '''
+    Checks an ID token's signature, expiry, audience and issuer against the
+    cached certificates, like google.oauth2.id_token.verify_oauth2_token,
+    and returns its claims. Raises ValueError if the token does not verify
+    and GoogleAuthError for a wrong issuer.
+    '''
+    from google.auth import exceptions, jwt
+    certificates = get_cache().get(current_app.config.get('GOOGLE_CERTS_URL', DEFAULT_CERTS_URL), get_timeout())
+    claims = jwt.decode(token, certs=certificates, audience=audience)
+    if claims.get('iss') not in ISSUERS:
+        raise exceptions.GoogleAuthError(f"Wrong issuer. 'iss' should be one of the following: {list(ISSUERS)}")
+    return claims
@@ -3,69 +3,109 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, jsonify
 from flask_login import LoginManager
 from src.models import db # Correctly import db
-from src.models.user import User # Import the User model
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT_parkedge'
-
-# Configure SQLite database
-# The database file will be created in the 'src' directory, next to main.py
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'parkedge.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+from src import assets, database, geocode_worker, metrics, ops, response_cache, user_cache
 
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
+login_manager.blueprint_login_views = {'user': None} # A JSON API: 401 rather than a redirect to sign-in
 
 @login_manager.user_loader
 def load_user(user_id):
-    # Updated to use SQLAlchemy 2.0 db.session.get
-    return db.session.get(User, int(user_id))
-
-# Import models here to ensure they are registered with SQLAlchemy before create_all
-# Import User is already above, ParkingSpace and Review will be implicitly known via models/__init__.py
-# when db.create_all() is called.
-from src.models.space import ParkingSpace 
-from src.models.review import Review # Ensure Review is imported if not covered by __all__ in models
-
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
-
-# Import and register blueprints
-from src.routes.spaces import spaces_bp
-from src.routes.auth import auth_bp 
-from src.routes.reviews import reviews_bp
-from src.routes.booking_routes import bookings_bp # Added this line
-app.register_blueprint(spaces_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/auth') 
-app.register_blueprint(reviews_bp, url_prefix='/api') 
-app.register_blueprint(bookings_bp) # Added this line, url_prefix is in the blueprint itself
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
+    # Cached per process, so identifying the caller needs no SQL (src/user_cache.py)
+    return user_cache.load_user(user_id)
+
+
+def create_app(config=None):
+    '''
+    Builds the application. ``config`` is applied over the defaults, before
+    anything reads them (e.g. SQLALCHEMY_DATABASE_URI for tests).
+
+    Does not touch the database: create or upgrade the schema with
+    init_db(app), or `flask --app src.main init-db`. It also starts no
+    threads, so it is safe to call in a gunicorn master before forking
+    (see src/wsgi.py).
+    '''
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT_parkedge'
+
+    # Configure SQLite database
+    # The database file will be created in the 'src' directory, next to main.py
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'parkedge.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_PROFILE'] = os.environ.get('PARKEDGE_SQLITE_PROFILE', database.DEFAULT_PROFILE)
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', database.engine_options(app.config))
+    db.init_app(app)
+    database.init_app(app, db) # WAL pragmas and the read/write engine split
+    metrics.init_app(app, db) # First, so request timings include the other hooks (src/metrics.py)
+
+    login_manager.init_app(app)
+
+    # Import and register blueprints
+    from src.routes.spaces import spaces_bp
+    from src.routes.auth import auth_bp
+    from src.routes.reviews import reviews_bp
+    from src.routes.booking_routes import bookings_bp
+    from src.routes.user import user_bp
+    app.register_blueprint(spaces_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(reviews_bp, url_prefix='/api')
+    app.register_blueprint(bookings_bp) # url_prefix is in the blueprint itself
+    app.register_blueprint(user_bp, url_prefix='/api')
+
+    # Background geocoding threads start with the first request, so they run in
+    # each server worker process rather than in a preloading master
+    @app.before_request
+    def start_geocode_workers():
+        geocode_worker.start_pool(app)
+
+    app.add_url_rule('/api/cache/stats', 'cache_stats', cache_stats)
+
+    # Static files, with their compressed variants and fingerprinted URLs, are
+    # read once here and served from memory (src/assets.py)
+    assets.init_app(app)
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        '''Creates the database tables and applies pending migrations.'''
+        init_db(app)
+        print("Database is up to date.")
+
+    return app
+
+
+def init_db(app):
+    '''
+    Creates missing tables, then brings an older database up to date
+    (src/models/migrations.py). Closes the connections it used afterwards,
+    so a process that forks workers next does not hand them its SQLite
+    handles.
+    '''
+    from src.models import migrations
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade()
+    database.dispose(app, db)
+
+
+# Hit rate, evictions and size of this process's response cache, for operators (src/ops.py)
+@ops.ops_only
+def cache_stats():
+    return jsonify(response_cache.get_cache().snapshot())
+
+
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        map_view_path = os.path.join(static_folder_path, 'map_view.html')
-        if os.path.exists(map_view_path):
-            return send_from_directory(static_folder_path, 'map_view.html')
-        else:
-            index_path = os.path.join(static_folder_path, 'index.html')
-            if os.path.exists(index_path):
-                return send_from_directory(static_folder_path, 'index.html')
-            else:
-                return "map_view.html or index.html not found in static folder", 404
+    # Files by path; anything else gets the single-page app (map_view.html)
+    return assets.serve(path)
+
 
 if __name__ == '__main__':
+    app = create_app()
+    init_db(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,223 @@
+'''
+Request, SQL and outbound call metrics, served at /metrics in the
+Prometheus text format.
+
+init_app() adds a before_request/after_request pair and listens for
+cursor executions on the app's engines. Every request records:
+- its latency, by blueprint, route template and method;
+- its status code;
+- the number of SQL statements it ran and the time they took.
+
+Like the other operational endpoints, /metrics requires the OPS_TOKEN
+bearer token (src/ops.py); give the scraper the same token.
+
+Calls to the geocoder and to Google's token and certificate endpoints are
+timed with time_outbound(). Background work (the geocoding threads) is
+timed there too. Its SQL is not attributed to any request.
+
+Recording a sample is a bisect and a few additions under a lock. See
+benchmarks/bench_metrics.py for the cost against an uninstrumented app.
+
+The figures are per process. Under gunicorn each worker keeps its own, and
+a scrape of /metrics reads whichever worker answers. Scrape the workers
+individually, or treat the series as a sample of one worker.
+
+Configuration (app.config):
+    METRICS_ENABLED  record metrics and serve /metrics (default True)
+    OPS_TOKEN        bearer token /metrics requires (see src/ops.py)
+'''
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, request
+from sqlalchemy import event
+
+from src import database, ops
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# [statements, seconds] of SQL run by the current request; None outside requests
+_request_sql = contextvars.ContextVar('request_sql', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    '''A monotonically increasing count per combination of label values.'''
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    '''Observations bucketed by upper bound (Prometheus "le"), per combination of label values.'''
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [count per bucket..., count above the last bucket, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def sum(self, labels):
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = (('le', _format_value(float(bound))),)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(values[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+ROUTE_LABELS = ('blueprint', 'route', 'method')
+
+request_latency = Histogram('http_request_duration_seconds', 'Time to build the response.',
+                            ROUTE_LABELS, LATENCY_BUCKETS)
+request_count = Counter('http_requests_total', 'Responses by status code.', ROUTE_LABELS + ('status',))
+request_statements = Histogram('http_request_sql_statements', 'SQL statements run per request.',
+                               ROUTE_LABELS, STATEMENT_BUCKETS)
+request_sql_time = Histogram('http_request_sql_duration_seconds', 'Time per request spent running SQL.',
+                             ROUTE_LABELS, LATENCY_BUCKETS)
+outbound_latency = Histogram('outbound_request_duration_seconds',
+                             'Calls to external services (geocoder, Google OAuth), by outcome.',
+                             ('service', 'outcome'), LATENCY_BUCKETS)
+
+REGISTRY = (request_latency, request_count, request_statements, request_sql_time, outbound_latency)
+
+
+def render():
+    '''All metrics in the Prometheus text exposition format.'''
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def time_outbound(service):
+    '''Times the enclosed call to ``service``; the outcome is "error" if it raises.'''
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        outbound_latency.observe((service, outcome), time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tally = _request_sql.get()
+    if tally is not None:
+        tally[0] += 1
+        tally[1] += time.perf_counter() - context.metrics_started
+
+
+def _start_request():
+    request.environ['parkedge.metrics_start'] = time.perf_counter()
+    _request_sql.set([0, 0.0])
+
+
+def _finish_request(response):
+    # One proxy lookup instead of one per attribute
+    req = request._get_current_object()
+    start = req.environ.get('parkedge.metrics_start')
+    tally = _request_sql.get()
+    if start is None or tally is None:
+        return response
+    rule = req.url_rule
+    labels = (req.blueprint or '', rule.rule if rule is not None else 'unmatched', req.method)
+    request_latency.observe(labels, time.perf_counter() - start)
+    request_count.inc(labels + (str(response.status_code),))
+    request_statements.observe(labels, tally[0])
+    request_sql_time.observe(labels, tally[1])
+    _request_sql.set(None)
+    return response
+
+
+@ops.ops_only
+def metrics_view():
+    return current_app.response_class(render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app, db):
+    '''Instruments ``app`` and its engines and serves /metrics, unless METRICS_ENABLED is off.'''
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    with app.app_context():
+        engines = [db.engine, database.read_engine(app)]
+    for engine in engines:
+        if engine is not None:
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,13 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
+from src.database import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession sends reads to the read engine; see src/database.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Import models here to ensure they are registered with SQLAlchemy
 # and for easier access from other parts of the application.
 from .user import User
 from .space import ParkingSpace
 from .review import Review
-from .booking import Booking
+from .booking import Booking, BookingSlot
+from .change import SpaceChange
+from .geocode import GeocodeCacheEntry, GeocodeJob
+from .cluster import SpaceCluster
+from .tile import TileVersion
+from . import search # Registers the address index with parking_space
 
-__all__ = ['db', 'User', 'ParkingSpace', 'Review', 'Booking']
+__all__ = ['db', 'User', 'ParkingSpace', 'Review', 'Booking', 'BookingSlot', 'SpaceChange', 'GeocodeCacheEntry', 'GeocodeJob',
+           'SpaceCluster', 'TileVersion']
 
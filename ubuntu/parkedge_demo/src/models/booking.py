@@ -1,5 +1,5 @@
 from . import db
-from datetime import datetime
+from datetime import datetime, timedelta
 # It's good practice to import User and ParkingSpace if type hinting or specific relationships need them explicitly.
 # from .user import User --- Not strictly needed for ForeignKey string definition but good for clarity
 # from .space import ParkingSpace --- Same as above
@@ -13,6 +13,10 @@ class Booking(db.Model):
     booking_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     # status could be: 'pending', 'confirmed', 'active', 'completed', 'cancelled'
     status = db.Column(db.String(50), nullable=False, default='confirmed') 
+    # The booked window, in UTC. Both are null for a legacy open-ended booking,
+    # which holds the whole space via ParkingSpace.is_booked instead.
+    start_time = db.Column(db.DateTime, nullable=True)
+    end_time = db.Column(db.DateTime, nullable=True)
     # Add price_at_booking if price can change and you want to record it
     # price_at_booking = db.Column(db.String(50), nullable=True) 
 
@@ -20,17 +24,66 @@ class Booking(db.Model):
     # The backref in User and ParkingSpace will allow access like user.bookings or space.bookings
     user = db.relationship('User', backref=db.backref('bookings', lazy='dynamic'))
     space = db.relationship('ParkingSpace', backref=db.backref('bookings', lazy='dynamic'))
+    slots = db.relationship('BookingSlot', backref='booking', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        # A user's active bookings (the booking limit) and booking history
+        db.Index('ix_booking_user_status', 'user_id', 'status', 'end_time'),
+        # Newest-first booking history pages
+        db.Index('ix_booking_user_time', 'user_id', 'booking_time'),
+    )
 
     def __repr__(self):
         return f'<Booking {self.id} by User {self.user_id} for Space {self.space_id} - Status: {self.status}>'
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'space_id': self.space_id,
-            'booking_time': self.booking_time.isoformat(),
-            'status': self.status,
-            'user_username': self.user.username if self.user else None, # Optional: include for convenience
-            'space_address': self.space.address if self.space else None # Optional: include for convenience
-        }
+        from src.serializers import BOOKING
+        return BOOKING.dump(self)
+
+
+# --- Availability index ---
+# A windowed booking claims one BookingSlot row per SLOT_MINUTES of its
+# window. The unique (space_id, slot) index turns "is this space free between
+# T1 and T2" into a short index range probe per space, and makes the database
+# itself reject a second booking of any overlapping slot.
+
+SLOT_MINUTES = 15
+MAX_WINDOW = timedelta(days=31)
+_EPOCH = datetime(1970, 1, 1)
+
+def slot_number(moment):
+    '''Index of the SLOT_MINUTES slot containing ``moment`` (a naive UTC datetime).'''
+    return int((moment - _EPOCH).total_seconds()) // (SLOT_MINUTES * 60)
+
+def slot_range(start_time, end_time):
+    '''The slots covered by the half-open window [start_time, end_time).'''
+    return range(slot_number(start_time), slot_number(end_time - timedelta(microseconds=1)) + 1)
+
+def is_slot_aligned(moment):
+    return moment.second == 0 and moment.microsecond == 0 and moment.minute % SLOT_MINUTES == 0
+
+
+class BookingSlot(db.Model):
+    __tablename__ = 'booking_slot'
+
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=False, index=True)
+    space_id = db.Column(db.Integer, db.ForeignKey('parking_space.id'), nullable=False)
+    slot = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('space_id', 'slot', name='uq_booking_slot_space_slot'),
+    )
+
+    def __repr__(self):
+        return f'<BookingSlot Space {self.space_id} slot {self.slot} for Booking {self.booking_id}>'
+
+    @classmethod
+    def overlapping(cls, space_id_column, start_time, end_time):
+        '''A correlated EXISTS that is true when the space has a booked slot in [start_time, end_time).'''
+        slots = slot_range(start_time, end_time)
+        return (
+            db.select(cls.id)
+            .where(cls.space_id == space_id_column, cls.slot >= slots.start, cls.slot < slots.stop)
+            .exists()
+        )
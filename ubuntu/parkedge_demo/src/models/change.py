@@ -0,0 +1,97 @@
+from . import db
+from datetime import datetime
+
+class SpaceChange(db.Model):
+    '''
+    Append-only log of changes visible on the map (a space created, booked or
+    re-rated). The autoincrement id is the sync cursor handed to clients:
+    "everything after change N".
+    '''
+    __tablename__ = 'space_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    space_id = db.Column(db.Integer, db.ForeignKey('parking_space.id'), nullable=False, index=True)
+    # kind is one of: 'created', 'booked', 'rated'
+    kind = db.Column(db.String(20), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    space = db.relationship('ParkingSpace')
+
+    def __repr__(self):
+        return f'<SpaceChange {self.id} {self.kind} Space {self.space_id}>'
+
+    @classmethod
+    def latest_id(cls):
+        '''Returns the current sync cursor (0 when nothing has changed yet).'''
+        return db.session.scalar(db.select(db.func.max(cls.id))) or 0
+
+    @classmethod
+    def changed_space_ids(cls, since):
+        '''Ids of spaces changed after cursor ``since``.'''
+        stmt = db.select(cls.space_id).where(cls.id > since).distinct()
+        return db.session.scalars(stmt).all()
+
+
+def record_space_change(space, kind):
+    '''
+    Logs a change to ``space`` in the current transaction. ``space`` may be a
+    ParkingSpace (including one not yet flushed) or a space id.
+    '''
+    if isinstance(space, int):
+        change = SpaceChange(space_id=space, kind=kind)
+    else:
+        change = SpaceChange(space=space, kind=kind)
+    db.session.add(change)
+    return change
+
+
+def record_space_changes_bulk(space_ids, kind):
+    '''
+    Logs the same change for many spaces with one executemany INSERT in the
+    current transaction, for bulk writes that bypass the ORM unit of work.
+    Listeners are still notified after commit.
+    '''
+    if not space_ids:
+        return
+    now = datetime.utcnow()
+    logged = db.session.execute(
+        db.insert(SpaceChange).returning(SpaceChange.id, SpaceChange.space_id),
+        [{'space_id': space_id, 'kind': kind, 'changed_at': now} for space_id in space_ids]
+    ).all()
+    db.session.info.setdefault('space_changes', []).extend(
+        (cursor, space_id, kind) for cursor, space_id in sorted(logged)
+    )
+
+
+# --- Post-commit notification ---
+# Listeners registered with on_space_changes() are called with a list of
+# (cursor, space_id, kind) tuples after each commit that logged changes, so
+# in-process consumers (e.g. the live update stream) only see committed state.
+
+_space_change_listeners = []
+
+def on_space_changes(listener):
+    '''Registers ``listener(changes)`` to run after every commit that logged space changes.'''
+    _space_change_listeners.append(listener)
+    return listener
+
+
+@db.event.listens_for(db.Session, 'after_flush')
+def _collect_space_changes(session, flush_context):
+    # session.new still lists the objects just inserted, now with their ids
+    flushed = [(obj.id, obj.space_id, obj.kind) for obj in session.new if isinstance(obj, SpaceChange)]
+    if flushed:
+        session.info.setdefault('space_changes', []).extend(flushed)
+
+
+@db.event.listens_for(db.Session, 'after_commit')
+def _dispatch_space_changes(session):
+    changes = session.info.pop('space_changes', None)
+    if changes:
+        for listener in _space_change_listeners:
+            listener(changes)
+
+
+@db.event.listens_for(db.Session, 'after_soft_rollback')
+def _discard_space_changes(session, previous_transaction):
+    session.info.pop('space_changes', None)
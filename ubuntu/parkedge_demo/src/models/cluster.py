@@ -0,0 +1,173 @@
+from functools import lru_cache
+
+from . import db
+from .space import ParkingSpace
+from src import geo
+
+# Clusters are kept for geohash precisions 1..MAX_CLUSTER_PRECISION
+# (~5000 km down to ~1.2 km x 0.6 km cells)
+MAX_CLUSTER_PRECISION = 6
+
+# From this zoom level up the map gets individual spaces instead of clusters
+DETAIL_ZOOM = 16
+
+def precision_for_zoom(zoom):
+    '''
+    The geohash precision whose cells are about a quarter of a 256px map tile
+    wide at ``zoom``, i.e. at most a few dozen clusters on a screen.
+    '''
+    tile_width = 360.0 / (1 << zoom)
+    precision = 1
+    while precision < MAX_CLUSTER_PRECISION and geo.cell_size(precision + 1)[1] >= tile_width / 4:
+        precision += 1
+    return precision
+
+
+class SpaceCluster(db.Model):
+    '''
+    Pre-aggregated available spaces per geohash cell, one row per non-empty
+    cell at each precision. Kept current in the same transaction as every
+    logged space change (see refresh_cells), so map clustering is a lookup
+    of a few rows rather than an aggregation per request.
+    '''
+    __tablename__ = 'space_cluster'
+
+    precision = db.Column(db.Integer, primary_key=True)
+    cell = db.Column(db.String(MAX_CLUSTER_PRECISION), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    latitude_sum = db.Column(db.Float, nullable=False)
+    longitude_sum = db.Column(db.Float, nullable=False)
+    min_hourly_price = db.Column(db.Float, nullable=True)
+    min_daily_price = db.Column(db.Float, nullable=True)
+    best_rating = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<SpaceCluster {self.cell} ({self.count})>'
+
+    def to_dict(self):
+        return {
+            'cell': self.cell,
+            'count': self.count,
+            'latitude': self.latitude_sum / self.count,
+            'longitude': self.longitude_sum / self.count,
+            'min_hourly_price': self.min_hourly_price,
+            'min_daily_price': self.min_daily_price,
+            'best_rating': round(self.best_rating, 2) if self.best_rating is not None else None,
+        }
+
+    @classmethod
+    def in_bbox(cls, precision, min_lat, min_lon, max_lat, max_lon):
+        '''Filter for the clusters at ``precision`` whose centroid lies inside the bounding box.'''
+        ranges = []
+        for prefix in geo.cover(min_lat, min_lon, max_lat, max_lon):
+            prefix = prefix[:precision]
+            if not ranges or ranges[-1][0] != prefix:
+                ranges.append((prefix, geo.prefix_upper_bound(prefix)))
+        cell_filter = db.or_(*[db.and_(cls.cell >= low, cls.cell < high) for low, high in ranges])
+        latitude_filter = cls.latitude_sum.between(cls.count * min_lat, cls.count * max_lat)
+        if min_lon <= max_lon:
+            longitude_filter = cls.longitude_sum.between(cls.count * min_lon, cls.count * max_lon)
+        else:  # Viewport crosses the antimeridian
+            longitude_filter = db.or_(cls.longitude_sum >= cls.count * min_lon,
+                                      cls.longitude_sum <= cls.count * max_lon)
+        return db.and_(cls.precision == precision, cell_filter, latitude_filter, longitude_filter)
+
+
+def _aggregate_spaces(cell_expression):
+    '''SELECT of the finest-precision cluster rows, grouped by ``cell_expression``.'''
+    space = ParkingSpace
+    return (
+        db.select(
+            db.literal(MAX_CLUSTER_PRECISION), cell_expression, db.func.count(),
+            db.func.sum(space.latitude), db.func.sum(space.longitude),
+            db.func.min(db.case((space.price_unit == 'hour', space.price_amount))),
+            db.func.min(db.case((space.price_unit == 'day', space.price_amount))),
+            db.func.max(db.case((space.rating_count > 0, space.rating_sum * 1.0 / space.rating_count))),
+        )
+        .where(space.available(spatial=True), space.geohash.is_not(None))
+        .group_by(cell_expression)
+    )
+
+
+def _aggregate_children(precision, cell_expression):
+    '''SELECT of cluster rows at ``precision``, merged from the rows one level finer.'''
+    child = SpaceCluster
+    return (
+        db.select(
+            db.literal(precision), cell_expression, db.func.sum(child.count),
+            db.func.sum(child.latitude_sum), db.func.sum(child.longitude_sum),
+            db.func.min(child.min_hourly_price), db.func.min(child.min_daily_price),
+            db.func.max(child.best_rating),
+        )
+        .where(child.precision == precision + 1)
+        .group_by(cell_expression)
+    )
+
+
+def _insert(select):
+    columns = ['precision', 'cell', 'count', 'latitude_sum', 'longitude_sum',
+               'min_hourly_price', 'min_daily_price', 'best_rating']
+    return db.insert(SpaceCluster).from_select(columns, select)
+
+
+def rebuild(executor):
+    '''Recomputes every cluster from parking_space. ``executor`` is a Session or Connection.'''
+    executor.execute(db.delete(SpaceCluster))
+    executor.execute(_insert(_aggregate_spaces(db.func.substr(ParkingSpace.geohash, 1, MAX_CLUSTER_PRECISION))))
+    for precision in range(MAX_CLUSTER_PRECISION - 1, 0, -1):
+        executor.execute(_insert(_aggregate_children(precision, db.func.substr(SpaceCluster.cell, 1, precision))))
+
+
+@lru_cache(maxsize=None)
+def _refresh_statements(precision):
+    '''
+    DELETE and INSERT ... SELECT recomputing one cell at ``precision``, with the
+    cell and its geohash range as bound parameters. Built once per level so a
+    refresh only pays for executing them, not for constructing statements.
+    '''
+    if precision == MAX_CLUSTER_PRECISION:
+        column = ParkingSpace.geohash
+        select = _aggregate_spaces(db.func.substr(column, 1, precision))
+    else:
+        column = SpaceCluster.cell
+        select = _aggregate_children(precision, db.func.substr(column, 1, precision))
+    delete = db.delete(SpaceCluster).where(SpaceCluster.precision == precision,
+                                           SpaceCluster.cell == db.bindparam('cell'))
+    insert = _insert(select.where(column >= db.bindparam('cell'), column < db.bindparam('high')))
+    return delete, insert
+
+
+def refresh_cells(connection, geohashes):
+    '''
+    Recomputes the clusters containing ``geohashes``, finest level first:
+    those cells from the spaces in them (range scans on the geohash index),
+    then each coarser level from the level below. Each level is one
+    executemany DELETE and one executemany INSERT ... SELECT over its cells.
+    '''
+    cells = {geohash[:MAX_CLUSTER_PRECISION] for geohash in geohashes if geohash}
+    for precision in range(MAX_CLUSTER_PRECISION, 0, -1):
+        if not cells:
+            return
+        delete, insert = _refresh_statements(precision)
+        params = [{'cell': cell, 'high': geo.prefix_upper_bound(cell)} for cell in sorted(cells)]
+        connection.execute(delete, [{'cell': param['cell']} for param in params])
+        connection.execute(insert, params)
+        cells = {cell[:precision - 1] for cell in cells}
+
+
+@db.event.listens_for(db.Session, 'before_commit')
+def _refresh_changed_clusters(session):
+    # Every change that can move a space in or out of a cluster (created,
+    # booked, re-rated) is logged, so the log entries of this transaction say
+    # which cells to refresh; doing it here keeps clusters and spaces atomic
+    session.flush()
+    changes = session.info.get('space_changes')
+    if not changes:
+        return
+    space_ids = sorted({space_id for _, space_id, _ in changes})
+    geohashes = set()
+    for start in range(0, len(space_ids), 500):
+        geohashes.update(session.scalars(
+            db.select(ParkingSpace.geohash).where(ParkingSpace.id.in_(space_ids[start:start + 500]))
+        ))
+    refresh_cells(session.connection(), geohashes)
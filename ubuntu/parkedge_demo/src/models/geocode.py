@@ -0,0 +1,48 @@
+from . import db
+from datetime import datetime
+
+class GeocodeCacheEntry(db.Model):
+    '''
+    Persistent tier of the geocoding cache (see src/geocoding.py), keyed by
+    normalized address. A row with no coordinates caches "no results".
+    '''
+    __tablename__ = 'geocode_cache'
+
+    key = db.Column(db.String(255), primary_key=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<GeocodeCacheEntry {self.key!r} -> {self.latitude}, {self.longitude}>'
+
+
+class GeocodeJob(db.Model):
+    '''
+    Durable queue entry for a space waiting to be geocoded in the background
+    (see src/geocode_worker.py). One job per space.
+    '''
+    __tablename__ = 'geocode_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    space_id = db.Column(db.Integer, db.ForeignKey('parking_space.id'), nullable=False, unique=True)
+    # status is one of: 'pending', 'running', 'done', 'failed'
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    space = db.relationship('ParkingSpace', backref=db.backref('geocode_job', uselist=False))
+
+    __table_args__ = (
+        db.Index('ix_geocode_job_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<GeocodeJob {self.id} for Space {self.space_id} - {self.status}>'
+
+    def to_dict(self):
+        from src.serializers import GEOCODE_JOB
+        return GEOCODE_JOB.dump(self)
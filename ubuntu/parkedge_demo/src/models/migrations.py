@@ -0,0 +1,151 @@
+'''
+Schema upgrades for existing databases.
+
+db.create_all() only creates missing tables, it never alters existing ones,
+so columns added to a model after a database was created have to be added
+here. Each migration is a function taking a Connection; they run in order and
+the number applied is recorded in SQLite's ``PRAGMA user_version``. Migrations
+must be idempotent because a freshly created schema already has every column.
+'''
+from . import db
+
+
+def _column_names(connection, table):
+    return {column['name'] for column in db.inspect(connection).get_columns(table)}
+
+
+def _add_column(connection, table, column_ddl):
+    name = column_ddl.split()[0]
+    if name not in _column_names(connection, table):
+        connection.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column_ddl}')
+
+
+def _create_index(connection, index):
+    # IF NOT EXISTS rather than checkfirst: SQLite reflection skips expression
+    # indexes, so checkfirst would try to create those twice
+    connection.execute(db.schema.CreateIndex(index, if_not_exists=True))
+
+
+def _rebuild_table(connection, table):
+    '''
+    Recreates ``table`` from its current model definition and copies over the
+    columns the old and new versions share. SQLite cannot change a column's
+    constraints in place, so this is how e.g. NOT NULL gets relaxed; it follows
+    the create-copy-drop-rename order from the SQLite ALTER TABLE docs so
+    foreign keys in other tables keep pointing at ``table``.
+    '''
+    model_table = db.metadata.tables[table]
+    old_columns = _column_names(connection, table)
+    shared = ', '.join(column.name for column in model_table.columns if column.name in old_columns)
+    for index in db.inspect(connection).get_indexes(table):
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS {index["name"]}')
+
+    create_ddl = str(db.schema.CreateTable(model_table).compile(connection))
+    connection.exec_driver_sql(create_ddl.replace(f'CREATE TABLE {table} ', f'CREATE TABLE {table}_new ', 1))
+    connection.exec_driver_sql(f'INSERT INTO {table}_new ({shared}) SELECT {shared} FROM {table}')
+    connection.exec_driver_sql(f'DROP TABLE {table}')
+    connection.exec_driver_sql(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for index in model_table.indexes:
+        index.create(connection)
+
+
+def _add_space_geohash(connection):
+    from src import geo
+    _add_column(connection, 'parking_space', 'geohash VARCHAR(12)')
+    connection.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_parking_space_geohash ON parking_space (geohash)'
+    )
+    rows = connection.exec_driver_sql(
+        'SELECT id, latitude, longitude FROM parking_space WHERE geohash IS NULL AND latitude IS NOT NULL'
+    ).all()
+    for space_id, latitude, longitude in rows:
+        connection.exec_driver_sql(
+            'UPDATE parking_space SET geohash = ? WHERE id = ?',
+            (geo.encode(latitude, longitude), space_id)
+        )
+
+
+def _add_space_rating_aggregates(connection):
+    _add_column(connection, 'parking_space', "rating_sum INTEGER NOT NULL DEFAULT '0'")
+    _add_column(connection, 'parking_space', "rating_count INTEGER NOT NULL DEFAULT '0'")
+    connection.exec_driver_sql(
+        'UPDATE parking_space SET '
+        'rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM review WHERE review.space_id = parking_space.id), '
+        'rating_count = (SELECT COUNT(id) FROM review WHERE review.space_id = parking_space.id)'
+    )
+
+
+def _allow_pending_geocode(connection):
+    # latitude/longitude become nullable while a listing waits for the geocoder
+    columns = {column['name']: column for column in db.inspect(connection).get_columns('parking_space')}
+    if not columns['latitude']['nullable'] or 'geocode_status' not in columns:
+        _rebuild_table(connection, 'parking_space')
+
+
+def _add_booking_window(connection):
+    _add_column(connection, 'booking', 'start_time DATETIME')
+    _add_column(connection, 'booking', 'end_time DATETIME')
+
+
+def _add_hot_query_indexes(connection):
+    # Keep only each user's latest review of a space before making the pair unique
+    deleted = connection.exec_driver_sql(
+        'DELETE FROM review WHERE id NOT IN (SELECT MAX(id) FROM review GROUP BY user_id, space_id)'
+    ).rowcount
+    if deleted:
+        _add_space_rating_aggregates(connection)
+    for table in ('review', 'booking', 'parking_space'):
+        for index in db.metadata.tables[table].indexes:
+            _create_index(connection, index)
+
+
+def _add_booking_history_index(connection):
+    # Newest-first booking pages (src/pagination.py) seek on (user_id, booking_time)
+    for index in db.metadata.tables['booking'].indexes:
+        if index.name == 'ix_booking_user_time':
+            _create_index(connection, index)
+
+
+def _add_space_clusters(connection):
+    from .cluster import SpaceCluster, rebuild
+    SpaceCluster.__table__.create(connection, checkfirst=True)
+    rebuild(connection)
+
+
+def _add_tile_versions(connection):
+    # Tiles with no row are at version 0, so nothing needs backfilling
+    from .tile import TileVersion
+    TileVersion.__table__.create(connection, checkfirst=True)
+
+
+def _add_space_search_indexes(connection):
+    from .search import create_address_index
+    create_address_index(connection)
+    for index in db.metadata.tables['parking_space'].indexes:
+        if index.name in ('ix_parking_space_price', 'ix_parking_space_rating'):
+            _create_index(connection, index)
+
+
+MIGRATIONS = [
+    _add_space_geohash,
+    _add_space_rating_aggregates,
+    _allow_pending_geocode,
+    _add_booking_window,
+    _add_hot_query_indexes,
+    _add_booking_history_index,
+    _add_space_clusters,
+    _add_tile_versions,
+    _add_space_search_indexes,
+]
+
+
+def upgrade(engine=None):
+    '''Applies every migration newer than the database's recorded version.'''
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        version = connection.exec_driver_sql('PRAGMA user_version').scalar()
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if number > version:
+                migration(connection)
+        if version < len(MIGRATIONS):
+            connection.exec_driver_sql(f'PRAGMA user_version = {len(MIGRATIONS)}')
@@ -15,18 +15,45 @@ class Review(db.Model):
     # Add check constraint for rating (1-5)
     __table_args__ = (
         db.CheckConstraint('rating >= 1 AND rating <= 5', name='rating_check'),
+        # One review per user per space; also serves lookups by user_id
+        db.Index('uq_review_user_space', 'user_id', 'space_id', unique=True),
+        # Newest-first review lists for a space and for a user
+        db.Index('ix_review_space_timestamp', 'space_id', 'timestamp'),
+        db.Index('ix_review_user_timestamp', 'user_id', 'timestamp'),
     )
 
     def __repr__(self):
         return f'<Review {self.id} by User {self.user_id} for Space {self.space_id} - {self.rating} stars>'
 
+    @classmethod
+    def swap_rating(cls, review_id, rating, expected):
+        '''
+        Sets a review's rating and returns the rating it replaced, or None if
+        the review no longer exists. The write is a compare-and-set against
+        ``expected`` (re-read from the write engine on a miss), so the value
+        returned is the one actually overwritten and a rating delta computed
+        from it cannot be stale.
+        '''
+        while expected is not None:
+            swapped = db.session.execute(
+                db.update(cls)
+                .where(cls.id == review_id, cls.rating == expected)
+                .values(rating=rating)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if swapped:
+                return expected
+            expected = db.session.scalar(db.select(cls.rating).where(cls.id == review_id))
+        return None
+
+    @classmethod
+    def delete_returning_rating(cls, review_id):
+        '''Deletes a review; returns its rating at the time of deletion, or None if it was already gone.'''
+        return db.session.scalar(
+            db.delete(cls).where(cls.id == review_id).returning(cls.rating)
+            .execution_options(synchronize_session=False)
+        )
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'rating': self.rating,
-            'comment': self.comment,
-            'timestamp': self.timestamp.isoformat(),
-            'user_id': self.user_id,
-            'user_username': self.user.username if self.user else None, # Access username via backref
-            'space_id': self.space_id
-        }
+        from src.serializers import REVIEW
+        return REVIEW.dump(self)
@@ -0,0 +1,78 @@
+'''
+Full-text index of ParkingSpace.address for the ?address= filter on
+/api/spaces.
+
+parking_space_fts is an FTS5 external-content table: it stores only the
+token index and reads addresses from parking_space, and triggers on
+parking_space keep it in sync with every insert, update and delete,
+including bulk writes that bypass the ORM. Rebuilding parking_space (see
+migrations._rebuild_table) drops those triggers; run create_address_index()
+afterwards.
+'''
+import re
+
+from . import db
+from .space import ParkingSpace
+
+ADDRESS_INDEX_DDL = [
+    # prefix='2 3' adds prefix indexes so short "mai*" queries stay index lookups
+    "CREATE VIRTUAL TABLE parking_space_fts USING fts5("
+    "address, content='parking_space', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER parking_space_fts_insert AFTER INSERT ON parking_space BEGIN "
+    "INSERT INTO parking_space_fts (rowid, address) VALUES (new.id, new.address); END",
+    "CREATE TRIGGER parking_space_fts_delete AFTER DELETE ON parking_space BEGIN "
+    "INSERT INTO parking_space_fts (parking_space_fts, rowid, address) VALUES ('delete', old.id, old.address); END",
+    "CREATE TRIGGER parking_space_fts_update AFTER UPDATE OF address ON parking_space BEGIN "
+    "INSERT INTO parking_space_fts (parking_space_fts, rowid, address) VALUES ('delete', old.id, old.address); "
+    "INSERT INTO parking_space_fts (rowid, address) VALUES (new.id, new.address); END",
+]
+
+address_fts = db.table('parking_space_fts', db.column('rowid'), db.column('address'))
+
+_TOKEN = re.compile(r'\w+')
+
+
+def create_address_index(connection):
+    '''(Re)creates the index and its triggers and indexes every existing address.'''
+    drop_address_index(connection)
+    for statement in ADDRESS_INDEX_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO parking_space_fts (parking_space_fts) VALUES ('rebuild')")
+
+
+def drop_address_index(connection):
+    for trigger in ('insert', 'delete', 'update'):
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS parking_space_fts_{trigger}')
+    connection.exec_driver_sql('DROP TABLE IF EXISTS parking_space_fts')
+
+
+def match_query(text):
+    '''
+    The FTS5 query for a search box string: every word must start a word of
+    the address ("main st" matches "12 Main Street"). None if ``text`` has
+    no words. Words are quoted, so FTS5 operators in the input are inert.
+    '''
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def address_matches(text):
+    '''Filter for the spaces whose address matches ``text`` (see match_query), or None.'''
+    query = match_query(text)
+    if query is None:
+        return None
+    return ParkingSpace.id.in_(db.select(address_fts.c.rowid).where(address_fts.c.address.match(query)))
+
+
+# Created and dropped with parking_space, so db.create_all() / drop_all() cover it
+@db.event.listens_for(ParkingSpace.__table__, 'after_create')
+def _create_with_table(target, connection, **kw):
+    create_address_index(connection)
+
+
+@db.event.listens_for(ParkingSpace.__table__, 'before_drop')
+def _drop_with_table(target, connection, **kw):
+    drop_address_index(connection)
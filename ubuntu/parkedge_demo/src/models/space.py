@@ -1,40 +1,153 @@
+from sqlalchemy.sql import operators
+
 from . import db
 from .review import Review # Import the Review model
 from .user import User 
+from src import geo
 
 class ParkingSpace(db.Model):
     __tablename__ = 'parking_space' # Explicitly define table name
+    __table_args__ = (
+        # The unfiltered map listing: available, located spaces
+        db.Index('ix_parking_space_available', 'is_booked', 'geocode_status'),
+        # ?price_unit= and ?max_price= filters on /api/spaces
+        db.Index('ix_parking_space_price', 'price_unit', 'price_amount'),
+    )
+    PRICE_UNITS = ('hour', 'day')
+
     id = db.Column(db.Integer, primary_key=True)
-    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     address = db.Column(db.String(200), nullable=False)
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
+    # Null until geocoded when the space was listed asynchronously (see geocode_status)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
     price_amount = db.Column(db.Float, nullable=False) 
     price_unit = db.Column(db.String(10), nullable=False, default='hour') # e.g., "hour", "day"
     is_booked = db.Column(db.Boolean, default=False, nullable=False)
+    # geocode_status is one of: 'ok', 'pending', 'failed'
+    geocode_status = db.Column(db.String(10), nullable=False, default='ok', server_default='ok')
     image_url = db.Column(db.String(512), nullable=True)
+    # Spatial key for bounding-box queries; kept in sync with latitude/longitude
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+    # Review aggregates maintained by the review routes (see adjust_rating)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     owner = db.relationship('User', backref=db.backref('owned_spaces', lazy='dynamic')) # Using lazy='dynamic' for owned_spaces
     reviews = db.relationship('Review', backref='space', lazy=True)
 
+    @property
+    def average_rating(self):
+        return self.rating_average(self.rating_sum, self.rating_count)
+
+    @staticmethod
+    def rating_average(rating_sum, rating_count):
+        if not rating_count:
+            return None
+        return round(rating_sum / rating_count, 2)
+
+    @classmethod
+    def rating_expression(cls):
+        '''
+        SQL for the unrounded average rating, NULL while unrated. Indexed as
+        ix_parking_space_rating; SQLite only uses an expression index for this
+        exact expression, so filter through here.
+        '''
+        # Plain "/" and a literal 0: SQLAlchemy's true division would add a bound "+ 0.0"
+        return db.cast(cls.rating_sum, db.Float).op('/', return_type=db.Float)(
+            db.func.nullif(cls.rating_count, db.literal_column('0')))
+
+    @classmethod
+    def adjust_rating(cls, space_id, sum_delta, count_delta=0):
+        '''
+        Applies a change to a space's rating aggregates as a single UPDATE, so
+        concurrent reviews of the same space cannot lose each other's updates.
+        '''
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id == space_id)
+            .values(rating_sum=cls.rating_sum + sum_delta,
+                    rating_count=cls.rating_count + count_delta)
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def recompute_ratings(cls):
+        '''
+        Rebuilds the rating aggregates from the review table. Only spaces
+        whose aggregates were out of date are written; returns their ids.
+        '''
+        review_sum = (db.select(db.func.coalesce(db.func.sum(Review.rating), 0))
+                      .where(Review.space_id == cls.id).scalar_subquery())
+        review_count = (db.select(db.func.count(Review.id))
+                        .where(Review.space_id == cls.id).scalar_subquery())
+        result = db.session.execute(
+            db.update(cls)
+            .where(db.or_(cls.rating_sum != review_sum, cls.rating_count != review_count))
+            .values(rating_sum=review_sum, rating_count=review_count)
+            .returning(cls.id)
+            .execution_options(synchronize_session=False)
+        )
+        return sorted(result.scalars())
+
+    def update_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            self.geohash = None
+        else:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+
+    @classmethod
+    def within_bbox(cls, min_lat, min_lon, max_lat, max_lon):
+        '''
+        Returns a filter selecting spaces inside the bounding box.
+
+        The geohash ranges let the index narrow the scan to the covering cells;
+        the latitude/longitude predicates then trim the cell edges.
+        '''
+        ranges = geo.cover_ranges(min_lat, min_lon, max_lat, max_lon)
+        geohash_filter = db.or_(*[
+            db.and_(cls.geohash >= low, cls.geohash < high) for low, high in ranges
+        ])
+        if min_lon <= max_lon:
+            lon_filter = cls.longitude.between(min_lon, max_lon)
+        else:  # Viewport crosses the antimeridian
+            lon_filter = db.or_(cls.longitude >= min_lon, cls.longitude <= max_lon)
+        return db.and_(geohash_filter, cls.latitude.between(min_lat, max_lat), lon_filter)
+
+    @classmethod
+    def available(cls, spatial=False):
+        '''
+        Filter for listed, located spaces that are not booked.
+
+        Queries that also filter by location pass ``spatial=True``. Without
+        statistics SQLite prefers the two equalities on ix_parking_space_available
+        over the geohash ranges, and reads every available space in the table.
+        A unary "+" takes a term out of index consideration (the documented
+        SQLite idiom), which leaves the geohash ranges to drive the search.
+        '''
+        is_booked, geocode_status = cls.is_booked, cls.geocode_status
+        if spatial:
+            is_booked = db.UnaryExpression(is_booked, operator=operators.custom_op('+'), type_=is_booked.type)
+            geocode_status = db.UnaryExpression(geocode_status, operator=operators.custom_op('+'),
+                                                type_=geocode_status.type)
+        return db.and_(is_booked == db.false(), geocode_status == 'ok')
+
+    @classmethod
+    def free_between(cls, start_time, end_time):
+        '''Returns a filter selecting spaces with no booking overlapping [start_time, end_time).'''
+        from .booking import BookingSlot
+        return db.and_(cls.is_booked == db.false(), ~BookingSlot.overlapping(cls.id, start_time, end_time))
+
     def to_dict(self):
-        # Calculate average rating
-        avg_rating = None
-        if self.reviews:
-            avg_rating = sum(review.rating for review in self.reviews) / len(self.reviews)
-            avg_rating = round(avg_rating, 2)
-
-        return {
-            "id": self.id,
-            "address": self.address,
-            "latitude": self.latitude,
-            "longitude": self.longitude,
-            "price_amount": self.price_amount, # ADD THIS
-            "price_unit": self.price_unit,     # ADD THIS
-            "is_booked": self.is_booked,
-            "owner_id": self.owner_id,
-            "image_url": self.image_url,
-            "review_ids": [review.id for review in self.reviews], 
-            "average_rating": avg_rating 
-        }
+        from src.serializers import SPACE
+        return SPACE.dump(self)
+
+
+@db.event.listens_for(ParkingSpace, 'before_insert')
+@db.event.listens_for(ParkingSpace, 'before_update')
+def _sync_geohash(mapper, connection, target):
+    target.update_geohash()
+
 
+# ?min_rating= on /api/spaces is a range scan on this (see rating_expression)
+db.Index('ix_parking_space_rating', ParkingSpace.rating_expression())
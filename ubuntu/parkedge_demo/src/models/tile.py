@@ -0,0 +1,126 @@
+import math
+from functools import lru_cache
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import db
+from .space import ParkingSpace
+
+# /api/spaces/tiles serves these zoom levels of the OSM (slippy map) tile
+# grid; zoomed out further the map shows clusters instead
+MIN_TILE_ZOOM = 12
+MAX_TILE_ZOOM = 18
+
+# Web Mercator stops short of the poles
+MAX_TILE_LATITUDE = 85.0511287798
+
+
+def tile_for(latitude, longitude, zoom):
+    '''The (x, y) of the tile containing a point, in the OSM tile numbering.'''
+    n = 1 << zoom
+    latitude = max(-MAX_TILE_LATITUDE, min(MAX_TILE_LATITUDE, latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom, x, y):
+    '''The (min_lat, min_lon, max_lat, max_lon) of a tile.'''
+    n = 1 << zoom
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def within_tile(zoom, x, y):
+    '''
+    Filter for the spaces in a tile. Tiles are half-open like tile_for(), so
+    a space on a shared edge belongs to exactly one tile (and one version).
+    '''
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+    space = ParkingSpace
+    filters = [space.within_bbox(min_lat, min_lon, max_lat, max_lon)]
+    n = 1 << zoom
+    if x < n - 1:
+        filters.append(space.longitude < max_lon)
+    if y < n - 1:
+        filters.append(space.latitude > min_lat)
+    return db.and_(*filters)
+
+
+class TileVersion(db.Model):
+    '''
+    Change cursor of the latest change to a space inside each tile, for the
+    tiles at MIN_TILE_ZOOM..MAX_TILE_ZOOM that have seen one (others are at
+    version 0). Bumped in the same transaction as the change, so a tile's
+    version only moves when something in that tile did, and can be used as
+    its ETag.
+    '''
+    __tablename__ = 'tile_version'
+
+    zoom = db.Column(db.Integer, primary_key=True)
+    x = db.Column(db.Integer, primary_key=True)
+    y = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<TileVersion {self.zoom}/{self.x}/{self.y} v{self.version}>'
+
+    @classmethod
+    def current(cls, zoom, x, y):
+        '''The version of a tile (0 if nothing in it has changed yet).'''
+        stmt = db.select(cls.version).where(cls.zoom == zoom, cls.x == x, cls.y == y)
+        return db.session.scalar(stmt) or 0
+
+
+@lru_cache(maxsize=None)
+def _bump_statement():
+    # Never moves a version backwards: versions are change cursors, and a
+    # tile may see several changes in one commit
+    insert = sqlite_insert(TileVersion)
+    return insert.on_conflict_do_update(
+        index_elements=['zoom', 'x', 'y'],
+        set_={'version': db.func.max(TileVersion.version, insert.excluded.version)},
+    )
+
+
+def bump_versions(connection, located_changes):
+    '''
+    Raises the version of every tile containing a change to ``cursor`` for
+    ``located_changes`` of (cursor, latitude, longitude), with one
+    executemany upsert.
+    '''
+    versions = {}
+    for cursor, latitude, longitude in located_changes:
+        for zoom in range(MIN_TILE_ZOOM, MAX_TILE_ZOOM + 1):
+            tile = (zoom, *tile_for(latitude, longitude, zoom))
+            versions[tile] = max(versions.get(tile, 0), cursor)
+    if versions:
+        connection.execute(_bump_statement(), [
+            {'zoom': zoom, 'x': x, 'y': y, 'version': version}
+            for (zoom, x, y), version in sorted(versions.items())
+        ])
+
+
+@db.event.listens_for(db.Session, 'before_commit')
+def _bump_changed_tiles(session):
+    # Same source as the clusters (src/models/cluster.py): every change that
+    # can alter a tile's contents is in this transaction's change log
+    session.flush()
+    changes = session.info.get('space_changes')
+    if not changes:
+        return
+    latest = {}
+    for cursor, space_id, _ in changes:
+        latest[space_id] = max(latest.get(space_id, 0), cursor)
+    space_ids = sorted(latest)
+    located = []
+    for start in range(0, len(space_ids), 500):
+        rows = session.execute(
+            db.select(ParkingSpace.id, ParkingSpace.latitude, ParkingSpace.longitude)
+            .where(ParkingSpace.id.in_(space_ids[start:start + 500]), ParkingSpace.latitude.is_not(None))
+        )
+        located.extend((latest[space_id], latitude, longitude) for space_id, latitude, longitude in rows)
+    bump_versions(session.connection(), located)
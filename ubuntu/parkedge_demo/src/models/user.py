@@ -18,13 +18,5 @@ class User(db.Model, UserMixin):
         return f'<User {self.username or self.email}>' # Display email if username is None
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'google_id': self.google_id,
-            'profile_pic': self.profile_pic,
-            'payment_info': self.payment_info,
-            'phone_number': self.phone_number, # Add this line
-            'review_ids': [review.id for review in self.reviews] 
-        }
+        from src.serializers import USER
+        return USER.dump(self)
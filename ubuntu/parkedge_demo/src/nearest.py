@@ -0,0 +1,44 @@
+'''
+Nearest available spaces to a point (/api/spaces/nearest).
+
+Candidates are gathered in expanding rings: the spaces in the box around
+the point out to a search radius, read with the same geohash range scans as
+viewport queries (ParkingSpace.within_bbox), as bare (id, latitude,
+longitude) rows. They are ranked by haversine distance (geo.distances_m).
+Once k of them lie within the radius, those k are the answer, because
+nothing outside the radius can be nearer. Otherwise the radius doubles and
+the search repeats. The work per query therefore follows the density of
+spaces around the point, not the size of the table.
+'''
+import heapq
+
+from src import geo
+from src.models import db
+from src.models.space import ParkingSpace
+
+DEFAULT_K = 10
+MAX_K = 100
+
+# First ring, and the radius at which the search gives up
+INITIAL_RADIUS_M = 250
+MAX_RADIUS_M = 50000
+
+
+def nearest_spaces(latitude, longitude, k=DEFAULT_K, filters=(), max_radius_m=MAX_RADIUS_M):
+    '''
+    Returns up to ``k`` (distance_m, space_id) pairs for the available spaces
+    nearest the point, closest first and within ``max_radius_m``, that also
+    match the SQL ``filters``.
+    '''
+    radius = min(INITIAL_RADIUS_M, max_radius_m)
+    while True:
+        rows = db.session.execute(
+            db.select(ParkingSpace.id, ParkingSpace.latitude, ParkingSpace.longitude)
+            .where(ParkingSpace.within_bbox(*geo.bbox_around(latitude, longitude, radius)),
+                   ParkingSpace.available(spatial=True), *filters)
+        ).all()
+        distances = geo.distances_m(latitude, longitude, [(lat, lon) for _, lat, lon in rows])
+        within = [(distance, row[0]) for distance, row in zip(distances, rows) if distance <= radius]
+        if len(within) >= k or radius >= max_radius_m:
+            return heapq.nsmallest(k, within)
+        radius = min(radius * 2, max_radius_m)
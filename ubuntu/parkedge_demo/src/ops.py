@@ -0,0 +1,36 @@
+'''
+Access to operational endpoints such as /api/cache/stats.
+
+They share the user-facing app but are not part of its API. Wrap their
+views in @ops_only to require an "Authorization: Bearer <OPS_TOKEN>"
+header. Without an OPS_TOKEN the endpoints answer 404, as if they did not
+exist. A missing or wrong token gets a 401.
+
+Configuration (app.config):
+    OPS_TOKEN  bearer token for operational endpoints (default: unset, endpoints disabled)
+'''
+import hmac
+from functools import wraps
+
+from flask import abort, current_app, request
+
+
+def authorized():
+    '''Whether the current request may use operational endpoints; aborts with 404 if none are enabled.'''
+    token = current_app.config.get('OPS_TOKEN')
+    if not token:
+        abort(404)
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode())
+
+
+def ops_only(view):
+    '''Restricts ``view`` to callers presenting OPS_TOKEN.'''
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not authorized():
+            response = current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,101 @@
+'''
+Keyset pagination for list endpoints.
+
+Lists are ordered newest first on a key such as (timestamp, id). A page is
+the ``limit`` rows after the last key of the previous page, found with a
+row-value comparison the index can seek to, so page 1000 costs the same as
+page 1 (unlike OFFSET, which walks every skipped row).
+
+Responses keep their JSON array bodies. When more rows exist, the opaque
+cursor for the next page is sent in an ``X-Next-Cursor`` header and as a
+``Link: <...>; rel="next"`` URL; clients pass it back as ``?cursor=``.
+'''
+import base64
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import jsonify, request
+
+from src.models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+
+def encode_cursor(values):
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    '''Returns the key values encoded in ``token``; raises ValueError if it is not a cursor for ``columns``.'''
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor")
+    decoded = []
+    for column, value in zip(columns, values):
+        if isinstance(column.type, db.DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+        elif not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def paginate(stmt, key_columns, args=None):
+    '''
+    Runs one page of ``stmt`` (a select of one entity, or a projection such
+    as Schema.select() that includes the key columns under their own names),
+    newest first on ``key_columns`` (e.g. ``(Review.timestamp, Review.id)``;
+    the last must be unique). Reads ``limit`` and ``cursor`` from ``args`` (default: the
+    request's query string). Returns (rows, next_cursor or None); raises
+    ValueError for a bad limit or cursor.
+    '''
+    args = request.args if args is None else args
+    limit = parse_limit(args.get('limit'), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    cursor = args.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor, key_columns)
+        stmt = stmt.where(db.tuple_(*key_columns) < db.tuple_(*after))
+    stmt = stmt.order_by(*(column.desc() for column in key_columns)).limit(limit + 1)
+
+    result = db.session.execute(stmt)
+    entity = stmt.column_descriptions[0]
+    if len(stmt.column_descriptions) == 1 and entity['expr'] is entity['entity']:
+        result = result.scalars()
+    rows = result.all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in key_columns])
+
+
+def page_response(data, next_cursor):
+    '''jsonify(data) with the next-page headers described above.'''
+    response = jsonify(data)
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
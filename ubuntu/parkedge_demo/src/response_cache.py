@@ -0,0 +1,192 @@
+'''
+Per-process cache of rendered JSON responses for hot read endpoints.
+
+Entries are keyed by endpoint and query parameters, expire after a TTL and
+are evicted least-recently-used once the cache is full. Each entry carries
+tags naming the data it was built from, e.g. ('space-reviews', 7), and the
+write handlers call invalidate() with the same tags after they commit.
+
+A read that was already in flight when a write committed must not store the
+old result after the invalidation. Every tag has a version that
+invalidate() bumps; a read notes the versions of its tags before querying
+and its result is only stored if none of them moved in the meantime.
+
+GET /api/spaces is keyed by the change log cursor as well (its ETag), and
+every booking advances that cursor in the same transaction, so a cached
+list can never show a booking state older than the last committed booking,
+including bookings made in other worker processes. The other cached lists
+are invalidated in the process that handled the write; other processes
+pick the change up when their entry expires.
+
+Configuration (app.config):
+    RESPONSE_CACHE_SIZE   entries kept per process (default 1024; 0 disables the cache)
+    RESPONSE_CACHE_TTL    seconds an entry lives (default 30)
+'''
+import threading
+
+import cachetools
+from flask import current_app, request
+
+from src.models.change import on_space_changes
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 30
+
+
+class _TTLCache(cachetools.TTLCache):
+    '''TTLCache that reports LRU evictions and expirations to its owner.'''
+
+    def __init__(self, maxsize, ttl, on_evict, on_expire):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._on_evict = on_evict
+        self._on_expire = on_expire
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, value in expired:
+            self._on_expire(key, value)
+        return expired
+
+
+class ResponseCache:
+    '''Tagged TTL/LRU cache with hit, miss, eviction and invalidation counters.'''
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.enabled = maxsize > 0
+        self._entries = _TTLCache(max(maxsize, 1), ttl, self._evicted, self._expired)
+        self._tagged = {}    # tag -> keys of the entries carrying it
+        self._versions = {}  # tag -> number of invalidations so far
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _untag(self, key, tags):
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    # Called by _TTLCache with self._lock held
+    def _evicted(self, key, entry):
+        self.stats['evictions'] += 1
+        self._untag(key, entry[1])
+
+    def _expired(self, key, entry):
+        self.stats['expirations'] += 1
+        self._untag(key, entry[1])
+
+    def get(self, key, tags):
+        '''
+        Returns (value, token). value is None on a miss; pass the token to
+        put() so a result built from data older than an invalidation is dropped.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.stats['hits'] += 1
+                return entry[0], None
+            self.stats['misses'] += 1
+            return None, tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def put(self, key, value, tags, token):
+        '''Stores ``value`` unless one of ``tags`` was invalidated since get() handed out ``token``.'''
+        if not self.enabled:
+            return False
+        with self._lock:
+            if token != tuple(self._versions.get(tag, 0) for tag in tags):
+                return False
+            self._entries[key] = (value, tuple(tags))
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            return True
+
+    def invalidate(self, *tags):
+        '''Drops every entry carrying any of ``tags``. Call after the write has committed.'''
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in self._tagged.pop(tag, ()):
+                    entry = self._entries.pop(key, None)
+                    if entry is not None:
+                        self.stats['invalidations'] += 1
+                        self._untag(key, entry[1])
+
+    def clear(self):
+        '''Drops every entry and zeroes the counters.'''
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+            for tag in self._versions:
+                self._versions[tag] += 1
+            for counter in self.stats:
+                self.stats[counter] = 0
+
+    def snapshot(self):
+        '''Counters plus the current size and hit rate.'''
+        with self._lock:
+            self._entries.expire()
+            stats = dict(self.stats, size=len(self._entries), maxsize=self._entries.maxsize if self.enabled else 0,
+                         ttl=self._entries.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    '''Returns this process's ResponseCache, created on first use.'''
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(current_app.config.get('RESPONSE_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+                                       current_app.config.get('RESPONSE_CACHE_TTL', DEFAULT_CACHE_TTL))
+    return _cache
+
+
+def request_key(*parts):
+    '''A cache key of ``parts`` plus the request's query parameters.'''
+    return parts + tuple(sorted(request.args.items(multi=True)))
+
+
+def cached_response(key, tags, build):
+    '''
+    Returns the response for ``key``, from the cache or by calling
+    ``build()``, which returns anything a view may return. Only 200 responses are stored;
+    the body, content type and headers are kept, not the response object.
+    Adds an X-Cache: HIT/MISS header.
+    '''
+    cache = get_cache()
+    cached, token = cache.get(key, tags)
+    if cached is not None:
+        body, content_type, headers = cached
+        response = current_app.response_class(body, content_type=content_type, headers=headers)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    response = current_app.make_response(build())
+    if response.status_code == 200:
+        headers = [(name, value) for name, value in response.headers if name not in ('Content-Type', 'Content-Length')]
+        cache.put(key, (response.get_data(), response.content_type, headers), tags, token)
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+
+def invalidate(*tags):
+    '''Invalidates ``tags`` in this process's cache, if one has been created.'''
+    if _cache is not None:
+        _cache.invalidate(*tags)
+
+
+@on_space_changes
+def _invalidate_space_lists(changes):
+    # Lists keyed by an older cursor can no longer be requested; free them now
+    invalidate('spaces')
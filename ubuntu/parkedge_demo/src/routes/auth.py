@@ -1,13 +1,11 @@
 import os
 from flask import Blueprint, redirect, request, session, url_for, current_app, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from google_auth_oauthlib.flow import Flow
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import requests # For fetching user info directly
 
+from src import google_auth, metrics
 from src.models.user import User
 from src.models import db # Correctly import db
+from src.routes.user import invalidate_user
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -42,6 +40,17 @@ SCOPES = [
     "https://www.googleapis.com/auth/userinfo.profile",
 ]
 
+def make_flow(client_id, client_secret, redirect_uri):
+    """A Flow for one login, on the prebuilt client config and the shared connection pool."""
+    from google_auth_oauthlib.flow import Flow # Heavy; only loaded once someone signs in
+    flow = Flow.from_client_config(
+        client_config=google_auth.client_config(client_id, client_secret, redirect_uri),
+        scopes=SCOPES,
+        redirect_uri=redirect_uri
+    )
+    google_auth.share_connections(flow.oauth2session)
+    return flow
+
 @auth_bp.route('/login')
 def login():
     # This is a placeholder for a potential manual login page
@@ -61,21 +70,7 @@ def login_google():
         return redirect(url_for('serve', path='')) # Redirect to home or an error page
 
     current_app.logger.debug(f"Using redirect URI for Flow: {g_redirect_uri}")
-    flow = Flow.from_client_config( 
-        client_config={
-            "web": {
-                "client_id": g_client_id,
-                "client_secret": g_client_secret,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "issuer": "https://accounts.google.com", 
-                "redirect_uris": [g_redirect_uri], 
-                "userinfo_uri": "https://openidconnect.googleapis.com/v1/userinfo",
-            }
-        },
-        scopes=SCOPES,
-        redirect_uri=g_redirect_uri
-    )
+    flow = make_flow(g_client_id, g_client_secret, g_redirect_uri)
     
     authorization_url, state = flow.authorization_url(
         access_type='offline',
@@ -124,23 +119,12 @@ def authorized():
     current_app.logger.debug("OAuth state validation successful.")
     # The rest of the function (Flow initialization, fetch_token, etc.) continues from here
     current_app.logger.debug(f"Proceeding with redirect URI for Flow: {g_redirect_uri}") # Retained from previous logging
-    flow = Flow.from_client_config( 
-         client_config={
-            "web": {
-                "client_id": g_client_id,
-                "client_secret": g_client_secret,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "redirect_uris": [g_redirect_uri],
-            }
-        },
-        scopes=SCOPES,
-        redirect_uri=g_redirect_uri
-    )
+    flow = make_flow(g_client_id, g_client_secret, g_redirect_uri)
 
     try:
         current_app.logger.debug("Attempting to fetch token...")
-        flow.fetch_token(authorization_response=request.url)
+        with metrics.time_outbound('google_token'):
+            flow.fetch_token(authorization_response=request.url, timeout=google_auth.get_timeout())
         current_app.logger.debug("Token fetched successfully.")
     except Exception as e:
         current_app.logger.error(f"Failed to fetch token: {e}", exc_info=True)
@@ -155,11 +139,7 @@ def authorized():
 
     try:
         current_app.logger.debug("Attempting to verify ID token...")
-        id_info = id_token.verify_oauth2_token(
-            flow.credentials.id_token, 
-            google_requests.Request(session=requests.session()), 
-            g_client_id 
-        )
+        id_info = google_auth.verify_id_token(flow.credentials.id_token, g_client_id)
         current_app.logger.debug(f"ID token verified. id_info: {id_info}")
         
         google_id = id_info.get("sub")
@@ -196,6 +176,7 @@ def authorized():
         
         current_app.logger.debug(f"User object before commit: {user.to_dict() if user else 'None'}")
         db.session.commit()
+        invalidate_user(user.id) # The name and picture may have changed
         current_app.logger.debug("User session committed.")
         
         login_user(user, remember=True)
@@ -4,6 +4,8 @@ from flask_login import login_required, current_user
 # Adjust import if your db instance is elsewhere, e.g., from src import db
 from src.models import db 
 from src.models.booking import Booking # Import the Booking model
+from src.serializers import BOOKING
+from src.pagination import page_response, paginate
 
 # Define a new Blueprint for bookings
 bookings_bp = Blueprint('bookings_bp', __name__, url_prefix='/api/bookings')
@@ -12,18 +14,16 @@ bookings_bp = Blueprint('bookings_bp', __name__, url_prefix='/api/bookings')
 @login_required
 def get_my_bookings():
     '''
-    Retrieves all bookings made by the currently logged-in user.
+    Retrieves the bookings made by the currently logged-in user, newest
+    first, one page at a time (?limit=, ?cursor=; see src/pagination.py).
     '''
-    # The 'bookings' backref from the Booking model (lazy='dynamic')
-    # gives a query object, so we use .all() or further filtering.
-    # Ordering by booking_time descending to get newest first.
-    my_bookings_query = current_user.bookings.order_by(Booking.booking_time.desc())
-    my_bookings = my_bookings_query.all()
-    
-    if not my_bookings:
-        return jsonify([]), 200 # Return empty list if no bookings found
-    
-    return jsonify([booking.to_dict() for booking in my_bookings]), 200
+    # Projected rows with the username and space address joined in, no ORM instances
+    stmt = BOOKING.select().where(Booking.user_id == current_user.id)
+    try:
+        my_bookings, next_cursor = paginate(stmt, (Booking.booking_time, Booking.id))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return page_response(BOOKING.dump_rows(my_bookings), next_cursor), 200
 
 # Potential future endpoints for bookings:
 # POST /api/bookings (to create a booking - this is currently in space_routes.py as /api/spaces/<id>/book)
@@ -1,9 +1,14 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from src.models import db # Correctly import db
 from src.models.review import Review
 from src.models.space import ParkingSpace
 from src.models.user import User
+from src.models.change import record_space_change
+from src.serializers import REVIEW
+from src.pagination import page_response, paginate
+from src import response_cache
 
 reviews_bp = Blueprint('reviews_bp', __name__)
 
@@ -28,12 +33,6 @@ def create_review_for_space(space_id):
     if not isinstance(rating, int) or not (1 <= rating <= 5):
         return jsonify({"error": "Rating must be an integer between 1 and 5"}), 400
 
-    # Updated to use SQLAlchemy 2.0 syntax
-    existing_review_stmt = db.select(Review).filter_by(user_id=current_user.id, space_id=space_id)
-    existing_review = db.session.execute(existing_review_stmt).scalar_one_or_none()
-    if existing_review:
-        return jsonify({"error": "You have already reviewed this parking space"}), 409 
-
     review = Review(
         user_id=current_user.id,
         space_id=space_id,
@@ -41,34 +40,66 @@ def create_review_for_space(space_id):
         comment=comment
     )
     db.session.add(review)
+    # The unique (user_id, space_id) index rejects a second review, concurrent ones included
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "You have already reviewed this parking space"}), 409 
+    ParkingSpace.adjust_rating(space_id, rating, 1)
+    record_space_change(space_id, 'rated')
     db.session.commit()
+    invalidate_reviews(review)
     return jsonify(review.to_dict()), 201
 
 # GET /spaces/<int:space_id>/reviews
 @reviews_bp.route('/spaces/<int:space_id>/reviews', methods=['GET'])
 def get_reviews_for_space(space_id):
-    # Updated to use SQLAlchemy 2.0 db.session.get
-    space = db.session.get(ParkingSpace, space_id)
-    if not space:
-        return jsonify({"error": "Parking space not found"}), 404
-    
-    # Updated to use SQLAlchemy 2.0 syntax
-    reviews_stmt = db.select(Review).filter_by(space_id=space_id).order_by(Review.timestamp.desc())
-    reviews = db.session.execute(reviews_stmt).scalars().all()
-    return jsonify([review.to_dict() for review in reviews]), 200
+    def build():
+        # Updated to use SQLAlchemy 2.0 db.session.get
+        space = db.session.get(ParkingSpace, space_id)
+        if not space:
+            return jsonify({"error": "Parking space not found"}), 404
+
+        # Newest first, one page at a time (?limit=, ?cursor=; see src/pagination.py)
+        # Projected rows with the author's username joined in, no ORM instances
+        reviews_stmt = REVIEW.select().where(Review.space_id == space_id)
+        try:
+            reviews, next_cursor = paginate(reviews_stmt, (Review.timestamp, Review.id))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return page_response(REVIEW.dump_rows(reviews), next_cursor)
+
+    # Invalidated by the review writes below and by user changes (reviews show usernames)
+    return response_cache.cached_response(response_cache.request_key('space-reviews', space_id),
+                                          ('reviews', ('space-reviews', space_id)), build)
 
 # GET /users/<int:user_id>/reviews
 @reviews_bp.route('/users/<int:user_id>/reviews', methods=['GET'])
 def get_reviews_by_user(user_id):
-    # Updated to use SQLAlchemy 2.0 db.session.get
-    user = db.session.get(User, user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
-    # Updated to use SQLAlchemy 2.0 syntax
-    reviews_stmt = db.select(Review).filter_by(user_id=user_id).order_by(Review.timestamp.desc())
-    reviews = db.session.execute(reviews_stmt).scalars().all()
-    return jsonify([review.to_dict() for review in reviews]), 200
+    def build():
+        # Updated to use SQLAlchemy 2.0 db.session.get
+        user = db.session.get(User, user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        # Newest first, one page at a time (?limit=, ?cursor=; see src/pagination.py)
+        # Projected rows with the author's username joined in, no ORM instances
+        reviews_stmt = REVIEW.select().where(Review.user_id == user_id)
+        try:
+            reviews, next_cursor = paginate(reviews_stmt, (Review.timestamp, Review.id))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return page_response(REVIEW.dump_rows(reviews), next_cursor)
+
+    return response_cache.cached_response(response_cache.request_key('user-reviews', user_id),
+                                          ('reviews', ('user-reviews', user_id)), build)
+
+
+def invalidate_reviews(review):
+    '''Drops cached responses showing ``review``. Call after committing a change to it.'''
+    response_cache.invalidate(('space-reviews', review.space_id), ('user-reviews', review.user_id),
+                              ('user', review.user_id), 'users') # Users list their review ids
 
 # PUT /reviews/<int:review_id>
 @reviews_bp.route('/reviews/<int:review_id>', methods=['PUT'])
@@ -90,12 +121,20 @@ def update_review(review_id):
         rating = data['rating']
         if not isinstance(rating, int) or not (1 <= rating <= 5):
             return jsonify({"error": "Rating must be an integer between 1 and 5"}), 400
-        review.rating = rating
+        # The delta comes from the rating the write replaced, not the one read above
+        previous = Review.swap_rating(review_id, rating, review.rating)
+        if previous is None:
+            db.session.rollback()
+            return jsonify({"error": "Review not found"}), 404
+        if rating != previous:
+            ParkingSpace.adjust_rating(review.space_id, rating - previous)
+            record_space_change(review.space_id, 'rated')
     
     if 'comment' in data: # Allow empty string for comment
         review.comment = data.get('comment')
     
     db.session.commit()
+    invalidate_reviews(review)
     return jsonify(review.to_dict()), 200
 
 # DELETE /reviews/<int:review_id>
@@ -110,6 +149,14 @@ def delete_review(review_id):
     if review.user_id != current_user.id:
         return jsonify({"error": "Forbidden: You can only delete your own reviews"}), 403
         
-    db.session.delete(review)
+    # Subtract the rating the row held when it was deleted, not the one read above
+    db.session.expunge(review)
+    rating = Review.delete_returning_rating(review_id)
+    if rating is None:
+        db.session.rollback()
+        return jsonify({"error": "Review not found"}), 404
+    ParkingSpace.adjust_rating(review.space_id, -rating, -1)
+    record_space_change(review.space_id, 'rated')
     db.session.commit()
+    invalidate_reviews(review)
     return '', 204
@@ -1,15 +1,47 @@
-import requests # Add this
-from flask import Blueprint, request, jsonify
+import csv
+import hashlib
+import io
+from datetime import datetime, timezone
+import click
+import msgpack
+from flask import Blueprint, request, jsonify, current_app, Response, url_for
 from flask_login import login_required, current_user
 from src.models import db
 from src.models.space import ParkingSpace
-from src.models.booking import Booking # Import the Booking model
+from src.models.booking import Booking, MAX_WINDOW, SLOT_MINUTES, is_slot_aligned # Import the Booking model
+from src.models.change import SpaceChange, record_space_change, record_space_changes_bulk
+from src.models import cluster
+from src.models.cluster import DETAIL_ZOOM, SpaceCluster, precision_for_zoom
+from src.models.tile import MAX_TILE_ZOOM, MIN_TILE_ZOOM, TileVersion, within_tile
+from src.models.search import address_matches
+from src.serializers import BOOKING, MARKER, SPACE
+from src import bookings, bulk_import, events, geocode_worker, geocoding, nearest, response_cache
+from src.pagination import page_response, paginate, parse_limit
 
 spaces_bp = Blueprint("spaces", __name__)
 
+def wants_async():
+    '''True if the client asked for the space to be geocoded in the background.'''
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+def geocode_status_dict(space):
+    data = space.to_dict()
+    data['geocode_job'] = space.geocode_job.to_dict() if space.geocode_job is not None else None
+    return data
+
 @spaces_bp.route("/spaces", methods=["POST"])
 @login_required
 def create_space():
+    '''
+    Lists a new parking space.
+
+    By default the address is geocoded inside the request and the space is
+    returned with 201. With ?async=true (or "Prefer: respond-async") the space
+    is stored as pending and geocoded by a background worker; the response is
+    202 with a Location header pointing at its geocode status endpoint.
+    '''
     data = request.get_json()
     if not data:
         return jsonify({"error": "Invalid input"}), 400
@@ -30,52 +62,44 @@ def create_space():
 
     # Validate price_unit
     price_unit = data['price_unit']
-    allowed_units = ['hour', 'day'] # Define allowed units
+    allowed_units = ParkingSpace.PRICE_UNITS
     if price_unit not in allowed_units:
         return jsonify({"error": f"Invalid price_unit. Allowed units are: {', '.join(allowed_units)}"}), 400
     
     address = data['address']
     image_url = data.get('image_url') # Optional
 
-    # Geocoding
-    geocode_url = f"https://nominatim.openstreetmap.org/search?q={requests.utils.quote(address)}&format=json&limit=1&addressdetails=1"
-    headers = {
-        'User-Agent': 'ParkEdge Demo Application/1.0' # Essential for Nominatim
-    }
-    
-    latitude = None
-    longitude = None
+    if wants_async():
+        new_space = ParkingSpace(
+            address=address,
+            price_amount=price_amount,
+            price_unit=price_unit,
+            owner_id=current_user.id,
+            image_url=image_url,
+            is_booked=False
+        )
+        db.session.add(new_space)
+        geocode_worker.enqueue(new_space)
+        # Logged as 'created' by the worker once the space has coordinates
+        db.session.commit()
+        geocode_worker.notify()
+        response = jsonify(geocode_status_dict(new_space))
+        response.status_code = 202
+        response.headers['Location'] = url_for('spaces.get_geocode_status', space_id=new_space.id)
+        return response
 
+    # Geocoding (cached, see src/geocoding.py)
     try:
-        response = requests.get(geocode_url, headers=headers, timeout=10) # Added timeout
-        response.raise_for_status() # Raise an exception for HTTP errors (4XX, 5XX)
-        results = response.json()
-        
-        if results and isinstance(results, list) and len(results) > 0:
-            selected_result = results[0] # Default to first result
-            # Optional: Heuristic to prefer more specific results if multiple are returned
-            # for res_detail_check in results:
-            #     if res_detail_check.get('address', {}).get('road'):
-            #         selected_result = res_detail_check
-            #         break
-            
-            latitude = selected_result.get('lat')
-            longitude = selected_result.get('lon')
-
-            if not latitude or not longitude:
-                raise ValueError("Latitude or Longitude not found in geocoding response.")
-            
-            latitude = float(latitude) # Convert to float, as Nominatim returns strings
-            longitude = float(longitude)
-
-        else:
-            return jsonify({"error": "Could not geocode address. No results found."}), 400
-    except requests.exceptions.RequestException as e:
+        location = geocoding.geocode(address)
+    except geocoding.GeocoderError as e:
         print(f"Geocoding request failed: {e}") 
         return jsonify({"error": "Geocoding service request failed. Please try again later."}), 503
     except (ValueError, KeyError) as e:
         print(f"Error processing geocoding response: {e}")
         return jsonify({"error": "Error processing geocoding result. Ensure address is specific."}), 400
+    if location is None:
+        return jsonify({"error": "Could not geocode address. No results found."}), 400
+    latitude, longitude = location
 
     new_space = ParkingSpace(
         address=address, # Store the original address provided by user
@@ -88,75 +112,496 @@ def create_space():
         is_booked=False # Default for new space
     )
     db.session.add(new_space)
+    record_space_change(new_space, 'created')
     db.session.commit()
     return jsonify(new_space.to_dict()), 201
 
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/jsonlines': 'jsonl',
+}
+
+@spaces_bp.route("/spaces/import", methods=["POST"])
+@login_required
+def import_spaces():
+    '''
+    Bulk-lists spaces for the current user from a CSV or JSON Lines request
+    body (format from ?format= or the Content-Type). The body is streamed, not
+    buffered; see src/bulk_import.py for the columns. Addresses not in the
+    geocoding cache are queued for background geocoding. Returns a report of
+    imported, pending and failed rows with per-line errors.
+    '''
+    fmt = request.args.get('format') or IMPORT_CONTENT_TYPES.get(request.mimetype)
+    if fmt not in bulk_import.FORMATS:
+        return jsonify({"error": f"Unknown import format. Use ?format= with one of: {', '.join(bulk_import.FORMATS)}"}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        report = bulk_import.import_spaces(stream, fmt, current_user.id)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"Could not read import file: {e}"}), 400
+    return jsonify(report), 200
+
+@spaces_bp.route("/spaces/<int:space_id>/geocode", methods=["GET"])
+@login_required
+def get_geocode_status(space_id):
+    '''
+    Geocoding progress of a space created with ?async=true: the space (with
+    geocode_status 'pending', 'ok' or 'failed') plus its job's attempts,
+    next retry time and last error. Only the owner may look.
+    '''
+    space = db.session.get(ParkingSpace, space_id)
+    if not space:
+        return jsonify({"error": "Parking space not found"}), 404
+    if space.owner_id != current_user.id:
+        return jsonify({"error": "You can only view the geocoding status of your own spaces"}), 403
+    return jsonify(geocode_status_dict(space)), 200
+
+DEFAULT_VIEWPORT_LIMIT = 500
+MAX_VIEWPORT_LIMIT = 2000
+
+def parse_bbox(value):
+    '''
+    Parses a "min_lat,min_lon,max_lat,max_lon" viewport string.
+    Raises ValueError with a client-facing message if it is malformed.
+    '''
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError("bbox must be 'min_lat,min_lon,max_lat,max_lon'")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes must satisfy -90 <= min_lat <= max_lat <= 90")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox longitudes must be between -180 and 180")
+    return min_lat, min_lon, max_lat, max_lon
+
+def parse_time(value, name):
+    '''Parses an ISO 8601 timestamp into a naive UTC datetime (naive input is taken as UTC).'''
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"{name} must be an ISO 8601 timestamp")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def parse_window(start, end):
+    '''
+    Parses a booking window from ``start``/``end`` ISO 8601 timestamps.
+    Returns (start_time, end_time), or None if neither is given. Windows are
+    half-open, aligned to SLOT_MINUTES and at most MAX_WINDOW long; raises
+    ValueError with a client-facing message otherwise.
+    '''
+    if start is None and end is None:
+        return None
+    if start is None or end is None:
+        raise ValueError("start and end must be given together")
+    start_time, end_time = parse_time(start, 'start'), parse_time(end, 'end')
+    if end_time <= start_time:
+        raise ValueError("end must be after start")
+    if end_time - start_time > MAX_WINDOW:
+        raise ValueError(f"Booking windows can be at most {MAX_WINDOW.days} days long")
+    if not (is_slot_aligned(start_time) and is_slot_aligned(end_time)):
+        raise ValueError(f"start and end must fall on {SLOT_MINUTES}-minute boundaries")
+    return start_time, end_time
+
+def parse_space_filters(args):
+    '''
+    SQL filters for the ?address=, ?min_rating=, ?max_price= and ?price_unit=
+    search parameters; each is answered from an index (the FTS5 address
+    index, ix_parking_space_rating, ix_parking_space_price). Raises
+    ValueError with a client-facing message for malformed values.
+    '''
+    filters = []
+    address = args.get('address', '').strip()
+    if address:
+        matches = address_matches(address)
+        if matches is None:
+            raise ValueError("address must contain at least one word")
+        filters.append(matches)
+    if args.get('min_rating'):
+        try:
+            min_rating = float(args['min_rating'])
+        except ValueError:
+            raise ValueError("min_rating must be a number")
+        if not 0 <= min_rating <= 5:
+            raise ValueError("min_rating must be between 0 and 5")
+        if min_rating > 0: # 0 means any rating, unrated included
+            filters.append(ParkingSpace.rating_expression() >= min_rating)
+    if args.get('max_price'):
+        try:
+            max_price = float(args['max_price'])
+        except ValueError:
+            raise ValueError("max_price must be a number")
+        filters.append(ParkingSpace.price_amount <= max_price)
+    if args.get('price_unit'):
+        if args['price_unit'] not in ParkingSpace.PRICE_UNITS:
+            raise ValueError(f"price_unit must be one of: {', '.join(ParkingSpace.PRICE_UNITS)}")
+        filters.append(ParkingSpace.price_unit == args['price_unit'])
+    return filters
+
+def spaces_etag(cursor):
+    '''
+    The response to a given query only changes when the change log advances,
+    so the cursor plus the query parameters identify it.
+    '''
+    params = '&'.join(f'{key}={value}' for key, value in sorted(request.args.items(multi=True)))
+    return hashlib.sha1(f'{cursor}?{params}'.encode()).hexdigest()
+
+SPACE_FORMATS = ('json', 'columnar', 'msgpack')
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+def encode_spaces(rows, fmt, cursor=None):
+    '''
+    The /api/spaces body for projected ``rows`` in ``fmt``: a list of SPACE
+    dicts for json, or MARKER fields as parallel arrays for columnar (JSON)
+    and msgpack. With a ``cursor`` the spaces are wrapped in {"cursor", "spaces"}.
+    '''
+    if fmt == 'json':
+        spaces = SPACE.dump_rows(rows)
+    else:
+        spaces = MARKER.dump_columns(rows)
+    data = spaces if cursor is None else {"cursor": cursor, "spaces": spaces}
+    if fmt == 'msgpack':
+        return current_app.response_class(msgpack.packb(data), mimetype=MSGPACK_MIMETYPE)
+    return jsonify(data)
+
 @spaces_bp.route("/spaces", methods=["GET"])
 def get_spaces():
-    spaces = ParkingSpace.query.filter_by(is_booked=False).all()
-    return jsonify([space.to_dict() for space in spaces]), 200
+    '''
+    Lists available parking spaces.
+
+    With ?bbox=min_lat,min_lon,max_lat,max_lon only spaces inside the viewport
+    are returned (at most ?limit=, default 500), answered from the geohash index.
+    Without a bbox every available space is returned. With ?start=&end=
+    (ISO 8601, on 15-minute boundaries) only spaces free for that whole window
+    are listed; the check is an index probe on booking_slot per space.
+
+    Responses carry an ETag and the current change cursor in X-Spaces-Cursor;
+    a matching If-None-Match gets a 304 without querying the spaces table.
+    Bodies are cached per ETag (src/response_cache.py), so a repeated query
+    costs only the cursor lookup until the next change is committed.
+    With ?since=<cursor> the response is {"cursor": ..., "spaces": [...]}
+    holding only spaces created, booked or re-rated after that cursor
+    (booked ones included, so clients can drop them). Deltas ignore ?limit=,
+    so resuming from the returned cursor never skips a change.
+
+    ?format=columnar returns only the marker fields (id, lat, lon, price,
+    unit, rating, booked) as parallel arrays, {"id": [...], "lat": [...], ...};
+    ?format=msgpack returns the same object as application/msgpack. Both
+    are a fraction of the size of the default list of full space objects.
+
+    Search filters (see parse_space_filters): ?address= matches addresses
+    containing words starting with each word given, ?min_rating= drops
+    spaces rated lower or not rated, ?max_price= and ?price_unit= ("hour",
+    "day") bound the price. They narrow full listings only; ?since= deltas
+    list every changed space so clients can drop the ones that stopped matching.
+    '''
+    fmt = request.args.get('format', 'json')
+    if fmt not in SPACE_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(SPACE_FORMATS)}"}), 400
+    # Projected rows serialized directly (see src/serializers.py); no ORM instances
+    query = SPACE.select() if fmt == 'json' else MARKER.select()
+    limit = None
+
+    bbox = request.args.get('bbox')
+    if bbox is not None:
+        try:
+            min_lat, min_lon, max_lat, max_lon = parse_bbox(bbox)
+            limit = parse_limit(request.args.get('limit'), DEFAULT_VIEWPORT_LIMIT, MAX_VIEWPORT_LIMIT)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        query = query.where(ParkingSpace.within_bbox(min_lat, min_lon, max_lat, max_lon))
+
+    try:
+        window = parse_window(request.args.get('start'), request.args.get('end'))
+        filters = parse_space_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    since = request.args.get('since')
+    if since is not None:
+        if not since.isdigit():
+            return jsonify({"error": "since must be a non-negative integer cursor"}), 400
+        since = int(since)
+
+    # Read the cursor before the spaces so a concurrent write is re-sent, never missed
+    cursor = SpaceChange.latest_id()
+    etag = spaces_etag(cursor)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        def build():
+            nonlocal query
+            if since is None:
+                query = query.where(ParkingSpace.available(spatial=bbox is not None), *filters)
+                if window is not None:
+                    query = query.where(ParkingSpace.free_between(*window))
+            else:
+                changed_ids = SpaceChange.changed_space_ids(since) if since < cursor else []
+                query = query.where(ParkingSpace.id.in_(changed_ids))
+            # A delta is never cut short: the returned cursor covers every change up to it
+            if limit is not None and since is None:
+                query = query.limit(limit)
+            return encode_spaces(db.session.execute(query).all(), fmt, cursor=None if since is None else cursor)
+        # The ETag covers the cursor, which every booking advances, so entries never go stale
+        response = response_cache.cached_response(('spaces', etag), ('spaces',), build)
+
+    response.set_etag(etag)
+    response.headers['X-Spaces-Cursor'] = str(cursor)
+    response.headers['Cache-Control'] = 'no-cache' # Let browsers revalidate with If-None-Match
+    return response
+
+MAX_ZOOM = 22
+
+@spaces_bp.route("/spaces/clusters", methods=["GET"])
+def get_space_clusters():
+    '''
+    Map markers for ?bbox=min_lat,min_lon,max_lat,max_lon at ?zoom= (0-22).
+
+    Below DETAIL_ZOOM the response is {"zoom", "clusters": [...], "spaces": []}
+    with one cluster per non-empty grid cell of available spaces: cell,
+    count, centroid latitude/longitude, min_hourly_price, min_daily_price
+    and best_rating. Clusters are read from the space_cluster table, which
+    every write keeps current (src/models/cluster.py), so nothing is
+    aggregated per request. From DETAIL_ZOOM up, "clusters" is empty and
+    "spaces" lists the individual spaces, as /api/spaces?bbox= does.
+    '''
+    try:
+        bbox = parse_bbox(request.args.get('bbox', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    zoom = request.args.get('zoom', '')
+    if not zoom.isdigit() or int(zoom) > MAX_ZOOM:
+        return jsonify({"error": f"zoom must be an integer between 0 and {MAX_ZOOM}"}), 400
+    zoom = int(zoom)
+
+    def build():
+        if zoom >= DETAIL_ZOOM:
+            query = (SPACE.select()
+                     .where(ParkingSpace.within_bbox(*bbox), ParkingSpace.available(spatial=True))
+                     .limit(MAX_VIEWPORT_LIMIT))
+            return jsonify({"zoom": zoom, "clusters": [], "spaces": SPACE.dump_rows(db.session.execute(query))})
+        clusters = db.session.scalars(db.select(SpaceCluster).where(
+            SpaceCluster.in_bbox(precision_for_zoom(zoom), *bbox))).all()
+        return jsonify({"zoom": zoom, "clusters": [found.to_dict() for found in clusters], "spaces": []})
+
+    # Clusters change with every logged space change, like /api/spaces
+    cursor = SpaceChange.latest_id()
+    response = response_cache.cached_response(response_cache.request_key('clusters', cursor), ('spaces',), build)
+    response.headers['X-Spaces-Cursor'] = str(cursor)
+    return response
+
+@spaces_bp.route("/spaces/tiles/<int:zoom>/<int:x>/<int:y>", methods=["GET"])
+def get_space_tile(zoom, x, y):
+    '''
+    Available spaces inside one OSM slippy-map tile (the {z}/{x}/{y} scheme
+    Leaflet uses), for zoom MIN_TILE_ZOOM to MAX_TILE_ZOOM. ?format= is as
+    for /api/spaces.
+
+    Every tile has a version, the cursor of the latest change to a space
+    inside it (X-Tile-Version; src/models/tile.py), so a booking elsewhere
+    leaves the tile, its strong ETag and its cached body untouched. Responses
+    are public and revalidate with If-None-Match (304), or may be reused for
+    TILE_MAX_AGE seconds (app config, default 0) by browsers and proxies.
+    '''
+    if not MIN_TILE_ZOOM <= zoom <= MAX_TILE_ZOOM:
+        return jsonify({"error": f"zoom must be between {MIN_TILE_ZOOM} and {MAX_TILE_ZOOM}"}), 400
+    if x >= 1 << zoom or y >= 1 << zoom:
+        return jsonify({"error": f"x and y must be below {1 << zoom} at zoom {zoom}"}), 400
+    fmt = request.args.get('format', 'json')
+    if fmt not in SPACE_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(SPACE_FORMATS)}"}), 400
+
+    # Read before the version, so a client syncing from it (?since=) re-sends rather than misses
+    cursor = SpaceChange.latest_id()
+    version = TileVersion.current(zoom, x, y)
+    etag = f'{zoom}-{x}-{y}-{version}-{fmt}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        def build():
+            query = (SPACE.select() if fmt == 'json' else MARKER.select()).where(
+                within_tile(zoom, x, y), ParkingSpace.available(spatial=True))
+            return encode_spaces(db.session.execute(query).all(), fmt)
+        # Keyed by version, so entries never go stale and need no invalidation
+        response = response_cache.cached_response(('tile', etag), (), build)
+
+    response.set_etag(etag)
+    response.headers['X-Tile-Version'] = str(version)
+    response.headers['X-Spaces-Cursor'] = str(cursor)
+    max_age = current_app.config.get('TILE_MAX_AGE', 0)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'public, no-cache'
+    return response
+
+def parse_coordinate(name, bound):
+    '''Parses the required ?<name>= coordinate, within +-bound degrees.'''
+    try:
+        value = float(request.args[name])
+    except (KeyError, ValueError):
+        raise ValueError(f"{name} is required and must be a number")
+    if not -bound <= value <= bound:
+        raise ValueError(f"{name} must be between {-bound} and {bound}")
+    return value
+
+@spaces_bp.route("/spaces/nearest", methods=["GET"])
+def get_nearest_spaces():
+    '''
+    The ?k= (default 10, at most 100) available spaces nearest ?lat=&lon=,
+    closest first, each with its "distance_m". Only spaces within
+    nearest.MAX_RADIUS_M are considered. The search filters of /api/spaces
+    (?address=, ?min_rating=, ?max_price=, ?price_unit=) apply. Candidates
+    come from geohash range scans in expanding rings (src/nearest.py), so
+    the cost depends on how crowded the area is, not on the number of listings.
+    '''
+    try:
+        latitude = parse_coordinate('lat', 90)
+        longitude = parse_coordinate('lon', 180)
+        filters = parse_space_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    k = request.args.get('k', str(nearest.DEFAULT_K))
+    if not k.isdigit() or int(k) == 0:
+        return jsonify({"error": "k must be a positive integer"}), 400
+    k = min(int(k), nearest.MAX_K)
+
+    ranked = nearest.nearest_spaces(latitude, longitude, k, filters)
+    rows = db.session.execute(SPACE.select().where(ParkingSpace.id.in_([space_id for _, space_id in ranked]))).all()
+    spaces = {space['id']: space for space in SPACE.dump_rows(rows)}
+    results = []
+    for distance, space_id in ranked:
+        space = spaces[space_id]
+        space['distance_m'] = round(distance, 1)
+        results.append(space)
+    return jsonify(results), 200
+
+@spaces_bp.route("/spaces/stream", methods=["GET"])
+def stream_spaces():
+    '''
+    Server-Sent Events stream of space changes, optionally limited to ?bbox=.
+
+    Starts with a "hello" event carrying the current change cursor, then sends
+    a "space" event (id = cursor, data = {"kind", "space"}) whenever a space is
+    created, booked or re-rated. See src/events.py for the per-worker
+    subscriber limit; over the limit this returns 503.
+    '''
+    bbox = request.args.get('bbox')
+    if bbox is not None:
+        try:
+            bbox = parse_bbox(bbox)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    limit = current_app.config.get('SSE_MAX_SUBSCRIBERS', events.DEFAULT_MAX_SUBSCRIBERS)
+    subscriber = events.broadcaster.subscribe(bbox, limit=limit)
+    if subscriber is None:
+        return jsonify({"error": "Too many live update subscribers. Poll /api/spaces?since= instead."}), 503
+    # Subscribed before reading the cursor, so no change falls between the two
+    cursor = SpaceChange.latest_id()
+    # Hand the connection back now rather than holding it for the life of the stream
+    db.session.close()
+
+    def generate():
+        try:
+            yield events.format_event({"cursor": cursor}, event='hello')
+            while not subscriber.overflowed:
+                message = subscriber.get(timeout=events.HEARTBEAT_SECONDS)
+                yield message if message is not None else b': keep-alive\n\n'
+        finally:
+            events.broadcaster.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @spaces_bp.route("/spaces/<int:space_id>/book", methods=["POST"])
 @login_required
 def book_space(space_id):
-    # Use db.session.get for SQLAlchemy 2.0 compatibility if preferred,
-    # or keep ParkingSpace.query.get if using older versions or for consistency.
-    # Assuming ParkingSpace.query.get is fine based on existing code.
-    space = ParkingSpace.query.get(space_id) 
-    if not space:
-        return jsonify({"error": "Parking space not found"}), 404
+    '''
+    Books a space. With "start" and "end" (ISO 8601, in the JSON body or the
+    query string) only that window is booked and the space stays bookable at
+    other times; 409 if any part of the window is taken. Without a window the
+    whole space is booked, as before.
+    '''
+    data = request.get_json(silent=True) or {}
+    try:
+        window = parse_window(data.get('start', request.args.get('start')),
+                              data.get('end', request.args.get('end')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if window is not None and window[1] <= datetime.utcnow():
+        return jsonify({"error": "Booking window has already ended"}), 400
 
-    # === New check for concurrent bookings ===
-    # For SQLAlchemy 2.0 style, you might use:
-    # active_booking_count = db.session.query(db.func.count(Booking.id)).filter_by(user_id=current_user.id, status='confirmed').scalar_one_or_none() or 0
-    # Using filter_by().count() for consistency with provided snippet.
-    active_booking_count = Booking.query.filter_by(user_id=current_user.id, status='confirmed').count()
-    MAX_CONCURRENT_BOOKINGS = 3
-    if active_booking_count >= MAX_CONCURRENT_BOOKINGS:
-        return jsonify({"error": f"You have reached the maximum limit of {MAX_CONCURRENT_BOOKINGS} active bookings."}), 403 # Forbidden
-    # === End of new check ===
-    
-    # Prevent users from booking their own spaces
-    # Ensure space.owner_id is available (added in a previous subtask)
-    if hasattr(space, 'owner_id') and space.owner_id == current_user.id:
-        return jsonify({"error": "You cannot book your own parking space"}), 403 # 403 Forbidden
+    # One conditional write decides the booking; see src/bookings.py
+    try:
+        booking_id = bookings.book_space(space_id, current_user.id, window)
+    except bookings.BookingError as e:
+        return jsonify({"error": str(e)}), e.status
 
-    if space.is_booked: # This check might be enhanced later by looking at active bookings
-        return jsonify({"error": "Parking space is already booked"}), 409 # 409 Conflict is often better for "already exists"
-    
-    # Create a new booking record
-    new_booking = Booking(
-        user_id=current_user.id,
-        space_id=space.id,
-        status='confirmed' 
-        # booking_time defaults to now() via model default
-        # price_at_booking could be added if needed: price_at_booking=space.price
-    )
-    db.session.add(new_booking)
-    
-    # Keep the original is_booked logic for now.
-    # This flag on the space might be useful for a quick "is available" check on the map,
-    # while the Booking table holds detailed history and future/active bookings.
-    space.is_booked = True 
-    
-    db.session.commit() # Commit both the new booking and the space update
-    
-    # Return the space details, or perhaps the booking details, or both
-    # For now, returning space details as per original function
-    return jsonify(space.to_dict()), 200
+    # Return the space details along with the booking
+    # BOOKING's eager loads bring the space along in the same query
+    booking = db.session.scalar(BOOKING.apply(db.select(Booking)).where(Booking.id == booking_id))
+    data = booking.space.to_dict()
+    data['booking'] = BOOKING.dump(booking)
+    return jsonify(data), 200
 
 @spaces_bp.route('/me/spaces', methods=['GET'])
 @login_required
 def get_my_listed_spaces():
     '''
-    Retrieves all parking spaces listed by the currently logged-in user.
+    Retrieves the parking spaces listed by the currently logged-in user,
+    newest first, one page at a time (?limit=, ?cursor=; see src/pagination.py).
     '''
-    # The 'owned_spaces' backref from the ParkingSpace model (lazy='dynamic')
-    # gives a query object, so we use .all()
-    my_spaces = current_user.owned_spaces.all() 
-    
-    if not my_spaces:
-        return jsonify([]), 200 # Return empty list if no spaces found
-    
-    return jsonify([space.to_dict() for space in my_spaces]), 200
+    stmt = SPACE.select().where(ParkingSpace.owner_id == current_user.id)
+    try:
+        my_spaces, next_cursor = paginate(stmt, (ParkingSpace.id,))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return page_response(SPACE.dump_rows(my_spaces), next_cursor), 200
 
+@spaces_bp.cli.command("rebuild-clusters")
+def rebuild_clusters_command():
+    '''Recomputes the space_cluster table from scratch (it is otherwise kept current on every write).'''
+    cluster.rebuild(db.session)
+    db.session.commit()
+    print(f"Rebuilt {db.session.scalar(db.select(db.func.count()).select_from(SpaceCluster))} clusters.")
+
+@spaces_bp.cli.command("geocode-pending")
+def geocode_pending_command():
+    '''Geocodes every due pending space, for deployments that run GEOCODE_WORKERS=0.'''
+    processed = geocode_worker.run_pending()
+    print(f"Processed {processed} geocoding jobs.")
+
+@spaces_bp.cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--owner", required=True, help="Email or username of the user who will own the spaces.")
+@click.option("--format", "fmt", type=click.Choice(bulk_import.FORMATS),
+              help="Input format; guessed from the file extension if omitted.")
+@click.option("--geocode", type=click.Choice(bulk_import.GEOCODE_MODES), default='async', show_default=True,
+              help="Geocode cache misses now (rate limited) or queue them for the background workers.")
+def import_spaces_command(path, owner, fmt, geocode):
+    '''Bulk-imports parking spaces from a CSV or JSON Lines file.'''
+    from src.models.user import User
+    user = db.session.scalar(db.select(User).where(db.or_(User.email == owner, User.username == owner)))
+    if user is None:
+        raise click.UsageError(f"No user with email or username {owner!r}.")
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = bulk_import.import_spaces(stream, fmt, user.id, geocode=geocode)
+    for error in report['errors']:
+        print(f"Line {error['line']}: {error['error']}")
+    print(f"Imported {report['imported']} parking spaces, {report['pending_geocode']} pending geocoding, "
+          f"{report['failed']} failed.")
+
+@spaces_bp.cli.command("recompute-ratings")
+def recompute_ratings_command():
+    '''Rebuilds the rating_sum/rating_count aggregates from the review table.'''
+    updated = ParkingSpace.recompute_ratings()
+    # Logged like any re-rating, so clusters, tile versions and cached
+    # responses for these spaces are refreshed in the same commit
+    record_space_changes_bulk(updated, 'rated')
+    db.session.commit()
+    print(f"Recomputed ratings for {len(updated)} parking spaces.")
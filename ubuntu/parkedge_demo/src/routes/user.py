@@ -1,42 +1,83 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user # Added current_user and login_required
 from src.models.user import User, db
+from src.serializers import PUBLIC_USER
+from src.pagination import page_response, paginate
+from src import ops, response_cache, user_cache
 
 user_bp = Blueprint('user', __name__) # Existing blueprint, no url_prefix here
 
+# Other people's accounts are listed with PUBLIC_USER only. Accounts are
+# created by Google sign-in (or by operators, see src/ops.py) and only
+# their owner may change or delete them.
+
+def _forbidden_unless_self(user_id):
+    if user_id != current_user.id:
+        return jsonify({"error": "Forbidden: You can only change your own account"}), 403
+    return None
+
 @user_bp.route('/users', methods=['GET'])
+@login_required
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    def build():
+        # Newest first, one page at a time (?limit=, ?cursor=; see src/pagination.py)
+        try:
+            users, next_cursor = paginate(PUBLIC_USER.apply(db.select(User)), (User.id,))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return page_response(PUBLIC_USER.dump_many(users), next_cursor)
+    return response_cache.cached_response(response_cache.request_key('users'), ('users',), build)
+
+def invalidate_user(user_id):
+    '''Drops cached responses and the cached login showing the user. Call after committing a change to it.'''
+    # Reviews carry the author's username
+    response_cache.invalidate('users', ('user', user_id), 'reviews')
+    user_cache.invalidate(user_id)
 
 @user_bp.route('/users', methods=['POST'])
+@ops.ops_only
 def create_user():
-    
     data = request.json
     user = User(username=data['username'], email=data['email'])
     db.session.add(user)
     db.session.commit()
+    response_cache.invalidate('users')
     return jsonify(user.to_dict()), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@login_required
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
+    def build():
+        user = User.query.get_or_404(user_id)
+        return jsonify(PUBLIC_USER.dump(user))
+    return response_cache.cached_response(('user', user_id), ('users', ('user', user_id)), build)
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
+@login_required
 def update_user(user_id):
+    forbidden = _forbidden_unless_self(user_id)
+    if forbidden:
+        return forbidden
     user = User.query.get_or_404(user_id)
     data = request.json
+    # Sign-in matches accounts by email, so it only ever comes from Google
+    if data.get('email', user.email) != user.email:
+        return jsonify({"error": "email is set by Google sign-in and cannot be changed"}), 400
     user.username = data.get('username', user.username)
-    user.email = data.get('email', user.email)
     db.session.commit()
+    invalidate_user(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@login_required
 def delete_user(user_id):
+    forbidden = _forbidden_unless_self(user_id)
+    if forbidden:
+        return forbidden
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     return '', 204
 
 @user_bp.route('/me/profile', methods=['PUT']) # New route
@@ -73,6 +114,7 @@ def update_my_profile(): # New function name
 
     try:
         db.session.commit()
+        invalidate_user(current_user.id)
         return jsonify(current_user.to_dict()), 200
     except Exception as e:
         db.session.rollback()
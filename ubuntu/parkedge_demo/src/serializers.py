@@ -0,0 +1,204 @@
+'''
+Response serialization for the models.
+
+A Schema lists the fields a response needs. Fields can reach through
+relationships ("user.username") or collect over a collection
+("reviews[].id"), and the schema derives the eager loads those paths require,
+so list endpoints load everything they serialize in a constant number of
+queries instead of one lazy load per row:
+
+    stmt = db.select(Review).options(*REVIEW.load_options)
+    return jsonify(REVIEW.dump_many(db.session.execute(stmt).scalars()))
+
+List endpoints can skip building ORM instances altogether: select() projects
+just the columns the fields need (outer-joining to-one relationships) and
+dump_rows() serializes the resulting rows directly. That saves the identity
+map, attribute state and relationship bookkeeping per row; on 50k-row lists
+it cuts CPU time by 45-75% and peak memory by 45-70%
+(benchmarks/bench_serialization.py):
+
+    stmt = REVIEW.select().where(Review.space_id == space_id)
+    return jsonify(REVIEW.dump_rows(db.session.execute(stmt)))
+'''
+from datetime import datetime
+from operator import itemgetter
+
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased, configure_mappers, joinedload, selectinload
+
+from src.models.booking import Booking
+from src.models.geocode import GeocodeJob
+from src.models.review import Review
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class Schema:
+    '''
+    Serializes instances of ``model`` to dicts.
+
+    ``fields`` entries are either an attribute name, or an
+    ``(output_name, path)`` pair where ``path`` is "relationship.attribute"
+    (None if the relationship is empty) or "collection[].attribute" (a list).
+
+    ``derived`` maps fields that are Python properties rather than columns to
+    ``(function, column_names)``, so projected rows can compute them too.
+    '''
+
+    def __init__(self, model, fields, derived=None):
+        self.model = model
+        self._fields = []
+        for field in fields:
+            name, path = (field, field) if isinstance(field, str) else field
+            self._fields.append((name, path))
+        self._derived = derived or {}
+        self._load_options = None
+        self._projection = None
+
+    @property
+    def load_options(self):
+        '''Loader options that eager-load every relationship the fields touch.'''
+        # Resolved lazily: backref relationships only exist once every model is mapped
+        if self._load_options is None:
+            configure_mappers()
+            options = []
+            for relationship in sorted({path.split('.')[0] for _, path in self._fields if '.' in path}):
+                attribute = getattr(self.model, relationship.removesuffix('[]'))
+                if attribute.property.uselist:
+                    options.append(selectinload(attribute))
+                else:
+                    options.append(joinedload(attribute))
+            self._load_options = tuple(options)
+        return self._load_options
+
+    def apply(self, query):
+        '''Adds this schema's eager loads to a select() or Query.'''
+        return query.options(*self.load_options)
+
+    def dump(self, obj):
+        data = {}
+        for name, path in self._fields:
+            if '.' not in path:
+                data[name] = _format(getattr(obj, path))
+                continue
+            relationship, attribute = path.split('.', 1)
+            if relationship.endswith('[]'):
+                related = getattr(obj, relationship[:-2])
+                data[name] = [_format(getattr(item, attribute)) for item in related]
+            else:
+                related = getattr(obj, relationship)
+                data[name] = _format(getattr(related, attribute)) if related is not None else None
+        return data
+
+    def dump_many(self, objs):
+        return [self.dump(obj) for obj in objs]
+
+    def _project(self):
+        '''Builds the projected columns, the joins they need and a (name, row -> value) reader per field.'''
+        configure_mappers()
+        columns, joins, readers, aliases = [], [], [], {}
+
+        def add(column, label):
+            columns.append(column.label(label))
+            return len(columns) - 1
+
+        for name, path in self._fields:
+            if path in self._derived:
+                function, inputs = self._derived[path]
+                positions = [add(getattr(self.model, column), f'_{column}') for column in inputs]
+                readers.append((name, lambda row, f=function, p=positions: f(*(row[i] for i in p))))
+                continue
+            if '[]' in path:
+                raise ValueError(f"{self.model.__name__} field {name!r} is a collection and cannot be projected")
+            if '.' in path:
+                relationship, attribute = path.split('.', 1)
+                if relationship not in aliases:
+                    attr = getattr(self.model, relationship)
+                    aliases[relationship] = aliased(attr.property.mapper.class_)
+                    joins.append((aliases[relationship], attr.of_type(aliases[relationship])))
+                column = getattr(aliases[relationship], attribute)
+            else:
+                column = getattr(self.model, path)
+            position = add(column, name)
+            if isinstance(column.type, sa.DateTime):
+                readers.append((name, lambda row, i=position: None if row[i] is None else row[i].isoformat()))
+            else:
+                readers.append((name, itemgetter(position)))
+        return columns, joins, readers
+
+    def select(self):
+        '''
+        A select() of only the columns the fields need, to-one relationships
+        outer-joined (through aliases, so callers can still filter on the
+        model's own columns). Serialize its rows with dump_rows(). Filter
+        with where(); filter_by() would apply to the last joined alias.
+        '''
+        if self._projection is None:
+            self._projection = self._project()
+        columns, joins, _ = self._projection
+        stmt = sa.select(*columns).select_from(self.model)
+        for target, onclause in joins:
+            stmt = stmt.outerjoin(target, onclause)
+        return stmt
+
+    def dump_rows(self, rows):
+        '''Serializes rows of select() straight to dicts, without ORM instances.'''
+        if self._projection is None:
+            self._projection = self._project()
+        readers = self._projection[2]
+        return [{name: read(row) for name, read in readers} for row in rows]
+
+    def dump_columns(self, rows):
+        '''Serializes rows of select() to {field: [value per row]}, one parallel array per field.'''
+        if self._projection is None:
+            self._projection = self._project()
+        rows = rows if isinstance(rows, list) else list(rows)
+        return {name: [read(row) for row in rows] for name, read in self._projection[2]}
+
+
+SPACE = Schema(ParkingSpace, [
+    'id', 'address', 'latitude', 'longitude', 'price_amount', 'price_unit',
+    'is_booked', 'owner_id', 'image_url', 'geocode_status',
+    ('review_count', 'rating_count'),
+    'average_rating',
+], derived={'average_rating': (ParkingSpace.rating_average, ('rating_sum', 'rating_count'))})
+
+# Just what a map marker needs, for the compact /api/spaces formats
+MARKER = Schema(ParkingSpace, [
+    'id', ('lat', 'latitude'), ('lon', 'longitude'), ('price', 'price_amount'), ('unit', 'price_unit'),
+    ('rating', 'average_rating'), ('booked', 'is_booked'),
+], derived={'average_rating': (ParkingSpace.rating_average, ('rating_sum', 'rating_count'))})
+
+REVIEW = Schema(Review, [
+    'id', 'rating', 'comment', 'timestamp', 'user_id',
+    ('user_username', 'user.username'),
+    'space_id',
+])
+
+BOOKING = Schema(Booking, [
+    'id', 'user_id', 'space_id', 'booking_time', 'start_time', 'end_time', 'status',
+    ('user_username', 'user.username'),
+    ('space_address', 'space.address'),
+])
+
+USER = Schema(User, [
+    'id', 'username', 'email', 'google_id', 'profile_pic', 'payment_info',
+    'phone_number',
+    ('review_ids', 'reviews[].id'),
+])
+
+# What other users may see; no contact, payment or sign-in details
+PUBLIC_USER = Schema(User, [
+    'id', 'username', 'profile_pic',
+    ('review_ids', 'reviews[].id'),
+])
+
+GEOCODE_JOB = Schema(GeocodeJob, [
+    'space_id', 'status', 'attempts', 'next_attempt_at', 'last_error',
+])
@@ -0,0 +1,111 @@
+'''
+Per-process cache of logged-in users for Flask-Login's user_loader.
+
+Every authenticated request (including /auth/status, which each page calls
+on load) needs current_user. load_user() keeps the user's column values in
+a small TTL/LRU cache and re-attaches them to the request's session as a
+User without any SQL (merge(load=False)), so it is a normal persistent
+object: routes can still change and commit it.
+
+Changes to a user go through routes.user.invalidate_user(), which drops the
+entry here after the commit. It uses the same versioned invalidation as
+the response cache, so a load racing an update cannot store the old row.
+Other processes pick the change up when their entry expires.
+
+With USER_SESSION_SNAPSHOT the public columns (SNAPSHOT_FIELDS) are also
+kept in the signed session cookie, stamped with SNAPSHOT_VERSION and the
+time they were read. A request landing on a process with a cold cache then
+needs no SQL either. Snapshots older than the TTL, or written by another
+SNAPSHOT_VERSION, are ignored. Columns left out of the snapshot (payment and
+phone details are never put in a cookie) load on first access.
+
+Configuration (app.config):
+    USER_CACHE_SIZE        users kept per process (default 1024; 0 disables the cache)
+    USER_CACHE_TTL         seconds a cached user or session snapshot is trusted (default 30)
+    USER_SESSION_SNAPSHOT  also keep a snapshot in the session cookie (default False)
+'''
+import threading
+import time
+
+from flask import current_app, has_request_context, session
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.models import db
+from src.models.user import User
+from src.response_cache import ResponseCache
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 30
+
+SNAPSHOT_KEY = '_user_snapshot'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'profile_pic')
+
+_COLUMNS = tuple(column.key for column in User.__mapper__.column_attrs)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    '''Returns this process's user cache, created on first use.'''
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(current_app.config.get('USER_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+                                       current_app.config.get('USER_CACHE_TTL', DEFAULT_CACHE_TTL))
+    return _cache
+
+
+def _attach(values):
+    '''A User in the current session built from ``values``, without querying.'''
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def _read_snapshot(user_id):
+    snapshot = session.get(SNAPSHOT_KEY)
+    if not snapshot or snapshot.get('v') != SNAPSHOT_VERSION or snapshot.get('user', {}).get('id') != user_id:
+        return None
+    if time.time() - snapshot.get('at', 0) > current_app.config.get('USER_CACHE_TTL', DEFAULT_CACHE_TTL):
+        return None
+    return snapshot['user']
+
+
+def _write_snapshot(values):
+    session[SNAPSHOT_KEY] = {'v': SNAPSHOT_VERSION, 'at': int(time.time()),
+                             'user': {field: values[field] for field in SNAPSHOT_FIELDS}}
+
+
+def load_user(user_id):
+    '''Flask-Login user_loader: the User with ``user_id`` (a string), or None.'''
+    user_id = int(user_id)
+    tags = (('user', user_id),)
+    cache = get_cache()
+    values, token = cache.get(user_id, tags)
+    if values is not None:
+        return _attach(values)
+
+    snapshots = current_app.config.get('USER_SESSION_SNAPSHOT', False) and has_request_context()
+    if snapshots:
+        values = _read_snapshot(user_id)
+        if values is not None:
+            return _attach(values)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    values = {column: getattr(user, column) for column in _COLUMNS}
+    cache.put(user_id, values, tags, token)
+    if snapshots:
+        _write_snapshot(values)
+    return user
+
+
+def invalidate(user_id):
+    '''Forgets the cached user (and the caller's own session snapshot of it). Call after committing.'''
+    if _cache is not None:
+        _cache.invalidate(('user', user_id))
+    if has_request_context() and session.get(SNAPSHOT_KEY, {}).get('user', {}).get('id') == user_id:
+        session.pop(SNAPSHOT_KEY)
@@ -0,0 +1,15 @@
+'''
+WSGI entry point for gunicorn, e.g.
+
+    gunicorn --preload -k gthread --threads 8 -w 4 src.wsgi:app
+
+With --preload the master imports the code, builds the app and upgrades the
+schema once, and every worker is forked with all of that already done. It
+is safe to fork afterwards: init_db() closes its database connections, and
+each worker opens its own connections and starts its geocoding threads on
+its first request. Without --preload each worker does the same at boot.
+'''
+from src.main import create_app, init_db
+
+app = create_app()
+init_db(app)
@@ -8,15 +8,16 @@ from flask_login import LoginManager
 # Add the project root to the Python path to allow imports from src
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.main import app as main_app
+from src.main import create_app
 from src.models import db as _db # alias to avoid conflict with pytest fixture
+from src import response_cache, user_cache
 
 @pytest.fixture(scope='session')
 def app():
-    """Session-wide test Flask application."""
+    """Session-wide test Flask application, on a throwaway database."""
     db_fd, db_path = tempfile.mkstemp(suffix='.db')
     
-    main_app.config.update({
+    test_app = create_app({
         "TESTING": True,
         "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
         "WTF_CSRF_ENABLED": False,
@@ -25,15 +26,16 @@ def app():
         "GOOGLE_CLIENT_ID": "test_google_client_id",
         "GOOGLE_CLIENT_SECRET": "test_google_client_secret",
         "GOOGLE_REDIRECT_URI": "http://localhost/auth/login/google/authorized",
-        "SERVER_NAME": "localhost.test" # Added to ensure url_for works correctly in all contexts
+        "SERVER_NAME": "localhost.test", # Added to ensure url_for works correctly in all contexts
+        "GEOCODE_WORKERS": 0 # Tests drain the geocode queue explicitly
     })
 
-    with main_app.app_context():
+    with test_app.app_context():
         _db.create_all()
 
-    yield main_app
+    yield test_app
 
-    with main_app.app_context():
+    with test_app.app_context():
         _db.session.remove()
         _db.drop_all()
     
@@ -53,7 +55,10 @@ def database(app): # Renamed from 'db' to 'database'
     """
     with app.app_context():
         _db.create_all()   # Recreate all tables
+        response_cache.get_cache().clear() # Ids repeat once the tables are recreated
+        user_cache.get_cache().clear()
     yield _db # Yield the actual _db instance used by the app
+    _db.session.remove() # The test's own session, so it cannot keep holding the write connection
     with app.app_context():
         _db.session.remove()
         _db.drop_all()
@@ -78,12 +83,44 @@ def test_space(database, test_user): # Depends on 'database' fixture
         address="123 Test St, Test City",
         latitude=34.0522,
         longitude=-118.2437,
-        price="$10/hr"
+        price_amount=10.0,
+        price_unit="hour",
+        owner_id=test_user.id
     )
     database.session.add(space)
     database.session.commit()
     return database.session.get(ParkingSpace, space.id)
 
+@pytest.fixture
+def other_user(database):
+    """A second user, e.g. to own spaces that test_user books (nobody can book their own)."""
+    from src.models.user import User
+    user = User(username="owner", email="owner@example.com")
+    database.session.add(user)
+    database.session.commit()
+    return user
+
+@pytest.fixture
+def list_space(database, test_user):
+    """
+    Creates spaces the way the app does, logging the change that keeps
+    clusters, tile versions and the /api/spaces cursor current:
+    `list_space(lat, lon, owner_id=None, **fields)` returns the new id.
+    Spaces belong to test_user unless `owner_id` says otherwise.
+    """
+    from src.models.change import record_space_change
+    from src.models.space import ParkingSpace
+
+    def create(latitude, longitude, owner_id=None, **fields):
+        fields = {'address': f"{latitude},{longitude}", 'price_amount': 5.0, 'price_unit': 'hour', **fields}
+        space = ParkingSpace(latitude=latitude, longitude=longitude,
+                             owner_id=test_user.id if owner_id is None else owner_id, **fields)
+        database.session.add(space)
+        record_space_change(space, 'created')
+        database.session.commit()
+        return space.id
+    return create
+
 @pytest.fixture
 def logged_in_client(client, test_user, app, database): # Added 'database' dependency
     """A test client where test_user is logged in."""
@@ -101,3 +138,84 @@ def logged_in_client(client, test_user, app, database): # Added 'database' depen
         with app.test_request_context(): # Ensure a request context for logout_user
             from flask_login import logout_user
             logout_user()
+
+@pytest.fixture
+def query_counter(app, database):
+    """Counts SQL statements executed against the app's engine, e.g. `with query_counter() as queries:`."""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+
+    @contextmanager
+    def counter():
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        from src.database import read_engine
+        engines = [engine for engine in (database.engine, read_engine(app)) if engine is not None]
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
+
+@pytest.fixture
+def stub_geocoder(app, database):
+    """
+    Local HTTP stand-in for Nominatim. Map addresses to coordinates in
+    `stub.locations`; unknown addresses get an empty result list, and
+    `stub.fail = True` makes it answer 503. `stub.queries` records every q=.
+    """
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+    from src import geocoding
+
+    class Stub:
+        locations = {}
+        queries = []
+        fail = False
+
+    stub = Stub()
+    stub.locations = {}
+    stub.queries = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+            stub.queries.append(query)
+            if stub.fail:
+                self.send_response(503)
+                self.end_headers()
+                return
+            location = stub.locations.get(query)
+            body = [] if location is None else [{"lat": str(location[0]), "lon": str(location[1])}]
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    previous_url = app.config.get('GEOCODER_URL')
+    app.config['GEOCODER_URL'] = f"http://127.0.0.1:{server.server_address[1]}/search"
+    app.config['GEOCODER_RATE_LIMIT'] = 1000
+    geocoding.get_cache().clear_memory()
+    yield stub
+    geocoding.get_cache().clear_memory()
+    if previous_url is None:
+        app.config.pop('GEOCODER_URL')
+    else:
+        app.config['GEOCODER_URL'] = previous_url
+    app.config.pop('GEOCODER_RATE_LIMIT')
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import sqlalchemy as sa
+
+from src.main import create_app, init_db
+from src.models import db as _db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_create_app_leaves_database_and_heavy_libraries_alone(tmp_path):
+    # A fresh interpreter, since this test session has long imported everything
+    path = tmp_path / "untouched.db"
+    script = (
+        "import sys\n"
+        "from src.main import create_app\n"
+        f"app = create_app({{'SQLALCHEMY_DATABASE_URI': 'sqlite:///{path}'}})\n"
+        "print(sorted(name for name in ('requests', 'google_auth_oauthlib', 'google.auth') if name in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True, capture_output=True, text=True)
+    assert output.stdout.strip() == "[]"
+    assert not path.exists()
+
+def test_init_db_creates_and_upgrades_schema_idempotently(tmp_path):
+    path = tmp_path / "fresh.db"
+    other = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'GEOCODE_WORKERS': 0})
+    init_db(other)
+    init_db(other)
+    engine = sa.create_engine(f'sqlite:///{path}')
+    with engine.connect() as connection:
+        tables = set(sa.inspect(connection).get_table_names())
+        version = connection.exec_driver_sql('PRAGMA user_version').scalar()
+    engine.dispose()
+    assert {'user', 'parking_space', 'booking', 'space_cluster', 'tile_version'} <= tables
+    from src.models import migrations
+    assert version == len(migrations.MIGRATIONS)
+
+def test_apps_keep_their_own_database(app, tmp_path):
+    other = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "other.db"}'})
+    with other.app_context():
+        assert str(_db.engine.url).endswith('other.db')
+    with app.app_context():
+        assert str(_db.engine.url) == app.config['SQLALCHEMY_DATABASE_URI']
+        assert not str(_db.engine.url).endswith('parkedge.db')
@@ -0,0 +1,97 @@
+import gzip
+import re
+
+import pytest
+import zstandard
+from flask import url_for
+
+from src import assets
+
+def manifest(app):
+    return app.extensions['assets']
+
+def stylesheet_url(page_body):
+    return re.search(rb'href="(/static/style\.[0-9a-f]+\.css)"', page_body).group(1).decode()
+
+def test_pages_link_fingerprinted_assets(client, app):
+    page = client.get(url_for('serve', path='map_view.html'))
+    assert page.status_code == 200
+    assert b'href="/static/style.css"' not in page.data
+    assert stylesheet_url(page.data) == manifest(app).urls['/static/style.css']
+    assert page.headers['Cache-Control'] == 'public, no-cache'
+
+    stylesheet = client.get(stylesheet_url(page.data))
+    assert stylesheet.status_code == 200
+    assert stylesheet.mimetype == 'text/css'
+    assert stylesheet.headers['Cache-Control'] == f'public, max-age={assets.DEFAULT_MAX_AGE}, immutable'
+    with open(app.static_folder + '/style.css', 'rb') as f:
+        assert stylesheet.data == f.read()
+
+def test_plain_asset_urls_revalidate(client):
+    response = client.get('/static/style.css')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+    assert client.get('/static/missing.css').status_code == 404
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("zstd, gzip", "zstd"),
+    ("gzip, deflate, br", "gzip"),
+    ("zstd;q=0, gzip", "gzip"),
+    ("br", None),
+    (None, None),
+])
+def test_content_negotiation(client, accept, encoding):
+    identity = client.get('/static/style.css').data
+    headers = {'Accept-Encoding': accept} if accept else {}
+    response = client.get('/static/style.css', headers=headers)
+    assert response.headers.get('Content-Encoding') == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    decode = {'zstd': zstandard.ZstdDecompressor().decompress, 'gzip': gzip.decompress, None: bytes}[encoding]
+    assert decode(response.data) == identity
+    if encoding:
+        assert len(response.data) < len(identity)
+
+def test_etags_per_encoding_and_not_modified(client):
+    plain = client.get('/static/style.css')
+    compressed = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert plain.headers['ETag'] != compressed.headers['ETag']
+
+    again = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip',
+                                                     'If-None-Match': compressed.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    # Another encoding's ETag does not match this representation
+    assert client.get('/static/style.css', headers={'If-None-Match': compressed.headers['ETag']}).status_code == 200
+
+def test_unknown_paths_get_the_map_page(client, app, monkeypatch):
+    expected = client.get(url_for('serve', path='map_view.html')).data
+    # Resolved from the manifest, without looking at the filesystem
+    monkeypatch.setattr(assets.os.path, 'exists', lambda path: pytest.fail(f"stat of {path}"))
+    for path in ('', 'spaces/42', 'no-such-page.html'):
+        response = client.get(url_for('serve', path=path))
+        assert response.status_code == 200
+        assert response.data == expected
+
+def test_manifest_fingerprints_follow_content(tmp_path):
+    (tmp_path / 'app.js').write_text('console.log("hello");\n' * 50)
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG' + bytes(range(256)))
+    (tmp_path / 'index.html').write_text('<script src="/static/app.js"></script><img src="/static/logo.png?v=1">')
+    first = assets.Manifest(str(tmp_path))
+
+    js, immutable = first.lookup('app.js')
+    assert not immutable
+    assert first.lookup(js.url_path) == (js, True)
+    assert re.fullmatch(r'app\.[0-9a-f]{12}\.js', js.url_path)
+    assert set(js.bodies) == {'identity', 'zstd', 'gzip'}
+    assert set(first.lookup('logo.png')[0].bodies) == {'identity'} # Not worth compressing
+
+    page, _ = first.lookup('index.html')
+    assert page.bodies['identity'].decode() == (f'<script src="{first.urls["/static/app.js"]}"></script>'
+                                                f'<img src="{first.urls["/static/logo.png"]}?v=1">')
+
+    (tmp_path / 'app.js').write_text('console.log("changed");\n' * 50)
+    second = assets.Manifest(str(tmp_path))
+    assert second.lookup('app.js')[0].url_path != js.url_path
+    assert second.lookup('logo.png')[0].url_path == first.lookup('logo.png')[0].url_path
+    assert second.lookup('index.html')[0].digest != page.digest
+    assert first.lookup(js.url_path)[0] is js and second.lookup(js.url_path) == (None, False)
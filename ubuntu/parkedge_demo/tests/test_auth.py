@@ -45,7 +45,7 @@ def test_google_login_missing_creds(client, app):
 
 # --- Google Callback Tests (/auth/login/google/authorized) ---
 @patch('google_auth_oauthlib.flow.Flow.fetch_token')
-@patch('google.oauth2.id_token.verify_oauth2_token')
+@patch('src.google_auth.verify_id_token')
 def test_google_callback_new_user(mock_verify_id_token, mock_fetch_token, client, database, app): 
     with client.session_transaction() as sess: 
         sess['oauth_state'] = "test_state_value"
@@ -88,7 +88,7 @@ def test_google_callback_new_user(mock_verify_id_token, mock_fetch_token, client
             assert current_user.id == user.id
 
 @patch('google_auth_oauthlib.flow.Flow.fetch_token')
-@patch('google.oauth2.id_token.verify_oauth2_token')
+@patch('src.google_auth.verify_id_token')
 def test_google_callback_existing_user_by_email(mock_verify_id_token, mock_fetch_token, client, database, test_user, app): 
     with client.session_transaction() as sess:
         sess['oauth_state'] = "test_state_value_existing"
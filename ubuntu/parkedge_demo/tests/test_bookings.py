@@ -0,0 +1,177 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import url_for
+from src.models.booking import Booking, BookingSlot, slot_range
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+def window(hours_from_now, hours):
+    '''An aligned [start, end) window as ISO strings.'''
+    start = (datetime.utcnow() + timedelta(hours=hours_from_now)).replace(minute=0, second=0, microsecond=0)
+    return start.isoformat(), (start + timedelta(hours=hours)).isoformat()
+
+@pytest.fixture
+def other_space(database):
+    owner = User(username="owner", email="owner@example.com")
+    database.session.add(owner)
+    database.session.commit()
+    space = ParkingSpace(address="9 Window St", latitude=37.7749, longitude=-122.4194,
+                         price_amount=5.0, price_unit="hour", owner_id=owner.id)
+    database.session.add(space)
+    database.session.commit()
+    return space.id
+
+def test_slot_range_is_half_open():
+    start = datetime(2030, 1, 1, 10, 0)
+    assert len(slot_range(start, start + timedelta(hours=1))) == 4
+    assert slot_range(start, start + timedelta(minutes=15)).stop == slot_range(
+        start + timedelta(minutes=15), start + timedelta(minutes=30)).start
+
+def test_windowed_booking_keeps_space_bookable(logged_in_client, other_space, database):
+    start, end = window(2, 2)
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=other_space), json={"start": start, "end": end})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['is_booked'] is False
+    assert (data['booking']['start_time'], data['booking']['end_time']) == (start, end)
+    assert database.session.scalar(database.select(database.func.count(BookingSlot.id))) == 8
+
+def test_overlapping_window_conflicts(logged_in_client, other_space, database):
+    start, end = window(2, 2)
+    logged_in_client.post(url_for('spaces.book_space', space_id=other_space), json={"start": start, "end": end})
+
+    overlap_start, overlap_end = window(3, 2)
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=other_space),
+                                     json={"start": overlap_start, "end": overlap_end})
+    assert response.status_code == 409
+    assert database.session.scalar(database.select(database.func.count(Booking.id))) == 1
+
+    # Back-to-back windows share no slot
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=other_space),
+                                     query_string={"start": end, "end": window(6, 1)[0]})
+    assert response.status_code == 200
+
+@pytest.mark.parametrize("params, message", [
+    ({"start": "2030-01-01T10:00:00"}, "together"),
+    ({"start": "2030-01-01T10:00:00", "end": "2030-01-01T09:00:00"}, "after"),
+    ({"start": "2030-01-01T10:05:00", "end": "2030-01-01T11:00:00"}, "boundaries"),
+    ({"start": "2030-01-01T10:00:00", "end": "2030-03-01T10:00:00"}, "days"),
+    ({"start": "tomorrow", "end": "2030-01-01T11:00:00"}, "ISO 8601"),
+    ({"start": "2000-01-01T10:00:00", "end": "2000-01-01T11:00:00"}, "ended"),
+])
+def test_invalid_booking_window(logged_in_client, other_space, params, message):
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=other_space), json=params)
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+
+def test_timezone_aware_window_is_stored_in_utc(logged_in_client, other_space):
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=other_space),
+                                     json={"start": "2030-01-01T12:00:00+02:00", "end": "2030-01-01T13:00:00+02:00"})
+    assert response.get_json()['booking']['start_time'] == "2030-01-01T10:00:00"
+
+def test_get_spaces_filters_by_window(logged_in_client, other_space, database):
+    start, end = window(2, 2)
+    logged_in_client.post(url_for('spaces.book_space', space_id=other_space), json={"start": start, "end": end})
+
+    busy = logged_in_client.get(url_for('spaces.get_spaces', start=window(3, 1)[0], end=window(4, 1)[0]))
+    assert busy.get_json() == []
+    free = logged_in_client.get(url_for('spaces.get_spaces', start=end, end=window(5, 1)[0]))
+    assert [space['id'] for space in free.get_json()] == [other_space]
+
+def test_availability_query_probes_slot_index(app, database):
+    start = datetime(2030, 1, 1, 10, 0)
+    stmt = database.select(ParkingSpace.id).where(ParkingSpace.free_between(start, start + timedelta(hours=2)))
+    sql = str(stmt.compile(database.engine, compile_kwargs={"literal_binds": True}))
+    plan = " ".join(row[-1] for row in database.session.execute(database.text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "booking_slot USING COVERING INDEX" in plan
+
+# --- Test atomic booking ---
+def test_booking_refusals(logged_in_client, test_user, test_space, other_space, database):
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=999999)).status_code == 404
+    own = logged_in_client.post(url_for('spaces.book_space', space_id=test_space.id))
+    assert own.status_code == 403
+    assert "own" in own.get_json()['error']
+
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=other_space)).status_code == 200
+    again = logged_in_client.post(url_for('spaces.book_space', space_id=other_space))
+    assert again.status_code == 409
+    assert database.session.scalar(database.select(database.func.count(Booking.id))) == 1
+
+def test_whole_space_booking_refused_while_windows_are_booked(app, logged_in_client, other_space, database):
+    from src import bookings
+    start, end = window(2, 2)
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=other_space),
+                                 json={"start": start, "end": end}).status_code == 200
+    rival = User(username="rival", email="rival@example.com")
+    database.session.add(rival)
+    database.session.commit()
+    rival_id = rival.id
+
+    with pytest.raises(bookings.BookingError) as refused:
+        bookings.book_space(other_space, rival_id)
+    assert refused.value.status == 409
+    assert "window" in str(refused.value)
+    assert database.session.scalar(database.select(database.func.count(Booking.id))) == 1
+    assert database.session.get(ParkingSpace, other_space).is_booked is False
+
+    # Windows that are over no longer hold the space
+    database.session.execute(database.update(BookingSlot).values(slot=BookingSlot.slot - 10000))
+    database.session.commit()
+    bookings.book_space(other_space, rival_id)
+
+def test_active_booking_limit(logged_in_client, test_user, database):
+    from src.bookings import MAX_CONCURRENT_BOOKINGS
+    owner = User(username="owner", email="owner@example.com")
+    database.session.add(owner)
+    database.session.commit()
+    space_ids = []
+    for n in range(MAX_CONCURRENT_BOOKINGS + 1):
+        space = ParkingSpace(address=f"{n} Limit St", latitude=1.0, longitude=1.0,
+                             price_amount=5.0, price_unit="hour", owner_id=owner.id)
+        database.session.add(space)
+        database.session.commit()
+        space_ids.append(space.id)
+
+    for space_id in space_ids[:-1]:
+        assert logged_in_client.post(url_for('spaces.book_space', space_id=space_id)).status_code == 200
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=space_ids[-1]))
+    assert response.status_code == 403
+    assert "maximum limit" in response.get_json()['error']
+    assert database.session.get(ParkingSpace, space_ids[-1]).is_booked is False
+
+def test_booking_write_is_a_single_conditional_update(logged_in_client, other_space, query_counter):
+    with query_counter() as queries:
+        response = logged_in_client.post(url_for('spaces.book_space', space_id=other_space))
+    assert response.status_code == 200
+    # Map cluster and tile version upkeep (src/models/cluster.py, tile.py) ride along in the same commit
+    writes = [statement.split()[0] for statement in queries if not statement.startswith('SELECT')
+              and 'space_cluster' not in statement and 'tile_version' not in statement]
+    assert writes == ['UPDATE', 'INSERT', 'INSERT'] # Claim the space, the booking, the change log entry
+
+def test_concurrent_bookings_never_double_book(app, other_space, database):
+    import threading
+    from src import bookings
+    users = [User(username=f"racer{n}", email=f"racer{n}@example.com") for n in range(8)]
+    database.session.add_all(users)
+    database.session.commit()
+    user_ids = [user.id for user in users]
+    outcomes = []
+    start = threading.Barrier(len(user_ids))
+
+    def race(user_id):
+        with app.app_context():
+            start.wait()
+            try:
+                bookings.book_space(other_space, user_id)
+                outcomes.append(200)
+            except bookings.BookingError as e:
+                outcomes.append(e.status)
+
+    threads = [threading.Thread(target=race, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == [200] + [409] * (len(user_ids) - 1)
+    assert database.session.scalar(database.select(database.func.count(Booking.id))) == 1
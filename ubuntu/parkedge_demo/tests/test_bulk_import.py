@@ -0,0 +1,89 @@
+import io
+import json
+from flask import url_for
+from src import bulk_import, geocoding
+from src.models.geocode import GeocodeJob
+from src.models.space import ParkingSpace
+
+CSV_BODY = (
+    "address,price_amount,price_unit,latitude,longitude\n"
+    "1 Known Way,5,hour,37.77,-122.41\n"          # Brings its own coordinates
+    "2 Cached St,7.5,day,,\n"                      # In the geocoding cache
+    "3 Unknown Rd,4,hour,,\n"                      # Cache miss: queued
+    "4 Bad Price Ave,-1,hour,,\n"
+    "5 Bad Unit Blvd,3,week,,\n"
+    ",3,hour,,\n"
+)
+
+def seed_cache(app, address, location):
+    geocoding.get_cache().put(geocoding.normalize_address(address), location, 3600)
+
+def test_import_csv_endpoint(logged_in_client, test_user, database, app):
+    seed_cache(app, "2 Cached St", (37.78, -122.42))
+    cursor = int(logged_in_client.get(url_for('spaces.get_spaces')).headers['X-Spaces-Cursor'])
+
+    response = logged_in_client.post(url_for('spaces.import_spaces'), data=CSV_BODY, content_type='text/csv')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['imported'], report['pending_geocode'], report['failed']) == (2, 1, 3)
+    assert [error['line'] for error in report['errors']] == [5, 6, 7]
+    assert "price_amount" in report['errors'][0]['error']
+    assert "price_unit" in report['errors'][1]['error']
+    assert "address" in report['errors'][2]['error']
+
+    spaces = {space.address: space for space in database.session.scalars(database.select(ParkingSpace))}
+    assert spaces["2 Cached St"].latitude == 37.78
+    assert spaces["2 Cached St"].geohash is not None
+    assert spaces["2 Cached St"].owner_id == test_user.id
+    assert spaces["3 Unknown Rd"].geocode_status == 'pending'
+    assert database.session.scalar(database.select(GeocodeJob.space_id)) == spaces["3 Unknown Rd"].id
+
+    # Located spaces are in the change log, so delta sync and live updates see them
+    changes = logged_in_client.get(url_for('spaces.get_spaces', since=cursor)).get_json()
+    assert sorted(space['address'] for space in changes['spaces']) == ["1 Known Way", "2 Cached St"]
+
+def test_import_jsonl_reports_bad_lines(logged_in_client, database):
+    body = "\n".join([
+        json.dumps({"address": "1 A St", "price_amount": 5, "price_unit": "hour", "latitude": 1, "longitude": 2}),
+        "{not json",
+        "",
+        json.dumps(["a", "list"]),
+        json.dumps({"address": "2 B St", "price_amount": 5, "price_unit": "hour", "latitude": 1}),
+    ])
+    response = logged_in_client.post(url_for('spaces.import_spaces', format='jsonl'), data=body)
+    report = response.get_json()
+    assert report['imported'] == 1
+    assert [(error['line'], error['error']) for error in report['errors']] == [
+        (2, "Invalid JSON"),
+        (4, "Each line must be a JSON object"),
+        (5, "latitude and longitude must be given together"),
+    ]
+
+def test_import_requires_known_format(logged_in_client, database):
+    response = logged_in_client.post(url_for('spaces.import_spaces'), data="x", content_type='text/plain')
+    assert response.status_code == 400
+
+def test_import_requires_login(client, database):
+    response = client.post(url_for('spaces.import_spaces'), data=CSV_BODY, content_type='text/csv')
+    assert response.status_code in (302, 401)
+
+def test_import_inserts_in_chunks(test_user, database, app, query_counter):
+    rows = "address,price_amount,price_unit,latitude,longitude\n" + "".join(
+        f"{n} Chunk St,5,hour,37.{n:04d},-122.4\n" for n in range(25)
+    )
+    with query_counter() as queries:
+        report = bulk_import.import_spaces(io.StringIO(rows), 'csv', test_user.id, chunk_size=10)
+    assert report['imported'] == 25
+    inserts = [statement for statement in queries if statement.startswith('INSERT INTO parking_space')]
+    assert len(inserts) == 3 # One bulk INSERT per chunk, not one per row
+
+def test_import_command_geocodes_sync(runner, test_user, stub_geocoder, database, tmp_path):
+    stub_geocoder.locations["9 Stub Lane"] = (10.0, 20.0)
+    path = tmp_path / "spaces.csv"
+    path.write_text("address,price_amount,price_unit\n9 Stub Lane,5,hour\n9 stub ln,6,hour\nNowhere,5,hour\n")
+
+    result = runner.invoke(args=['spaces', 'import', str(path), '--owner', test_user.email, '--geocode', 'sync'])
+    assert result.exit_code == 0, result.output
+    assert "Line 4: Could not geocode address" in result.output
+    assert "Imported 2 parking spaces, 0 pending geocoding, 1 failed." in result.output
+    assert stub_geocoder.queries == ["9 Stub Lane", "Nowhere"] # Normalized duplicates geocode once
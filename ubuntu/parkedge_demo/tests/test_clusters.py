@@ -0,0 +1,89 @@
+import pytest
+from flask import url_for
+from src.models.cluster import DETAIL_ZOOM, MAX_CLUSTER_PRECISION, SpaceCluster, precision_for_zoom, rebuild
+from src.models.space import ParkingSpace
+
+SF_BBOX = "37.70,-122.52,37.83,-122.35"
+
+def cluster_rows(database):
+    rows = database.session.scalars(database.select(SpaceCluster).order_by(SpaceCluster.precision, SpaceCluster.cell))
+    return [(row.precision, row.cell, row.count, round(row.latitude_sum, 9), round(row.longitude_sum, 9),
+             row.min_hourly_price, row.min_daily_price, row.best_rating) for row in rows]
+
+def test_precision_grows_with_zoom():
+    precisions = [precision_for_zoom(zoom) for zoom in range(DETAIL_ZOOM)]
+    assert precisions == sorted(precisions)
+    assert precisions[0] == 1
+    assert precisions[-1] == MAX_CLUSTER_PRECISION
+
+def test_clusters_aggregate_available_spaces(client, list_space):
+    list_space(37.7749, -122.4194, price_amount=4.0)
+    list_space(37.7751, -122.4190, price_amount=12.0, price_unit="day")
+    list_space(37.7753, -122.4192, price_amount=3.0)
+    list_space(40.7128, -74.0060) # New York, outside the viewport
+
+    response = client.get(url_for('spaces.get_space_clusters', bbox=SF_BBOX, zoom=10))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['spaces'] == []
+    [cluster] = data['clusters']
+    assert cluster['count'] == 3
+    assert cluster['latitude'] == pytest.approx(37.7751)
+    assert cluster['longitude'] == pytest.approx(-122.4192)
+    assert cluster['min_hourly_price'] == 3.0
+    assert cluster['min_daily_price'] == 12.0
+    assert cluster['best_rating'] is None
+    assert len(cluster['cell']) == precision_for_zoom(10)
+
+def test_clusters_follow_bookings_and_ratings(logged_in_client, list_space, other_user):
+    booked = list_space(37.7749, -122.4194, price_amount=2.0, owner_id=other_user.id)
+    rated = list_space(37.7751, -122.4190, price_amount=6.0, owner_id=other_user.id)
+    url = url_for('spaces.get_space_clusters', bbox=SF_BBOX, zoom=12)
+
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=booked)).status_code == 200
+    assert logged_in_client.post(url_for('reviews_bp.create_review_for_space', space_id=rated),
+                                 json={'rating': 4}).status_code == 201
+    [cluster] = logged_in_client.get(url).get_json()['clusters']
+    assert cluster['count'] == 1
+    assert cluster['min_hourly_price'] == 6.0
+    assert cluster['best_rating'] == 4.0
+
+def test_recompute_ratings_refreshes_clusters(client, runner, list_space, test_user, database):
+    from src.models.review import Review
+    space_id = list_space(37.7749, -122.4194)
+    url = url_for('spaces.get_space_clusters', bbox=SF_BBOX, zoom=12)
+    client.get(url) # Cached before the aggregates are fixed
+    # Written behind the aggregates' back, as the command exists to repair
+    database.session.add(Review(user_id=test_user.id, space_id=space_id, rating=5))
+    database.session.commit()
+
+    result = runner.invoke(args=['spaces', 'recompute-ratings'])
+    assert "Recomputed ratings for 1 parking spaces." in result.output
+    [cluster] = client.get(url).get_json()['clusters']
+    assert cluster['best_rating'] == 5.0
+    assert "Recomputed ratings for 0 parking spaces." in runner.invoke(args=['spaces', 'recompute-ratings']).output
+
+def test_incremental_upkeep_matches_rebuild(logged_in_client, list_space, other_user, database):
+    for n in range(12):
+        list_space(37.70 + n * 0.011, -122.50 + n * 0.013, owner_id=other_user.id, price_amount=1.0 + n,
+                   price_unit="hour" if n % 3 else "day")
+    space_ids = [space.id for space in database.session.scalars(database.select(ParkingSpace))]
+    for space_id in space_ids[::4]:
+        logged_in_client.post(url_for('spaces.book_space', space_id=space_id))
+    incremental = cluster_rows(database)
+
+    rebuild(database.session)
+    database.session.commit()
+    assert cluster_rows(database) == incremental
+    assert {row[0] for row in incremental} == set(range(1, MAX_CLUSTER_PRECISION + 1))
+
+def test_detail_zoom_returns_spaces(client, list_space):
+    space_id = list_space(37.7749, -122.4194)
+    data = client.get(url_for('spaces.get_space_clusters', bbox=SF_BBOX, zoom=DETAIL_ZOOM)).get_json()
+    assert data['clusters'] == []
+    assert [space['id'] for space in data['spaces']] == [space_id]
+
+@pytest.mark.parametrize("params", [{'zoom': 10}, {'bbox': SF_BBOX}, {'bbox': SF_BBOX, 'zoom': 'far'},
+                                    {'bbox': SF_BBOX, 'zoom': 23}, {'bbox': "1,2,3", 'zoom': 10}])
+def test_clusters_invalid_parameters(client, database, params):
+    assert client.get(url_for('spaces.get_space_clusters', **params)).status_code == 400
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from src import database as db_profile
+from src.models.user import User
+
+def test_connections_use_production_pragmas(app, database):
+    with database.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1 # NORMAL
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+        assert connection.exec_driver_sql('PRAGMA query_only').scalar() == 0
+
+def test_read_engine_is_query_only(app, database):
+    with db_profile.read_engine(app).connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA query_only').scalar() == 1
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("INSERT INTO user (username, email) VALUES ('x', 'x@example.com')")
+
+def test_session_reads_from_read_engine_until_it_writes(app, database):
+    session = database.session
+    read_engine = db_profile.read_engine(app)
+    assert session.get_bind(clause=database.select(User)) is read_engine
+
+    session.add(User(username="writer", email="writer@example.com"))
+    session.flush()
+    # Pinned to the write engine so the transaction sees its own insert
+    assert session.get_bind(clause=database.select(User)) is database.engine
+    assert session.scalar(database.select(User.username).filter_by(username="writer")) == "writer"
+
+    session.commit()
+    assert session.get_bind(clause=database.select(User)) is read_engine
+
+def test_pragmas_for_applies_overrides():
+    pragmas = db_profile.pragmas_for({'SQLITE_PROFILE': 'default', 'SQLITE_PRAGMAS': {'cache_size': -2000}})
+    assert pragmas == {'cache_size': -2000}
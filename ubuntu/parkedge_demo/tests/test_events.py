@@ -0,0 +1,80 @@
+import json
+import pytest
+from flask import url_for
+from src import events
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+@pytest.fixture
+def subscriber():
+    subscriber = events.broadcaster.subscribe()
+    yield subscriber
+    events.broadcaster.unsubscribe(subscriber)
+
+def parse_event(message):
+    fields = dict(line.split(': ', 1) for line in message.decode().strip().split('\n'))
+    return fields['event'], json.loads(fields['data']), fields.get('id')
+
+def test_broadcaster_subscriber_limit():
+    broadcaster = events.Broadcaster()
+    first = broadcaster.subscribe(limit=1)
+    assert first is not None
+    assert broadcaster.subscribe(limit=1) is None
+    broadcaster.unsubscribe(first)
+    assert broadcaster.subscribe(limit=1) is not None
+
+def test_broadcaster_bbox_filter_and_overflow():
+    broadcaster = events.Broadcaster()
+    local = broadcaster.subscribe(bbox=(37.0, -123.0, 38.0, -122.0))
+    broadcaster.publish(b'far', 10.0, 10.0)
+    broadcaster.publish(b'near', 37.5, -122.5)
+    assert local.get(timeout=0) == b'near'
+    assert local.get(timeout=0) is None
+
+    for _ in range(events.SUBSCRIBER_QUEUE_SIZE + 1):
+        broadcaster.publish(b'x', 37.5, -122.5)
+    assert local.overflowed
+
+def test_booking_publishes_space_event(logged_in_client, test_user, database, subscriber):
+    owner = User(username="owner", email="owner@example.com")
+    database.session.add(owner)
+    database.session.commit()
+    space = ParkingSpace(address="1 Live St", latitude=37.77, longitude=-122.42,
+                         price_amount=5.0, price_unit="hour", owner_id=owner.id)
+    database.session.add(space)
+    database.session.commit()
+
+    response = logged_in_client.post(url_for('spaces.book_space', space_id=space.id))
+    assert response.status_code == 200
+
+    event, data, event_id = parse_event(subscriber.get(timeout=1))
+    assert event == 'space'
+    assert data['kind'] == 'booked'
+    assert data['space']['id'] == space.id
+    assert data['space']['is_booked'] is True
+    assert int(event_id) > 0
+
+def test_review_publishes_rating_event(logged_in_client, test_space, database, subscriber):
+    logged_in_client.post(url_for('reviews_bp.create_review_for_space', space_id=test_space.id), json={'rating': 5})
+
+    event, data, _ = parse_event(subscriber.get(timeout=1))
+    assert data['kind'] == 'rated'
+    assert data['space']['average_rating'] == 5.0
+
+def test_stream_starts_with_hello(client, database):
+    response = client.get(url_for('spaces.stream_spaces'), buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    event, data, _ = parse_event(next(response.response))
+    assert event == 'hello'
+    assert data == {"cursor": 0}
+    response.close()
+    assert events.broadcaster.subscriber_count == 0
+
+def test_stream_rejects_over_limit(client, app, database):
+    app.config['SSE_MAX_SUBSCRIBERS'] = 0
+    try:
+        response = client.get(url_for('spaces.stream_spaces'))
+    finally:
+        app.config.pop('SSE_MAX_SUBSCRIBERS')
+    assert response.status_code == 503
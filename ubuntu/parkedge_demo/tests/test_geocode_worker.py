@@ -0,0 +1,121 @@
+import time
+from datetime import datetime, timedelta
+from flask import url_for
+from src import geocode_worker, geocoding
+from src.models.geocode import GeocodeJob
+from src.models.space import ParkingSpace
+
+PAYLOAD = {"address": "10 Market Street, San Francisco", "price_amount": 5, "price_unit": "hour"}
+
+def create_async(client, payload=PAYLOAD):
+    response = client.post(url_for('spaces.create_space', **{'async': 'true'}), json=payload)
+    assert response.status_code == 202
+    return response
+
+def test_async_create_returns_202_and_pending_status(logged_in_client, stub_geocoder, database):
+    response = create_async(logged_in_client)
+    data = response.get_json()
+    assert data['geocode_status'] == 'pending'
+    assert data['latitude'] is None
+    assert data['geocode_job']['status'] == 'pending'
+    assert stub_geocoder.queries == [] # Nothing geocoded inside the request
+
+    status = logged_in_client.get(response.headers['Location'])
+    assert status.status_code == 200
+    assert status.get_json()['geocode_status'] == 'pending'
+
+    # Pending spaces are not on the map yet
+    assert logged_in_client.get(url_for('spaces.get_spaces')).get_json() == []
+
+def test_prefer_respond_async_header(logged_in_client, stub_geocoder, database):
+    response = logged_in_client.post(url_for('spaces.create_space'), json=PAYLOAD,
+                                     headers={'Prefer': 'respond-async'})
+    assert response.status_code == 202
+
+def test_worker_fills_in_coordinates(logged_in_client, stub_geocoder, database):
+    stub_geocoder.locations[PAYLOAD['address']] = (37.79, -122.40)
+    space_id = create_async(logged_in_client).get_json()['id']
+    cursor = int(logged_in_client.get(url_for('spaces.get_spaces')).headers['X-Spaces-Cursor'])
+
+    assert geocode_worker.run_pending() == 1
+
+    status = logged_in_client.get(url_for('spaces.get_geocode_status', space_id=space_id)).get_json()
+    assert status['geocode_status'] == 'ok'
+    assert (status['latitude'], status['longitude']) == (37.79, -122.40)
+    assert status['geocode_job']['status'] == 'done'
+    changes = logged_in_client.get(url_for('spaces.get_spaces', since=cursor)).get_json()
+    assert [space['id'] for space in changes['spaces']] == [space_id]
+
+def test_worker_retries_service_failures_with_backoff(logged_in_client, stub_geocoder, database, app):
+    stub_geocoder.fail = True
+    space_id = create_async(logged_in_client).get_json()['id']
+
+    assert geocode_worker.run_pending() == 1
+    job = database.session.scalar(database.select(GeocodeJob).filter_by(space_id=space_id))
+    assert (job.status, job.attempts) == ('pending', 1)
+    assert job.next_attempt_at > datetime.utcnow()
+    assert geocode_worker.run_pending() == 0 # Not due yet
+
+    stub_geocoder.fail = False
+    stub_geocoder.locations[PAYLOAD['address']] = (37.79, -122.40)
+    job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    database.session.commit()
+    assert geocode_worker.run_pending() == 1
+    assert database.session.get(ParkingSpace, space_id).geocode_status == 'ok'
+
+def test_worker_gives_up_after_max_attempts(logged_in_client, stub_geocoder, database, app):
+    stub_geocoder.fail = True
+    app.config.update(GEOCODE_MAX_ATTEMPTS=2, GEOCODE_RETRY_BACKOFF=0)
+    try:
+        space_id = create_async(logged_in_client).get_json()['id']
+        assert geocode_worker.run_pending() == 2
+    finally:
+        app.config.pop('GEOCODE_MAX_ATTEMPTS')
+        app.config.pop('GEOCODE_RETRY_BACKOFF')
+    status = logged_in_client.get(url_for('spaces.get_geocode_status', space_id=space_id)).get_json()
+    assert status['geocode_status'] == 'failed'
+    assert status['geocode_job']['attempts'] == 2
+
+def test_worker_fails_unknown_address(logged_in_client, stub_geocoder, database):
+    space_id = create_async(logged_in_client).get_json()['id']
+    geocode_worker.run_pending()
+    status = logged_in_client.get(url_for('spaces.get_geocode_status', space_id=space_id)).get_json()
+    assert status['geocode_status'] == 'failed'
+    assert "No results" in status['geocode_job']['last_error']
+
+def test_stale_running_job_is_reclaimed(logged_in_client, stub_geocoder, database):
+    stub_geocoder.locations[PAYLOAD['address']] = (37.79, -122.40)
+    space_id = create_async(logged_in_client).get_json()['id']
+    assert geocode_worker.claim_next_job() is not None
+    assert geocode_worker.claim_next_job() is None # Claimed jobs are not handed out twice
+
+    job = database.session.scalar(database.select(GeocodeJob).filter_by(space_id=space_id))
+    job.claimed_at = datetime.utcnow() - timedelta(seconds=geocode_worker.STALE_CLAIM_SECONDS + 1)
+    database.session.commit()
+    assert geocode_worker.run_pending() == 1
+    assert database.session.get(ParkingSpace, space_id).geocode_status == 'ok'
+
+def test_geocode_status_is_owner_only(logged_in_client, database):
+    from src.models.user import User
+    owner = User(username="owner", email="owner@example.com")
+    database.session.add(owner)
+    database.session.commit()
+    space = ParkingSpace(address="Elsewhere", price_amount=5.0, price_unit="hour",
+                         owner_id=owner.id, geocode_status='pending')
+    database.session.add(space)
+    database.session.commit()
+    response = logged_in_client.get(url_for('spaces.get_geocode_status', space_id=space.id))
+    assert response.status_code == 403
+
+def test_token_bucket_spaces_requests():
+    bucket = geocoding.TokenBucket(rate=20)
+    start = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire(timeout=1)
+    # The first token is available immediately, the other four at 1/20 s intervals
+    assert time.monotonic() - start >= 4 / 20 - 0.01
+
+def test_token_bucket_times_out():
+    bucket = geocoding.TokenBucket(rate=0.5)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.05)
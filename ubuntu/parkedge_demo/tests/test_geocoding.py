@@ -0,0 +1,73 @@
+import pytest
+from flask import url_for
+from src import geocoding
+
+@pytest.mark.parametrize("first, second", [
+    ("123 Main Street, Springfield", "123  main st. springfield"),
+    ("1 North Avenue", "1 N Ave"),
+])
+def test_normalize_address_merges_near_identical(first, second):
+    assert geocoding.normalize_address(first) == geocoding.normalize_address(second)
+
+def test_geocode_uses_memory_then_persistent_tier(stub_geocoder, app):
+    stub_geocoder.locations["123 Main Street, Springfield"] = (39.78, -89.65)
+    cache = geocoding.get_cache()
+    before = dict(cache.stats)
+
+    assert geocoding.geocode("123 Main Street, Springfield") == (39.78, -89.65)
+    assert geocoding.geocode("123 main st. springfield") == (39.78, -89.65)
+    cache.clear_memory() # Simulates a fresh worker process
+    assert geocoding.geocode("123 MAIN STREET SPRINGFIELD") == (39.78, -89.65)
+
+    assert stub_geocoder.queries == ["123 Main Street, Springfield"]
+    assert cache.stats['misses'] - before['misses'] == 1
+    assert cache.stats['memory_hits'] - before['memory_hits'] == 1
+    assert cache.stats['persistent_hits'] - before['persistent_hits'] == 1
+
+def test_geocode_caches_no_results(stub_geocoder, app):
+    assert geocoding.geocode("Nowhere") is None
+    assert geocoding.geocode("nowhere") is None
+    assert stub_geocoder.queries == ["Nowhere"]
+
+def test_geocode_expired_entry_is_refetched(stub_geocoder, app):
+    stub_geocoder.locations["5 Elm St"] = (1.0, 2.0)
+    app.config['GEOCODE_CACHE_TTL'] = -1
+    try:
+        geocoding.geocode("5 Elm St")
+        geocoding.geocode("5 Elm St")
+    finally:
+        app.config.pop('GEOCODE_CACHE_TTL')
+    assert stub_geocoder.queries == ["5 Elm St", "5 Elm St"]
+
+def test_geocode_service_failure_is_not_cached(stub_geocoder, app):
+    stub_geocoder.fail = True
+    with pytest.raises(geocoding.GeocoderError):
+        geocoding.geocode("7 Oak St")
+    stub_geocoder.fail = False
+    stub_geocoder.locations["7 Oak St"] = (3.0, 4.0)
+    assert geocoding.geocode("7 Oak St") == (3.0, 4.0)
+
+# --- Test POST /api/spaces geocoding ---
+def test_create_space_geocodes_through_cache(logged_in_client, stub_geocoder, database):
+    stub_geocoder.locations["10 Market Street, San Francisco"] = (37.79, -122.40)
+    payload = {"address": "10 Market Street, San Francisco", "price_amount": 5, "price_unit": "hour"}
+
+    first = logged_in_client.post(url_for('spaces.create_space'), json=payload)
+    second = logged_in_client.post(url_for('spaces.create_space'),
+                                   json=dict(payload, address="10 market st san francisco"))
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.get_json()['latitude'] == 37.79
+    assert len(stub_geocoder.queries) == 1
+
+def test_create_space_geocoder_unavailable(logged_in_client, stub_geocoder, database):
+    stub_geocoder.fail = True
+    response = logged_in_client.post(url_for('spaces.create_space'),
+                                     json={"address": "1 Down St", "price_amount": 5, "price_unit": "hour"})
+    assert response.status_code == 503
+
+def test_create_space_address_not_found(logged_in_client, stub_geocoder, database):
+    response = logged_in_client.post(url_for('spaces.create_space'),
+                                     json={"address": "Atlantis", "price_amount": 5, "price_unit": "hour"})
+    assert response.status_code == 400
+    assert "No results found" in response.get_json()['error']
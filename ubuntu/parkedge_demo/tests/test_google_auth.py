@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import rsa
+from flask import url_for
+from google.auth import crypt, jwt
+
+from src import google_auth, metrics
+from src.models.user import User
+
+KEY_ID = "stub-key"
+
+@pytest.fixture(scope='module')
+def signing_key():
+    public_key, private_key = rsa.newkeys(1024)
+    return public_key.save_pkcs1().decode(), crypt.RSASigner.from_string(private_key.save_pkcs1(), KEY_ID)
+
+@pytest.fixture
+def stub_google(app, signing_key, monkeypatch):
+    """
+    Local HTTP stand-in for Google's token and certificate endpoints. The
+    token endpoint answers code `c` with an ID token for the claims in
+    `stub.claims[c]`; certificates are served with `max-age=stub.max_age`.
+    `stub.requests` records the path and client port of every request.
+    """
+    public_pem, signer = signing_key
+
+    class Stub:
+        claims = {}
+        requests = []
+        max_age = 3600
+
+    stub = Stub()
+    stub.claims = {}
+    stub.requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # Keep-alive, so connection reuse is visible
+
+        def reply(self, body, headers=()):
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            stub.requests.append((self.path, self.client_address[1]))
+            self.reply({KEY_ID: public_pem}, [('Cache-Control', f'public, max-age={stub.max_age}')])
+
+        def do_POST(self):
+            stub.requests.append((self.path, self.client_address[1]))
+            form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+            now = int(time.time())
+            claims = {"iss": "https://accounts.google.com", "aud": app.config['GOOGLE_CLIENT_ID'],
+                      "iat": now, "exp": now + 3600, **stub.claims[form['code'][0]]}
+            self.reply({"access_token": "stub-access-token", "token_type": "Bearer", "expires_in": 3600,
+                        "id_token": jwt.encode(signer, claims).decode()})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setitem(app.config, 'GOOGLE_TOKEN_URI', f"{base}/token")
+    monkeypatch.setitem(app.config, 'GOOGLE_CERTS_URL', f"{base}/certs")
+    monkeypatch.setenv('OAUTHLIB_INSECURE_TRANSPORT', '1') # The stub and the test client speak plain HTTP
+    google_auth.get_cache().clear()
+    yield stub
+    google_auth.get_cache().clear()
+    server.shutdown()
+    server.server_close()
+
+def google_login(client, stub, code, **claims):
+    stub.claims[code] = {"sub": f"google-{code}", "email": f"{code}@example.com", "name": code, **claims}
+    with client.session_transaction() as sess:
+        sess['oauth_state'] = f"state-{code}"
+    return client.get(url_for('auth.authorized', state=f"state-{code}", code=code))
+
+def test_login_storm_makes_one_request_per_login(app, stub_google, database):
+    token_calls = metrics.outbound_latency.count(('google_token', 'ok'))
+    cert_calls = metrics.outbound_latency.count(('google_certs', 'ok'))
+    responses = [google_login(app.test_client(), stub_google, f"user{n}") for n in range(5)]
+    assert all(response.location.endswith('/map_view.html') for response in responses)
+    emails = database.session.scalars(database.select(User.email).where(User.email.like('user%@example.com')))
+    assert sorted(emails) == [f"user{n}@example.com" for n in range(5)]
+
+    paths = [path for path, _ in stub_google.requests]
+    assert paths.count('/certs') == 1
+    assert paths.count('/token') == 5
+    # Certificates and token exchanges all went over one kept-alive connection
+    assert len({port for _, port in stub_google.requests}) == 1
+    assert metrics.outbound_latency.count(('google_token', 'ok')) == token_calls + 5
+    assert metrics.outbound_latency.count(('google_certs', 'ok')) == cert_calls + 1
+
+def test_concurrent_logins_share_one_certificate_fetch(app, stub_google):
+    cache = google_auth.CertificateCache()
+    url = app.config['GOOGLE_CERTS_URL']
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(url))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    assert cache.stats['fetches'] == 1
+    assert [path for path, _ in stub_google.requests] == ['/certs']
+
+def test_expired_certificates_are_refetched(client, stub_google, database):
+    stub_google.max_age = 0
+    google_login(client, stub_google, "first")
+    google_login(client, stub_google, "second")
+    assert [path for path, _ in stub_google.requests].count('/certs') == 2
+
+def test_token_for_another_client_is_rejected(client, stub_google, database):
+    response = google_login(client, stub_google, "intruder", aud="some-other-client")
+    assert response.location.endswith(url_for('auth.login', _external=False))
+    with client.session_transaction() as sess:
+        assert ("error", "Invalid authentication token from Google.") in sess['_flashes']
+    assert database.session.scalar(database.select(User).filter_by(email="intruder@example.com")) is None
+
+@pytest.mark.parametrize("headers, lifetime", [
+    ({'Cache-Control': 'public, max-age=19845, must-revalidate, no-transform'}, 19845),
+    ({'Cache-Control': 'public, max-age=600', 'Age': '100'}, 500),
+    ({'Cache-Control': 'max-age=600', 'Age': '900'}, 0),
+    ({'Cache-Control': 'no-store, max-age=600'}, 0),
+    ({}, 0),
+])
+def test_cache_lifetime(headers, lifetime):
+    assert google_auth.cache_lifetime(headers) == lifetime
+
+def test_client_config_is_built_once(app):
+    with app.app_context():
+        first = google_auth.client_config("id", "secret", "http://localhost/callback")
+        assert google_auth.client_config("id", "secret", "http://localhost/callback") is first
+        assert google_auth.client_config("id", "secret", "http://localhost/other") is not first
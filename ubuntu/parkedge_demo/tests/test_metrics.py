@@ -0,0 +1,81 @@
+import pytest
+from flask import url_for
+
+from src import geocoding, metrics
+from src.main import create_app
+
+NEAREST = ('spaces', '/api/spaces/nearest', 'GET')
+
+def test_requests_are_timed_by_route_and_status(client, test_space):
+    before = metrics.request_count.value(NEAREST + ('200',))
+    latency_before = metrics.request_latency.count(NEAREST)
+    assert client.get(url_for('spaces.get_nearest_spaces', lat=34.05, lon=-118.24)).status_code == 200
+    assert client.get(url_for('spaces.get_nearest_spaces', lat=91, lon=0)).status_code == 400
+    assert metrics.request_count.value(NEAREST + ('200',)) == before + 1
+    assert metrics.request_count.value(NEAREST + ('400',)) >= 1
+    assert metrics.request_latency.count(NEAREST) == latency_before + 2
+
+    book = ('spaces', '/api/spaces/<int:space_id>/book', 'POST')
+    before = metrics.request_count.value(book + ('302',))
+    client.post(url_for('spaces.book_space', space_id=test_space.id)) # Anonymous: redirected to log in
+    assert metrics.request_count.value(book + ('302',)) == before + 1
+
+def test_sql_statements_are_counted_per_request(client, test_space, query_counter):
+    statements_before = metrics.request_statements.sum(NEAREST)
+    count_before = metrics.request_statements.count(NEAREST)
+    time_before = metrics.request_sql_time.sum(NEAREST)
+    with query_counter() as queries:
+        client.get(url_for('spaces.get_nearest_spaces', lat=34.05, lon=-118.24))
+    assert len(queries) > 0
+    assert metrics.request_statements.sum(NEAREST) - statements_before == len(queries)
+    assert metrics.request_statements.count(NEAREST) == count_before + 1
+    assert metrics.request_sql_time.sum(NEAREST) > time_before
+
+def test_outbound_geocoder_calls_are_timed(stub_geocoder, app):
+    ok, error = ('geocoder', 'ok'), ('geocoder', 'error')
+    ok_before, error_before = metrics.outbound_latency.count(ok), metrics.outbound_latency.count(error)
+    stub_geocoder.locations["1 Metric Way"] = (1.0, 2.0)
+    geocoding.geocode("1 Metric Way")
+    geocoding.geocode("1 Metric Way") # Cached: no call
+    stub_geocoder.fail = True
+    with pytest.raises(geocoding.GeocoderError):
+        geocoding.geocode("2 Metric Way")
+    assert metrics.outbound_latency.count(ok) == ok_before + 1
+    assert metrics.outbound_latency.count(error) == error_before + 1
+
+def test_metrics_endpoint_exposition(app, client, test_space, monkeypatch):
+    client.get(url_for('spaces.get_nearest_spaces', lat=34.05, lon=-118.24))
+    assert client.get('/metrics').status_code == 404 # No OPS_TOKEN configured
+    monkeypatch.setitem(app.config, 'OPS_TOKEN', 'ops-secret')
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer ops-secret'})
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert '# TYPE http_requests_total counter' in text
+    labels = 'blueprint="spaces",route="/api/spaces/nearest",method="GET"'
+    lines = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+    count = int(lines[f'http_request_duration_seconds_count{{{labels}}}'])
+    assert count >= 1
+    assert int(lines[f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}']) == count
+    assert int(lines[f'http_request_duration_seconds_bucket{{{labels},le="0.001"}}']) <= count
+    assert int(lines[f'http_requests_total{{{labels},status="200"}}']) >= 1
+
+def test_histogram_rendering():
+    histogram = metrics.Histogram('test_seconds', 'Test.', ('path',), (0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(('a "quoted"\\path',), value)
+    assert histogram.render() == [
+        '# HELP test_seconds Test.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{path="a \\"quoted\\"\\\\path",le="0.1"} 2',
+        'test_seconds_bucket{path="a \\"quoted\\"\\\\path",le="1"} 3',
+        'test_seconds_bucket{path="a \\"quoted\\"\\\\path",le="+Inf"} 4',
+        'test_seconds_sum{path="a \\"quoted\\"\\\\path"} 3.65',
+        'test_seconds_count{path="a \\"quoted\\"\\\\path"} 4',
+    ]
+
+def test_metrics_can_be_disabled(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "off.db"}', 'METRICS_ENABLED': False})
+    assert 'metrics' not in app.view_functions
@@ -0,0 +1,48 @@
+import random
+import pytest
+from flask import url_for
+from src import geo, nearest
+from src.models.space import ParkingSpace
+
+def test_nearest_ranks_by_distance(client, list_space):
+    far, near, middle = (list_space(lat, lon) for lat, lon in [(37.80, -122.40), (37.7751, -122.4194), (37.78, -122.42)])
+    list_space(37.7750, -122.4195, is_booked=True)
+    response = client.get(url_for('spaces.get_nearest_spaces', lat=37.7749, lon=-122.4194, k=2))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [space['id'] for space in data] == [near, middle]
+    assert data[0]['distance_m'] == pytest.approx(22.2, abs=0.5)
+    assert data[0]['address'] == "37.7751,-122.4194"
+
+def test_nearest_expands_rings_up_to_the_limit(client, list_space):
+    # ~20 km away: found only after several rings; ~80 km away: past MAX_RADIUS_M
+    reachable = list_space(37.95, -122.40)
+    list_space(38.50, -122.40)
+    data = client.get(url_for('spaces.get_nearest_spaces', lat=37.7749, lon=-122.4194)).get_json()
+    assert [space['id'] for space in data] == [reachable]
+    assert data[0]['distance_m'] > nearest.INITIAL_RADIUS_M * 16
+
+def test_nearest_applies_search_filters(client, list_space):
+    list_space(37.7750, -122.4194, price_amount=30.0)
+    cheap = list_space(37.7760, -122.4194, price_amount=3.0)
+    data = client.get(url_for('spaces.get_nearest_spaces', lat=37.7749, lon=-122.4194, max_price=10)).get_json()
+    assert [space['id'] for space in data] == [cheap]
+
+def test_nearest_matches_brute_force(app, list_space, database):
+    rng = random.Random(7)
+    points = [(37.7 + rng.random() * 0.2, -122.5 + rng.random() * 0.2) for _ in range(300)]
+    for lat, lon in points:
+        list_space(lat, lon)
+    spaces = database.session.execute(database.select(ParkingSpace.id, ParkingSpace.latitude,
+                                                      ParkingSpace.longitude)).all()
+    for _ in range(10):
+        lat, lon = 37.7 + rng.random() * 0.2, -122.5 + rng.random() * 0.2
+        expected = sorted(zip(geo.distances_m(lat, lon, [(row[1], row[2]) for row in spaces]),
+                              (row[0] for row in spaces)))[:7]
+        assert nearest.nearest_spaces(lat, lon, k=7) == expected
+
+@pytest.mark.parametrize("params", [{'lon': 1}, {'lat': 1}, {'lat': 91, 'lon': 0}, {'lat': 0, 'lon': 'x'},
+                                    {'lat': 0, 'lon': 0, 'k': 0}, {'lat': 0, 'lon': 0, 'k': -3},
+                                    {'lat': 0, 'lon': 0, 'price_unit': 'week'}])
+def test_nearest_invalid_parameters(client, database, params):
+    assert client.get(url_for('spaces.get_nearest_spaces', **params)).status_code == 400
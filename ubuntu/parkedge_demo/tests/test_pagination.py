@@ -0,0 +1,106 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import url_for
+from src import pagination
+from src.models.booking import Booking
+from src.models.review import Review
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+@pytest.fixture
+def reviewed_space(database, test_space):
+    '''test_space with 7 reviews by different users, all sharing one timestamp so ties are broken by id.'''
+    timestamp = datetime(2024, 1, 1, 12, 0)
+    users = [User(username=f"reviewer{n}", email=f"reviewer{n}@example.com") for n in range(7)]
+    database.session.add_all(users)
+    database.session.flush()
+    database.session.add_all(Review(user_id=user.id, space_id=test_space.id, rating=n % 5 + 1, timestamp=timestamp)
+                             for n, user in enumerate(users))
+    database.session.commit()
+    return test_space
+
+def walk(client, url):
+    '''Follows Link rel="next" headers from ``url``; returns every page's body.'''
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        link = response.headers.get('Link')
+        url = link[1:link.index('>')] if link else None
+    return pages
+
+def test_review_pages_cover_every_review_once(client, reviewed_space):
+    pages = walk(client, url_for('reviews_bp.get_reviews_for_space', space_id=reviewed_space.id, limit=3))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [review['id'] for page in pages for review in page]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 7
+
+def test_next_cursor_header_matches_link(client, reviewed_space):
+    response = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=reviewed_space.id, limit=5))
+    cursor = response.headers['X-Next-Cursor']
+    assert f"cursor={cursor}" in response.headers['Link']
+    assert 'limit=5' in response.headers['Link']
+
+    last = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=reviewed_space.id, limit=5, cursor=cursor))
+    assert len(last.get_json()) == 2
+    assert 'X-Next-Cursor' not in last.headers
+    assert 'Link' not in last.headers
+
+def test_default_and_maximum_page_size(client, database, test_space):
+    users = [User(username=f"many{n}", email=f"many{n}@example.com") for n in range(pagination.MAX_PAGE_SIZE + 1)]
+    database.session.add_all(users)
+    database.session.flush()
+    database.session.add_all(Review(user_id=user.id, space_id=test_space.id, rating=3) for user in users)
+    database.session.commit()
+    url = url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id)
+    assert len(client.get(url).get_json()) == pagination.DEFAULT_PAGE_SIZE
+    capped = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id, limit=10000))
+    assert len(capped.get_json()) == pagination.MAX_PAGE_SIZE
+
+@pytest.mark.parametrize("params, message", [
+    ({'cursor': 'not-a-cursor'}, "Invalid cursor"),
+    ({'cursor': pagination.encode_cursor([1])}, "Invalid cursor"), # wrong number of keys
+    ({'cursor': pagination.encode_cursor(['x', 1])}, "Invalid cursor"),
+    ({'limit': 'ten'}, "limit must be an integer"),
+    ({'limit': 0}, "limit must be positive"),
+])
+def test_bad_page_parameters_rejected(client, test_space, params, message):
+    response = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id, **params))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == message
+
+def test_my_bookings_are_paged_newest_first(logged_in_client, database, test_user, test_space):
+    now = datetime.utcnow()
+    database.session.add_all(Booking(user_id=test_user.id, space_id=test_space.id, status='completed',
+                                     booking_time=now - timedelta(hours=n)) for n in range(5))
+    database.session.commit()
+    pages = walk(logged_in_client, url_for('bookings_bp.get_my_bookings', limit=2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    times = [booking['booking_time'] for page in pages for booking in page]
+    assert times == sorted(times, reverse=True)
+
+def test_my_spaces_are_paged(logged_in_client, database, test_user):
+    database.session.add_all(ParkingSpace(address=f"{n} Page St", latitude=37.7, longitude=-122.4,
+                                          price_amount=5.0, price_unit="hour", owner_id=test_user.id)
+                             for n in range(3))
+    database.session.commit()
+    pages = walk(logged_in_client, url_for('spaces.get_my_listed_spaces', limit=2))
+    assert [len(page) for page in pages] == [2, 1]
+
+def test_user_list_is_paged_newest_first(logged_in_client, database):
+    database.session.add_all(User(username=f"listed{n}", email=f"listed{n}@example.com") for n in range(5))
+    database.session.commit()
+    first = logged_in_client.get(url_for('user.get_users', limit=2))
+    assert first.status_code == 200
+    cursor = first.headers['X-Next-Cursor']
+    assert f"cursor={cursor}" in first.headers['Link']
+    second = logged_in_client.get(url_for('user.get_users', limit=2, cursor=cursor))
+    assert max(user['id'] for user in second.get_json()) < min(user['id'] for user in first.get_json())
+
+    pages = walk(logged_in_client, url_for('user.get_users', limit=2))
+    assert [len(page) for page in pages] == [2, 2, 2] # test_user and five more
+    ids = [user['id'] for page in pages for user in page]
+    assert ids == sorted(ids, reverse=True)
+    assert logged_in_client.get(url_for('user.get_users', cursor='not-a-cursor')).status_code == 400
@@ -0,0 +1,127 @@
+import time
+from flask import url_for
+from src import response_cache
+from src.models.space import ParkingSpace
+from src.models.user import User
+
+def test_space_list_is_served_from_cache_until_a_booking(logged_in_client, database, query_counter):
+    owner = User(username="owner", email="owner@example.com")
+    database.session.add(owner)
+    database.session.flush()
+    space = ParkingSpace(address="1 Cache St", latitude=37.7, longitude=-122.4,
+                         price_amount=5.0, price_unit="hour", owner_id=owner.id)
+    database.session.add(space)
+    database.session.commit()
+
+    url = url_for('spaces.get_spaces')
+    first = logged_in_client.get(url)
+    assert first.headers['X-Cache'] == 'MISS'
+    assert [listed['id'] for listed in first.get_json()] == [space.id]
+    with query_counter() as queries:
+        second = logged_in_client.get(url)
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json() == first.get_json()
+    assert any('space_change' in statement for statement in queries) # The cursor is still read
+    assert not any('FROM parking_space' in statement for statement in queries)
+
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=space.id)).status_code == 200
+    after = logged_in_client.get(url)
+    assert after.headers['X-Cache'] == 'MISS'
+    assert after.get_json() == []
+
+def test_review_lists_invalidated_by_review_writes(logged_in_client, test_user, test_space):
+    space_url = url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id)
+    user_url = url_for('reviews_bp.get_reviews_by_user', user_id=test_user.id)
+    for url in (space_url, user_url):
+        logged_in_client.get(url)
+        assert logged_in_client.get(url).headers['X-Cache'] == 'HIT'
+
+    created = logged_in_client.post(url_for('reviews_bp.create_review_for_space', space_id=test_space.id),
+                                    json={'rating': 4}).get_json()
+    for url in (space_url, user_url):
+        response = logged_in_client.get(url)
+        assert response.headers['X-Cache'] == 'MISS'
+        assert [review['rating'] for review in response.get_json()] == [4]
+
+    logged_in_client.put(url_for('reviews_bp.update_review', review_id=created['id']), json={'comment': 'Tight fit'})
+    assert logged_in_client.get(space_url).get_json()[0]['comment'] == 'Tight fit'
+
+    logged_in_client.delete(url_for('reviews_bp.delete_review', review_id=created['id']))
+    assert logged_in_client.get(space_url).get_json() == []
+
+def test_user_responses_invalidated_by_user_writes(app, logged_in_client, test_user, monkeypatch):
+    list_url = url_for('user.get_users')
+    user_url = url_for('user.get_user', user_id=test_user.id)
+    for url in (list_url, user_url):
+        logged_in_client.get(url)
+        assert logged_in_client.get(url).headers['X-Cache'] == 'HIT'
+
+    assert logged_in_client.put(user_url, json={'username': 'renamed'}).status_code == 200
+    for url in (list_url, user_url):
+        response = logged_in_client.get(url)
+        assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['username'] == 'renamed'
+
+    logged_in_client.get(list_url)
+    monkeypatch.setitem(app.config, 'OPS_TOKEN', 'ops-secret')
+    created = logged_in_client.post(list_url, json={'username': 'newcomer', 'email': 'new@example.com'},
+                                    headers={'Authorization': 'Bearer ops-secret'})
+    assert created.status_code == 201
+    listed = logged_in_client.get(list_url)
+    assert listed.headers['X-Cache'] == 'MISS'
+    assert listed.get_json()[0]['username'] == 'newcomer'
+
+def test_query_parameters_are_part_of_the_key(client, test_space):
+    url = url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id, limit=5)
+    client.get(url)
+    other = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id, limit=6))
+    assert other.headers['X-Cache'] == 'MISS'
+
+def test_errors_are_not_cached(client, database):
+    url = url_for('reviews_bp.get_reviews_for_space', space_id=9999)
+    assert client.get(url).status_code == 404
+    assert client.get(url).headers['X-Cache'] == 'MISS'
+
+def test_result_read_before_an_invalidation_is_not_stored():
+    cache = response_cache.ResponseCache(maxsize=10, ttl=60)
+    value, token = cache.get('key', ('reviews',))
+    assert value is None
+    cache.invalidate('reviews') # A write commits while the read is still querying
+    assert cache.put('key', 'old', ('reviews',), token) is False
+    assert cache.get('key', ('reviews',))[0] is None
+
+def test_lru_eviction_expiry_and_stats():
+    cache = response_cache.ResponseCache(maxsize=2, ttl=60)
+    for key in ('a', 'b'):
+        cache.put(key, key.upper(), ('t',), cache.get(key, ('t',))[1])
+    assert cache.get('a', ('t',))[0] == 'A' # 'b' is now least recently used
+    cache.put('c', 'C', ('t',), cache.get('c', ('t',))[1])
+    assert cache.get('b', ('t',))[0] is None
+    stats = cache.snapshot()
+    assert stats['evictions'] == 1
+    assert stats['size'] == 2
+    assert stats['hits'] == 1 and stats['misses'] == 4
+    assert stats['hit_rate'] == 0.2
+
+    cache.invalidate('t')
+    assert cache.snapshot()['invalidations'] == 2
+
+    short = response_cache.ResponseCache(maxsize=2, ttl=0.01)
+    short.put('a', 'A', (), short.get('a', ())[1])
+    time.sleep(0.02)
+    assert short.get('a', ())[0] is None
+    assert short.snapshot()['expirations'] == 1
+
+def test_stats_endpoint(app, client, test_space, monkeypatch):
+    assert client.get(url_for('cache_stats')).status_code == 404 # No OPS_TOKEN configured
+    monkeypatch.setitem(app.config, 'OPS_TOKEN', 'ops-secret')
+    assert client.get(url_for('cache_stats')).status_code == 401
+    denied = client.get(url_for('cache_stats'), headers={'Authorization': 'Bearer wrong'})
+    assert denied.status_code == 401
+    assert denied.headers['WWW-Authenticate'] == 'Bearer'
+
+    client.get(url_for('spaces.get_spaces'))
+    client.get(url_for('spaces.get_spaces'))
+    stats = client.get(url_for('cache_stats'), headers={'Authorization': 'Bearer ops-secret'}).get_json()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
@@ -1,5 +1,5 @@
 import pytest
-from flask import url_for
+from flask import Request, url_for
 from src.models.review import Review
 from src.models.user import User 
 from src.models.space import ParkingSpace 
@@ -79,8 +79,11 @@ def test_create_review_duplicate(logged_in_client, test_user, test_space, databa
 
 # --- Test GET /api/spaces/<space_id>/reviews (Get Reviews for Space) ---
 def test_get_reviews_for_space_success(client, test_user, test_space, database): 
+    other_user = User(username="other", email="other@example.com", google_id="other_google_id")
+    database.session.add(other_user)
+    database.session.commit()
     create_review_direct(database.session, test_user.id, test_space.id, 5, "Great space!")
-    create_review_direct(database.session, test_user.id, test_space.id, 4, "Good space") 
+    create_review_direct(database.session, other_user.id, test_space.id, 4, "Good space") # One review per user per space
 
     response = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=test_space.id))
     assert response.status_code == 200
@@ -104,7 +107,7 @@ def test_get_reviews_for_space_invalid_id(client, database): # Added database fi
 def test_get_reviews_by_user_success(client, test_user, test_space, database): 
     create_review_direct(database.session, test_user.id, test_space.id, 5, "My first review")
     
-    space2 = ParkingSpace(address="456 Other St", latitude=35.0, longitude=-119.0, price="$2")
+    space2 = ParkingSpace(address="456 Other St", latitude=35.0, longitude=-119.0, price_amount=2.0, price_unit="hour", owner_id=test_user.id)
     database.session.add(space2) 
     database.session.commit() 
     create_review_direct(database.session, test_user.id, space2.id, 3, "My second review")
@@ -209,3 +212,44 @@ def test_delete_review_invalid_id(logged_in_client, database): # Added database
     response = logged_in_client.delete(url_for('reviews_bp.delete_review', review_id=999))
     assert response.status_code == 404
     assert "Review not found" in response.get_data(as_text=True)
+
+# --- Test rating aggregates maintained on ParkingSpace ---
+def test_review_mutations_maintain_space_rating(logged_in_client, test_user, test_space, database):
+    response = logged_in_client.post(
+        url_for('reviews_bp.create_review_for_space', space_id=test_space.id),
+        json={'rating': 4, 'comment': 'Good'}
+    )
+    review_id = response.get_json()['id']
+    space = database.session.get(ParkingSpace, test_space.id)
+    database.session.refresh(space)
+    assert (space.rating_sum, space.rating_count, space.average_rating) == (4, 1, 4.0)
+
+    logged_in_client.put(url_for('reviews_bp.update_review', review_id=review_id), json={'rating': 2})
+    database.session.refresh(space)
+    assert (space.rating_sum, space.rating_count, space.average_rating) == (2, 1, 2.0)
+
+    logged_in_client.delete(url_for('reviews_bp.delete_review', review_id=review_id))
+    database.session.refresh(space)
+    assert (space.rating_sum, space.rating_count, space.average_rating) == (0, 0, None)
+
+def test_rating_delta_uses_the_rating_the_write_replaced(logged_in_client, test_user, test_space, database, monkeypatch):
+    review_id = logged_in_client.post(
+        url_for('reviews_bp.create_review_for_space', space_id=test_space.id),
+        json={'rating': 2, 'comment': 'Meh'}
+    ).get_json()['id']
+
+    # Another request re-rates the review to 4 after this one has read it at 2
+    get_json = Request.get_json
+    def get_json_after_concurrent_update(self, *args, **kwargs):
+        with database.engine.begin() as conn:
+            conn.execute(_db.update(Review).where(Review.id == review_id).values(rating=4))
+            conn.execute(_db.update(ParkingSpace).where(ParkingSpace.id == test_space.id).values(rating_sum=4))
+        monkeypatch.setattr(Request, 'get_json', get_json)
+        return get_json(self, *args, **kwargs)
+    monkeypatch.setattr(Request, 'get_json', get_json_after_concurrent_update)
+
+    response = logged_in_client.put(url_for('reviews_bp.update_review', review_id=review_id), json={'rating': 5})
+    assert response.status_code == 200
+    space = database.session.get(ParkingSpace, test_space.id)
+    database.session.refresh(space)
+    assert (space.rating_sum, space.rating_count) == (5, 1)
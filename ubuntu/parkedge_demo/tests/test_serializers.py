@@ -0,0 +1,94 @@
+import pytest
+from flask import url_for
+from src.models.booking import Booking
+from src.models.review import Review
+from src.models.space import ParkingSpace
+from src.models.user import User
+from src.serializers import REVIEW, BOOKING, SPACE, USER
+
+def create_users_and_spaces(db_session, owner, count):
+    users = [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(count)]
+    spaces = [
+        ParkingSpace(address=f"{i} Main St", latitude=37.0 + i * 0.01, longitude=-122.0,
+                     price_amount=5.0, price_unit="hour", owner_id=owner.id)
+        for i in range(count)
+    ]
+    db_session.add_all(users + spaces)
+    db_session.commit()
+    return users, spaces
+
+def test_schema_derives_eager_loads():
+    assert len(REVIEW.load_options) == 1
+    assert len(BOOKING.load_options) == 2
+    assert len(USER.load_options) == 1
+
+def test_review_dump_matches_fields(test_user, test_space, database):
+    review = Review(user_id=test_user.id, space_id=test_space.id, rating=4, comment="Nice")
+    database.session.add(review)
+    database.session.commit()
+    data = review.to_dict()
+    assert data['user_username'] == test_user.username
+    assert data['timestamp'] == review.timestamp.isoformat()
+
+@pytest.mark.parametrize("rows", [1, 5])
+def test_reviews_for_space_constant_queries(client, test_user, test_space, database, query_counter, rows):
+    space_id = test_space.id
+    users, _ = create_users_and_spaces(database.session, test_user, rows)
+    for user in users:
+        database.session.add(Review(user_id=user.id, space_id=space_id, rating=3))
+    database.session.commit()
+    database.session.expunge_all()
+
+    with query_counter() as queries:
+        response = client.get(url_for('reviews_bp.get_reviews_for_space', space_id=space_id))
+    assert response.status_code == 200
+    assert len(response.get_json()) == rows
+    assert len(queries) == 2 # Space lookup + reviews joined to their users
+
+@pytest.mark.parametrize("rows", [1, 3])
+def test_my_bookings_constant_queries(logged_in_client, test_user, database, query_counter, rows):
+    owner = User(username="owner", email="owner@example.com")
+    database.session.add(owner)
+    database.session.commit()
+    _, spaces = create_users_and_spaces(database.session, owner, rows)
+    username = test_user.username
+    for space in spaces:
+        database.session.add(Booking(user_id=test_user.id, space_id=space.id))
+    database.session.commit()
+
+    with query_counter() as queries:
+        response = logged_in_client.get(url_for('bookings_bp.get_my_bookings'))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data) == rows
+    assert data[0]['user_username'] == username
+    assert len(queries) == 2 # User loader + bookings joined to users and spaces
+
+@pytest.mark.parametrize("schema, model", [(REVIEW, Review), (BOOKING, Booking), (SPACE, ParkingSpace)])
+def test_projected_rows_match_instance_dumps(test_user, test_space, database, schema, model):
+    other = User(username="rater", email="rater@example.com")
+    database.session.add(other)
+    database.session.flush()
+    database.session.add_all([
+        Review(user_id=test_user.id, space_id=test_space.id, rating=4, comment="Nice"),
+        Review(user_id=other.id, space_id=test_space.id, rating=5),
+        Booking(user_id=other.id, space_id=test_space.id),
+    ])
+    ParkingSpace.adjust_rating(test_space.id, 9, 2)
+    database.session.commit()
+
+    expected = schema.dump_many(database.session.scalars(schema.apply(database.select(model)).order_by(model.id)))
+    rows = database.session.execute(schema.select().order_by(model.id)).all()
+    assert schema.dump_rows(rows) == expected
+    assert expected
+
+def test_projected_rows_keep_missing_relationships_as_none(test_user, database):
+    database.session.add(Booking(user_id=test_user.id, space_id=9999)) # Space since deleted
+    database.session.commit()
+    [data] = BOOKING.dump_rows(database.session.execute(BOOKING.select()))
+    assert data['space_address'] is None
+    assert data['user_username'] == test_user.username
+
+def test_collection_fields_cannot_be_projected():
+    with pytest.raises(ValueError):
+        USER.select()
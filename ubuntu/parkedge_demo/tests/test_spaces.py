@@ -0,0 +1,244 @@
+import pytest
+from flask import url_for
+from src.models.search import address_matches
+from src.models.space import ParkingSpace
+from src import geo
+
+# --- Geohash helpers ---
+def test_geohash_encode_known_value():
+    assert geo.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+def test_geohash_cover_contains_points():
+    ranges = geo.cover_ranges(37.70, -122.52, 37.83, -122.35)
+    for lat, lon in [(37.70, -122.52), (37.7749, -122.4194), (37.83, -122.35)]:
+        point_hash = geo.encode(lat, lon)
+        assert any(low <= point_hash < high for low, high in ranges)
+
+def test_geohash_stored_on_insert(list_space, database):
+    space = database.session.get(ParkingSpace, list_space(37.7749, -122.4194))
+    assert space.geohash == geo.encode(37.7749, -122.4194)
+
+# --- Test GET /api/spaces?bbox= ---
+def test_get_spaces_bbox_filters_viewport(client, list_space):
+    inside = list_space(37.7749, -122.4194, address="Inside")
+    list_space(34.0522, -118.2437, address="Outside")
+    list_space(37.7750, -122.4195, address="Booked", is_booked=True)
+
+    response = client.get(url_for('spaces.get_spaces', bbox="37.70,-122.52,37.83,-122.35"))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [space['id'] for space in data] == [inside]
+
+def test_get_spaces_bbox_limit(client, list_space):
+    for i in range(5):
+        list_space(37.77 + i * 0.001, -122.42)
+
+    response = client.get(url_for('spaces.get_spaces', bbox="37.70,-122.52,37.83,-122.35", limit=3))
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+
+def test_get_spaces_bbox_across_antimeridian(client, list_space):
+    east = list_space(-17.7, 178.0, address="Fiji")
+    west = list_space(-14.3, -170.7, address="Samoa")
+    list_space(-17.7, 150.0, address="Coral Sea")
+
+    response = client.get(url_for('spaces.get_spaces', bbox="-20,175,-10,-165"))
+    assert response.status_code == 200
+    assert sorted(space['id'] for space in response.get_json()) == sorted([east, west])
+
+def test_get_spaces_without_bbox_returns_all_available(client, list_space):
+    list_space(37.7749, -122.4194)
+    list_space(34.0522, -118.2437)
+
+    response = client.get(url_for('spaces.get_spaces'))
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+
+@pytest.mark.parametrize("bbox", ["1,2,3", "a,b,c,d", "10,0,5,1", "0,-200,1,1"])
+def test_get_spaces_invalid_bbox(client, database, bbox):
+    response = client.get(url_for('spaces.get_spaces', bbox=bbox))
+    assert response.status_code == 400
+    assert "bbox" in response.get_json()['error']
+
+def test_get_spaces_invalid_limit(client, database):
+    response = client.get(url_for('spaces.get_spaces', bbox="0,0,1,1", limit=0))
+    assert response.status_code == 400
+    assert "limit" in response.get_json()['error']
+
+# --- Test rating aggregates ---
+def test_recompute_ratings_command(runner, test_user, other_user, test_space, database):
+    from src.models.review import Review
+    database.session.add_all([
+        Review(user_id=test_user.id, space_id=test_space.id, rating=5),
+        Review(user_id=other_user.id, space_id=test_space.id, rating=2),
+    ])
+    database.session.commit()
+
+    result = runner.invoke(args=['spaces', 'recompute-ratings'])
+    assert result.exit_code == 0
+    assert "Recomputed ratings for 1 parking spaces." in result.output
+
+    space = database.session.get(ParkingSpace, test_space.id)
+    database.session.refresh(space)
+    data = space.to_dict()
+    assert data['review_count'] == 2
+    assert data['average_rating'] == 3.5
+
+# --- Test conditional GET and delta sync on /api/spaces ---
+def test_get_spaces_etag_and_not_modified(client, list_space):
+    list_space(37.7749, -122.4194)
+    response = client.get(url_for('spaces.get_spaces', bbox="37.70,-122.52,37.83,-122.35"))
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get(url_for('spaces.get_spaces', bbox="37.70,-122.52,37.83,-122.35"),
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    # Different parameters are a different representation
+    response = client.get(url_for('spaces.get_spaces'), headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+def test_get_spaces_etag_changes_after_write(logged_in_client, list_space, other_user):
+    space = list_space(37.7749, -122.4194, owner_id=other_user.id)
+    etag = logged_in_client.get(url_for('spaces.get_spaces')).headers['ETag']
+
+    logged_in_client.post(url_for('spaces.book_space', space_id=space))
+
+    response = logged_in_client.get(url_for('spaces.get_spaces'), headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json() == []
+
+def test_get_spaces_since_returns_only_changes(logged_in_client, list_space, other_user):
+    booked = list_space(37.7749, -122.4194, owner_id=other_user.id)
+    rated = list_space(37.7750, -122.4195, owner_id=other_user.id)
+    list_space(37.7751, -122.4196, owner_id=other_user.id)
+
+    response = logged_in_client.get(url_for('spaces.get_spaces'))
+    cursor = int(response.headers['X-Spaces-Cursor'])
+
+    logged_in_client.post(url_for('spaces.book_space', space_id=booked))
+    logged_in_client.post(url_for('reviews_bp.create_review_for_space', space_id=rated), json={'rating': 4})
+
+    response = logged_in_client.get(url_for('spaces.get_spaces', since=cursor))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['cursor'] > cursor
+    changed = {space['id']: space for space in data['spaces']}
+    assert set(changed) == {booked, rated}
+    assert changed[booked]['is_booked'] is True
+    assert changed[rated]['average_rating'] == 4.0
+
+    response = logged_in_client.get(url_for('spaces.get_spaces', since=data['cursor']))
+    assert response.get_json() == {"cursor": data['cursor'], "spaces": []}
+
+def test_get_spaces_since_ignores_viewport_limit(logged_in_client, list_space):
+    spaces = [list_space(37.7749 + n * 0.0001, -122.4194) for n in range(3)]
+    bbox = "37.70,-122.52,37.83,-122.35"
+    cursor = int(logged_in_client.get(url_for('spaces.get_spaces', bbox=bbox)).headers['X-Spaces-Cursor'])
+    for space_id in spaces:
+        logged_in_client.post(url_for('reviews_bp.create_review_for_space', space_id=space_id), json={'rating': 3})
+
+    data = logged_in_client.get(url_for('spaces.get_spaces', bbox=bbox, since=cursor, limit=1)).get_json()
+    assert sorted(space['id'] for space in data['spaces']) == sorted(spaces)
+
+def test_get_spaces_invalid_since(client, database):
+    response = client.get(url_for('spaces.get_spaces', since="abc"))
+    assert response.status_code == 400
+    assert "since" in response.get_json()['error']
+
+# --- Compact formats ---
+def test_get_spaces_columnar_format(client, list_space, database):
+    first = list_space(37.7749, -122.4194)
+    second = list_space(37.7750, -122.4195)
+    ParkingSpace.adjust_rating(second, 9, 2)
+    database.session.commit()
+
+    response = client.get(url_for('spaces.get_spaces', format='columnar'))
+    assert response.status_code == 200
+    data = response.get_json()
+    assert set(data) == {'id', 'lat', 'lon', 'price', 'unit', 'rating', 'booked'}
+    rows = sorted(zip(*(data[key] for key in ('id', 'lat', 'lon', 'price', 'unit', 'rating', 'booked'))))
+    assert rows == [(first, 37.7749, -122.4194, 5.0, 'hour', None, False),
+                    (second, 37.7750, -122.4195, 5.0, 'hour', 4.5, False)]
+
+def test_get_spaces_msgpack_matches_columnar(client, list_space):
+    import msgpack
+    for n in range(3):
+        list_space(37.77 + n / 1000, -122.42)
+    columnar = client.get(url_for('spaces.get_spaces', format='columnar'))
+    packed = client.get(url_for('spaces.get_spaces', format='msgpack'))
+    assert packed.mimetype == 'application/msgpack'
+    assert msgpack.unpackb(packed.data) == columnar.get_json()
+    assert len(packed.data) < len(columnar.data)
+    assert packed.headers['ETag'] != columnar.headers['ETag']
+
+    # Served again from the response cache with its content type intact
+    again = client.get(url_for('spaces.get_spaces', format='msgpack'))
+    assert again.headers['X-Cache'] == 'HIT'
+    assert again.mimetype == 'application/msgpack'
+
+def test_get_spaces_columnar_since(logged_in_client, stub_geocoder, test_user, database):
+    stub_geocoder.locations["1 Columnar St"] = (37.7, -122.4)
+    cursor = int(logged_in_client.get(url_for('spaces.get_spaces')).headers['X-Spaces-Cursor'])
+    assert logged_in_client.post(url_for('spaces.create_space'),
+                                 json={"address": "1 Columnar St", "price_amount": 3.0,
+                                       "price_unit": "day"}).status_code == 201
+    data = logged_in_client.get(url_for('spaces.get_spaces', since=cursor, format='columnar')).get_json()
+    assert data['cursor'] > cursor
+    assert data['spaces']['unit'] == ['day']
+
+def test_get_spaces_invalid_format(client, database):
+    response = client.get(url_for('spaces.get_spaces', format='xml'))
+    assert response.status_code == 400
+    assert "format" in response.get_json()['error']
+
+# --- Search filters ---
+
+@pytest.fixture
+def searchable_spaces(test_user, database):
+    spaces = {
+        'main': ParkingSpace(address="12 Main Street, Springfield", latitude=37.70, longitude=-122.40,
+                             price_amount=4.0, price_unit="hour", owner_id=test_user.id, rating_sum=9, rating_count=2),
+        'mainz': ParkingSpace(address="3 Mainzer Straße, Köln", latitude=37.71, longitude=-122.40,
+                              price_amount=20.0, price_unit="day", owner_id=test_user.id, rating_sum=3, rating_count=1),
+        'oak': ParkingSpace(address="7 Oak Avenue, Springfield", latitude=37.72, longitude=-122.40,
+                            price_amount=8.0, price_unit="hour", owner_id=test_user.id),
+    }
+    database.session.add_all(spaces.values())
+    database.session.commit()
+    return {name: space.id for name, space in spaces.items()}
+
+@pytest.mark.parametrize("params, expected", [
+    ({'address': 'main'}, {'main', 'mainz'}),
+    ({'address': 'main street'}, {'main'}),
+    ({'address': 'springfield'}, {'main', 'oak'}),
+    ({'address': 'strasse koln'}, set()), # Diacritics are folded, but "strasse" is not "straße"
+    ({'address': 'STRAßE köln'}, {'mainz'}),
+    ({'min_rating': 4}, {'main'}),
+    ({'min_rating': 0}, {'main', 'mainz', 'oak'}),
+    ({'max_price': 8}, {'main', 'oak'}),
+    ({'price_unit': 'day'}, {'mainz'}),
+    ({'address': 'springfield', 'max_price': 5, 'price_unit': 'hour'}, {'main'}),
+])
+def test_get_spaces_search_filters(client, searchable_spaces, params, expected):
+    response = client.get(url_for('spaces.get_spaces', **params))
+    assert response.status_code == 200
+    assert {space['id'] for space in response.get_json()} == {searchable_spaces[name] for name in expected}
+
+def test_address_index_follows_updates_and_deletes(client, searchable_spaces, database):
+    space = database.session.get(ParkingSpace, searchable_spaces['oak'])
+    space.address = "7 Elm Road, Springfield"
+    database.session.commit()
+    assert client.get(url_for('spaces.get_spaces', address='oak')).get_json() == []
+    assert [found['id'] for found in client.get(url_for('spaces.get_spaces', address='elm')).get_json()] == [space.id]
+
+    database.session.delete(space)
+    database.session.commit()
+    assert database.session.scalars(database.select(ParkingSpace.id).where(address_matches('elm'))).all() == []
+
+@pytest.mark.parametrize("params", [{'address': '"*'}, {'min_rating': 'high'}, {'min_rating': 6},
+                                    {'max_price': 'cheap'}, {'price_unit': 'week'}])
+def test_get_spaces_invalid_filters(client, database, params):
+    assert client.get(url_for('spaces.get_spaces', **params)).status_code == 400
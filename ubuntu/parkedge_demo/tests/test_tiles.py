@@ -0,0 +1,53 @@
+import pytest
+from flask import url_for
+from src.models.tile import MAX_TILE_ZOOM, MIN_TILE_ZOOM, tile_bounds, tile_for
+
+def tile_url(latitude, longitude, zoom=14, **params):
+    x, y = tile_for(latitude, longitude, zoom)
+    return url_for('spaces.get_space_tile', zoom=zoom, x=x, y=y, **params)
+
+@pytest.mark.parametrize("latitude, longitude", [(37.7749, -122.4194), (-33.8688, 151.2093), (0.0, 0.0)])
+def test_tile_bounds_contain_the_point(latitude, longitude):
+    for zoom in range(MIN_TILE_ZOOM, MAX_TILE_ZOOM + 1):
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, *tile_for(latitude, longitude, zoom))
+        assert min_lat < latitude <= max_lat
+        assert min_lon <= longitude < max_lon
+
+def test_tile_lists_only_its_spaces(client, list_space):
+    inside = list_space(37.7749, -122.4194)
+    list_space(37.8049, -122.4194) # A few tiles north at zoom 14
+    response = client.get(tile_url(37.7749, -122.4194))
+    assert response.status_code == 200
+    assert [space['id'] for space in response.get_json()] == [inside]
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+    etag, weak = response.get_etag()
+    assert not weak
+
+    revalidated = client.get(tile_url(37.7749, -122.4194), headers={'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304
+
+    columnar = client.get(tile_url(37.7749, -122.4194, format='columnar'))
+    assert columnar.get_json()['id'] == [inside]
+    assert columnar.get_etag()[0] != etag
+
+def test_version_moves_only_with_changes_inside_the_tile(logged_in_client, list_space, other_user):
+    inside = list_space(37.7749, -122.4194, owner_id=other_user.id)
+    elsewhere = list_space(37.8049, -122.4194, owner_id=other_user.id)
+    url = tile_url(37.7749, -122.4194)
+    first = logged_in_client.get(url)
+    version = first.headers['X-Tile-Version']
+
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=elsewhere)).status_code == 200
+    unchanged = logged_in_client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert unchanged.status_code == 304
+    assert unchanged.headers['X-Tile-Version'] == version
+
+    assert logged_in_client.post(url_for('spaces.book_space', space_id=inside)).status_code == 200
+    changed = logged_in_client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert int(changed.headers['X-Tile-Version']) > int(version)
+    assert changed.get_json() == []
+
+@pytest.mark.parametrize("zoom, x, y", [(MIN_TILE_ZOOM - 1, 0, 0), (MAX_TILE_ZOOM + 1, 0, 0), (12, 4096, 0)])
+def test_tile_out_of_range(client, database, zoom, x, y):
+    assert client.get(url_for('spaces.get_space_tile', zoom=zoom, x=x, y=y)).status_code == 400
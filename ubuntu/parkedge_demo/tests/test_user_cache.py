@@ -0,0 +1,83 @@
+from flask import g, url_for
+from src import user_cache
+from src.models.user import User
+from src.routes.user import invalidate_user
+
+def load(app, database, user_id, snapshot=None):
+    '''Loads a user as a new request would: empty identity map, fresh request context.'''
+    database.session.remove()
+    with app.test_request_context():
+        if snapshot is not None:
+            from flask import session
+            session[user_cache.SNAPSHOT_KEY] = snapshot
+        return user_cache.load_user(str(user_id))
+
+def user_queries(queries):
+    return [statement for statement in queries if 'FROM user' in statement]
+
+def test_cached_user_needs_no_query(app, test_user, database, query_counter):
+    load(app, database, test_user.id)
+    with query_counter() as queries:
+        for _ in range(3):
+            assert load(app, database, test_user.id).username == "testuser"
+    assert user_queries(queries) == []
+    assert user_cache.get_cache().snapshot()['hits'] == 3
+
+def test_invalidation_reloads_the_user(app, test_user, database):
+    load(app, database, test_user.id)
+    database.session.execute(database.update(User).where(User.id == test_user.id).values(username="renamed"))
+    database.session.commit()
+    assert load(app, database, test_user.id).username == "testuser" # Still cached
+    invalidate_user(test_user.id)
+    assert load(app, database, test_user.id).username == "renamed"
+
+def test_cached_user_can_still_be_changed(app, test_user, database):
+    load(app, database, test_user.id)
+    user = load(app, database, test_user.id) # From the cache
+    user.phone_number = "555-0100"
+    database.session.commit()
+    database.session.remove()
+    assert database.session.get(User, test_user.id).phone_number == "555-0100"
+
+def test_missing_user_is_not_cached(app, database):
+    assert load(app, database, 9999) is None
+    assert user_cache.get_cache().snapshot()['size'] == 0
+
+def test_session_snapshot_serves_a_cold_process(app, test_user, database, query_counter, monkeypatch):
+    monkeypatch.setitem(app.config, 'USER_SESSION_SNAPSHOT', True)
+    database.session.remove()
+    with app.test_request_context():
+        from flask import session
+        user_cache.load_user(str(test_user.id))
+        snapshot = session[user_cache.SNAPSHOT_KEY]
+    assert set(snapshot['user']) == set(user_cache.SNAPSHOT_FIELDS) # No payment or phone details
+
+    user_cache.get_cache().clear() # As if the next request hit another worker
+    with query_counter() as queries:
+        assert load(app, database, test_user.id, snapshot).email == "test@example.com"
+    assert user_queries(queries) == []
+
+    user_cache.get_cache().clear()
+    with query_counter() as queries:
+        load(app, database, test_user.id, dict(snapshot, v=user_cache.SNAPSHOT_VERSION + 1))
+    assert len(user_queries(queries)) == 1 # Snapshots from another version are not trusted
+
+def test_status_loads_the_user_from_the_session_cookie(client, test_user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user.id)
+    assert client.get(url_for('auth.status')).get_json()['user']['username'] == "testuser"
+
+def test_profile_update_drops_the_cached_login(client, test_user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user.id)
+    client.get(url_for('auth.status')) # Caches the login
+    misses = user_cache.get_cache().snapshot()['misses']
+    response = client.put(url_for('user.update_my_profile'), json={'phone_number': "555-0199"})
+    assert response.get_json()['phone_number'] == "555-0199"
+    # The client's requests share this test's app context; drop the user
+    # Flask-Login kept in g, as a new request's app context would
+    g.pop('_login_user', None)
+    # A body with no profile fields echoes the logged-in user as the loader returned it
+    echoed = client.put(url_for('user.update_my_profile'), json={'ignored': True}).get_json()
+    assert echoed['phone_number'] == "555-0199"
+    assert user_cache.get_cache().snapshot()['misses'] == misses + 1
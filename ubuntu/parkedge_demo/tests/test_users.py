@@ -0,0 +1,57 @@
+import pytest
+from flask import url_for
+from src.models.user import User
+
+PRIVATE_FIELDS = {'email', 'google_id', 'payment_info', 'phone_number'}
+
+@pytest.fixture
+def other_account(database):
+    user = User(username="other", email="other@example.com", google_id="othergoogleid",
+                payment_info="4111 1111 1111 1111", phone_number="555-0123")
+    database.session.add(user)
+    database.session.commit()
+    return user.id
+
+@pytest.mark.parametrize("method, endpoint", [
+    ('get', 'user.get_users'), ('get', 'user.get_user'), ('put', 'user.update_user'),
+    ('delete', 'user.delete_user'), ('put', 'user.update_my_profile'),
+])
+def test_user_api_requires_login(client, other_account, method, endpoint):
+    kwargs = {} if endpoint in ('user.get_users', 'user.update_my_profile') else {'user_id': other_account}
+    response = getattr(client, method)(url_for(endpoint, **kwargs), json={'username': 'x'})
+    assert response.status_code == 401
+
+def test_other_users_are_listed_without_private_details(logged_in_client, other_account):
+    listed = logged_in_client.get(url_for('user.get_users')).get_json()
+    assert {user['id'] for user in listed} >= {other_account}
+    for user in listed:
+        assert not PRIVATE_FIELDS & set(user)
+    shown = logged_in_client.get(url_for('user.get_user', user_id=other_account)).get_json()
+    assert shown['username'] == "other"
+    assert not PRIVATE_FIELDS & set(shown)
+
+def test_only_the_owner_may_change_an_account(logged_in_client, test_user, other_account, database):
+    url = url_for('user.update_user', user_id=other_account)
+    assert logged_in_client.put(url, json={'email': 'attacker@example.com'}).status_code == 403
+    assert logged_in_client.put(url, json={'username': 'hijacked'}).status_code == 403
+    assert logged_in_client.delete(url_for('user.delete_user', user_id=other_account)).status_code == 403
+    database.session.expire_all()
+    other = database.session.get(User, other_account)
+    assert (other.email, other.username) == ("other@example.com", "other")
+
+    own = url_for('user.update_user', user_id=test_user.id)
+    # Sign-in finds accounts by email, so not even the owner may change it
+    assert logged_in_client.put(own, json={'email': 'new@example.com'}).status_code == 400
+    renamed = logged_in_client.put(own, json={'username': 'renamed'})
+    assert renamed.status_code == 200
+    assert renamed.get_json()['username'] == 'renamed'
+    assert logged_in_client.delete(url_for('user.delete_user', user_id=test_user.id)).status_code == 204
+
+def test_creating_users_is_for_operators(app, logged_in_client, monkeypatch):
+    payload = {'username': 'made', 'email': 'made@example.com'}
+    assert logged_in_client.post(url_for('user.create_user'), json=payload).status_code == 404
+    monkeypatch.setitem(app.config, 'OPS_TOKEN', 'ops-secret')
+    assert logged_in_client.post(url_for('user.create_user'), json=payload).status_code == 401
+    created = logged_in_client.post(url_for('user.create_user'), json=payload,
+                                    headers={'Authorization': 'Bearer ops-secret'})
+    assert created.status_code == 201